@@ -0,0 +1,72 @@
+"""Compare a full CovariateDB.build_db() against restoring from a snapshot.
+
+Spins up an EphemerDB instance, builds the shared database the covariate
+foreign keys point at, then times each approach over a number of repeats:
+
+    python benchmarks/build_db.py --repeat 20
+"""
+import argparse
+import socket
+import time
+
+from cluster_utils.ephemerdb import create_ephemerdb
+from db_shared.make_schema import SharedUp
+
+from db_covariate.make_schema import CovariateDB
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--mysql-version', type=str, default='5.7')
+    return parser.parse_args()
+
+
+def time_calls(func, repeat):
+    """Call func repeat times and return the wall time of each call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return timings
+
+
+def report(label, timings):
+    print('{label:>10}: mean {mean:.4f}s  min {min:.4f}s  max {max:.4f}s'
+          .format(label=label, mean=sum(timings) / len(timings),
+                  min=min(timings), max=max(timings)))
+
+
+def main():
+    args = parse_args()
+
+    server = create_ephemerdb(args.mysql_version)
+    server.start()
+    try:
+        shared = SharedUp(host=socket.gethostname(),
+                          port=server.db_port,
+                          user="root",
+                          password=server.db_root_pass)
+        shared.build_db()
+
+        cov_db = CovariateDB(host=socket.gethostname(),
+                             port=server.db_port,
+                             user="root",
+                             password=server.db_root_pass,
+                             root_conn_str=server.root_conn_str)
+
+        rebuild = time_calls(cov_db.build_db, args.repeat)
+        cov_db.snapshot()
+        restore = time_calls(cov_db.restore, args.repeat)
+
+        report('rebuild', rebuild)
+        report('restore', restore)
+        print('speedup: {:.1f}x'.format(
+            (sum(rebuild) / len(rebuild)) / (sum(restore) / len(restore))))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
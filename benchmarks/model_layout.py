@@ -0,0 +1,168 @@
+"""Compare the storage footprint and scan speed of covariate.model layouts.
+
+Builds each layout in its own schema on an EphemerDB instance, loads the same
+synthetic model versions into every one, and reports for each:
+
+    - on-disk bytes per row (data plus indexes, from information_schema)
+    - buffer pool hit rate and logical page reads while scanning versions
+    - mean time to read back one full model version
+
+    python benchmarks/model_layout.py --versions 20 --locations 200
+"""
+import argparse
+import itertools
+import socket
+import time
+
+from cluster_utils.ephemerdb import create_ephemerdb
+from db_shared.make_schema import SharedUp
+
+from db_covariate.make_schema import CovariateDB
+
+
+INSERT_MODEL_VERSION = """
+    INSERT INTO model_version (model_version_id, covariate_id, gbd_round_id,
+        description, code_version, status, is_best)
+    VALUES (%s, %s, 5, 'layout benchmark', 'benchmark', 1, 0)
+"""
+
+INSERT_MODEL = """
+    INSERT INTO model (model_version_id, year_id, location_id, sex_id,
+        age_group_id, mean_value, upper_value, lower_value)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layouts', nargs='+',
+                        default=['standard', 'compact'])
+    parser.add_argument('--versions', type=int, default=10)
+    parser.add_argument('--years', type=int, default=30)
+    parser.add_argument('--locations', type=int, default=100)
+    parser.add_argument('--age-groups', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--mysql-version', type=str, default='5.7')
+    return parser.parse_args()
+
+
+def version_rows(mvid, args):
+    """Yield every model row for one synthetic model version."""
+    keys = itertools.product(range(1990, 1990 + args.years),
+                             range(1, args.locations + 1),
+                             (1, 2),
+                             range(1, args.age_groups + 1))
+    for year_id, location_id, sex_id, age_group_id in keys:
+        mean = (mvid * year_id + location_id) % 1000 / 10.0
+        yield (mvid, year_id, location_id, sex_id, age_group_id,
+               mean, mean * 1.1, mean * 0.9)
+
+
+def load(cov_db, args):
+    """Fill a freshly built schema with the synthetic model versions.
+
+    Foreign key checks are off for the load since the synthetic covariate and
+    location ids are not guaranteed to exist in the shared database.
+    """
+    connection = cov_db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('USE {}'.format(cov_db.schema))
+        cursor.execute('SET FOREIGN_KEY_CHECKS = 0')
+        for mvid in range(1, args.versions + 1):
+            cursor.execute(INSERT_MODEL_VERSION, (mvid, mvid))
+            rows = version_rows(mvid, args)
+            while True:
+                batch = list(itertools.islice(rows, args.batch_size))
+                if not batch:
+                    break
+                cursor.executemany(INSERT_MODEL, batch)
+            connection.commit()
+        cursor.execute('SET FOREIGN_KEY_CHECKS = 1')
+        cursor.execute('ANALYZE TABLE model')
+        cursor.fetchall()
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def innodb_status(cursor, name):
+    cursor.execute("SHOW GLOBAL STATUS LIKE %s", (name,))
+    return int(cursor.fetchone()[1])
+
+
+def measure(cov_db, args):
+    """Return bytes per row, buffer pool hit rate, logical reads per version,
+    and mean seconds to scan one model version."""
+    connection = cov_db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM {}.model'.format(cov_db.schema))
+        row_count = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT data_length + index_length "
+            "FROM information_schema.tables "
+            "WHERE table_schema = %s AND table_name = 'model'",
+            (cov_db.schema,))
+        table_bytes = cursor.fetchone()[0]
+
+        requests = innodb_status(cursor, 'Innodb_buffer_pool_read_requests')
+        disk_reads = innodb_status(cursor, 'Innodb_buffer_pool_reads')
+        scan_times = []
+        for mvid in range(1, args.versions + 1):
+            start = time.time()
+            cursor.execute(
+                'SELECT SUM(mean_value), COUNT(*) FROM {}.model '
+                'WHERE model_version_id = %s'.format(cov_db.schema), (mvid,))
+            cursor.fetchall()
+            scan_times.append(time.time() - start)
+        requests = (innodb_status(cursor, 'Innodb_buffer_pool_read_requests')
+                    - requests)
+        disk_reads = (innodb_status(cursor, 'Innodb_buffer_pool_reads')
+                      - disk_reads)
+        cursor.close()
+    finally:
+        connection.close()
+
+    hit_rate = 1.0 - float(disk_reads) / requests if requests else 1.0
+    return {'bytes_per_row': float(table_bytes) / row_count,
+            'hit_rate': hit_rate,
+            'reads_per_version': float(requests) / args.versions,
+            'scan_seconds': sum(scan_times) / len(scan_times)}
+
+
+def main():
+    args = parse_args()
+
+    server = create_ephemerdb(args.mysql_version)
+    server.start()
+    try:
+        shared = SharedUp(host=socket.gethostname(),
+                          port=server.db_port,
+                          user="root",
+                          password=server.db_root_pass)
+        shared.build_db()
+
+        print('{:>12} {:>14} {:>10} {:>16} {:>14}'.format(
+            'layout', 'bytes/row', 'hit rate', 'reads/version',
+            'scan (s)'))
+        for layout in args.layouts:
+            cov_db = CovariateDB(host=socket.gethostname(),
+                                 port=server.db_port,
+                                 user="root",
+                                 password=server.db_root_pass,
+                                 root_conn_str=server.root_conn_str,
+                                 schema='covariate_{}'.format(layout),
+                                 layout=layout)
+            cov_db.build_db()
+            load(cov_db, args)
+            stats = measure(cov_db, args)
+            print('{:>12} {bytes_per_row:>14.1f} {hit_rate:>10.4f} '
+                  '{reads_per_version:>16.0f} {scan_seconds:>14.4f}'.format(
+                      layout, **stats))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -37,3 +37,4 @@ CREATE INDEX fk_model_location_id ON model (location_id);
 CREATE INDEX fk_model_year_id ON model (year_id);
 CREATE INDEX fk_model_sex_id ON model (sex_id);
 CREATE INDEX fk_model_age_group_id ON model (age_group_id);
+CREATE INDEX ix_model_last_updated ON model (last_updated);
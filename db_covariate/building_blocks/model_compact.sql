@@ -0,0 +1,44 @@
+-- -------------------------------------------------
+-- covariate.model (compact)
+-- -------------------------------------------------
+-- A drop-in alternative to model.sql that trades some flexibility for a much
+-- smaller row. Key columns use the narrowest integer type the shared
+-- dimension domains fit in, and the per-row audit strings are dropped: every
+-- row of a model version is inserted together, so who inserted it and when is
+-- already recorded on covariate.model_version. last_updated and
+-- last_updated_action stay so rows can still be synced incrementally, with
+-- the action stored as a one byte ENUM.
+--
+-- Foreign keys must match the type of the column they reference, so the
+-- narrowed shared.* keys cannot be declared here. Use
+-- CovariateDB.orphaned_keys() to check referential integrity instead.
+
+USE covariate;
+
+DROP TABLE IF EXISTS model;
+
+CREATE TABLE model (
+  model_version_id int(11) NOT NULL COMMENT 'fk to covariate.model_version',
+  year_id smallint(6) NOT NULL COMMENT 'shared.year.year_id',
+  location_id mediumint(9) NOT NULL COMMENT 'shared.location.location_id',
+  sex_id tinyint(4) NOT NULL COMMENT 'shared.sex.sex_id',
+  age_group_id smallint(6) NOT NULL COMMENT 'shared.age_group.age_group_id',
+  mean_value double NOT NULL COMMENT 'mean value',
+  upper_value double DEFAULT NULL COMMENT 'upper value',
+  lower_value double DEFAULT NULL COMMENT 'lower value',
+  last_updated datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT 'When this row was last edited. Newly inserted rows default to NOW().',
+  last_updated_action enum('INSERT','UPDATE','DELETE') NOT NULL DEFAULT 'INSERT' COMMENT 'Either INSERT, UPDATE, DELETE',
+  PRIMARY KEY (model_version_id, year_id, location_id, sex_id, age_group_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci
+COMMENT='For GBD Round 6, potential duplicated rows were avoided by limiting the covariate.model table to GBD Round 4 and above. Covariate data from GBD Round 3 and earlier has been archived.'
+;
+
+-- Add our foreign key constraints
+ALTER TABLE model ADD CONSTRAINT fk_model_model_version_id FOREIGN KEY (model_version_id) REFERENCES model_version (model_version_id);
+
+-- Create our indices
+CREATE INDEX fk_model_location_id ON model (location_id);
+CREATE INDEX fk_model_year_id ON model (year_id);
+CREATE INDEX fk_model_sex_id ON model (sex_id);
+CREATE INDEX fk_model_age_group_id ON model (age_group_id);
+CREATE INDEX ix_model_last_updated ON model (last_updated);
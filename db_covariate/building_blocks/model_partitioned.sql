@@ -0,0 +1,87 @@
+-- -------------------------------------------------
+-- covariate.model (partitioned by model_version_id)
+-- -------------------------------------------------
+-- A drop-in alternative to model.sql for very large deployments. Rows are
+-- RANGE partitioned on model_version_id in blocks of 1000 versions, so reads
+-- of a single model version prune to one partition and whole blocks of
+-- versions can be archived with ALTER TABLE ... TRUNCATE/DROP PARTITION.
+-- The blocks run well past the live model_version_ids, which start at the
+-- AUTO_INCREMENT of 24338 in model_version.sql, so new versions land in a
+-- block of their own rather than in pmax. Add blocks ahead of the ids
+-- reaching 40000 with CovariateDB.split_model_partition().
+--
+-- MySQL does not allow foreign keys on partitioned tables, so the constraints
+-- from model.sql are not declared here. Use CovariateDB.orphaned_keys() to
+-- check referential integrity instead.
+
+USE covariate;
+
+DROP TABLE IF EXISTS model;
+
+CREATE TABLE model (
+  model_version_id int(11) NOT NULL COMMENT 'fk to covariate.model_version',
+  year_id int(11) NOT NULL COMMENT 'fk_to shared.year.year_id. ',
+  location_id int(11) NOT NULL COMMENT 'fk to shared.location.location_id',
+  sex_id int(11) NOT NULL COMMENT 'fk to shared.sex.sex_id',
+  age_group_id int(11) NOT NULL COMMENT 'fk to shared.age_group.age_group_id',
+  mean_value double NOT NULL COMMENT 'mean value',
+  upper_value double DEFAULT NULL COMMENT 'upper value',
+  lower_value double DEFAULT NULL COMMENT 'lower value',
+  date_inserted datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT 'When this row was added to this table. Newly inserted rows default to NOW().',
+  inserted_by varchar(50) CHARACTER SET utf8 COLLATE utf8_unicode_ci NOT NULL DEFAULT 'unknown' COMMENT 'The user who first added this row',
+  last_updated datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT 'When this row was last edited. Newly inserted rows default to NOW().',
+  last_updated_by varchar(50) CHARACTER SET utf8 COLLATE utf8_unicode_ci NOT NULL DEFAULT 'unknown' COMMENT 'The user who edited this row last',
+  last_updated_action varchar(6) CHARACTER SET utf8 COLLATE utf8_unicode_ci NOT NULL DEFAULT 'INSERT' COMMENT 'Either INSERT, UPDATE, DELETE',
+  PRIMARY KEY (model_version_id, year_id, location_id, sex_id, age_group_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci
+COMMENT='For GBD Round 6, potential duplicated rows were avoided by limiting the covariate.model table to GBD Round 4 and above. Covariate data from GBD Round 3 and earlier has been archived.'
+PARTITION BY RANGE (model_version_id) (
+  PARTITION p1000 VALUES LESS THAN (1000),
+  PARTITION p2000 VALUES LESS THAN (2000),
+  PARTITION p3000 VALUES LESS THAN (3000),
+  PARTITION p4000 VALUES LESS THAN (4000),
+  PARTITION p5000 VALUES LESS THAN (5000),
+  PARTITION p6000 VALUES LESS THAN (6000),
+  PARTITION p7000 VALUES LESS THAN (7000),
+  PARTITION p8000 VALUES LESS THAN (8000),
+  PARTITION p9000 VALUES LESS THAN (9000),
+  PARTITION p10000 VALUES LESS THAN (10000),
+  PARTITION p11000 VALUES LESS THAN (11000),
+  PARTITION p12000 VALUES LESS THAN (12000),
+  PARTITION p13000 VALUES LESS THAN (13000),
+  PARTITION p14000 VALUES LESS THAN (14000),
+  PARTITION p15000 VALUES LESS THAN (15000),
+  PARTITION p16000 VALUES LESS THAN (16000),
+  PARTITION p17000 VALUES LESS THAN (17000),
+  PARTITION p18000 VALUES LESS THAN (18000),
+  PARTITION p19000 VALUES LESS THAN (19000),
+  PARTITION p20000 VALUES LESS THAN (20000),
+  PARTITION p21000 VALUES LESS THAN (21000),
+  PARTITION p22000 VALUES LESS THAN (22000),
+  PARTITION p23000 VALUES LESS THAN (23000),
+  PARTITION p24000 VALUES LESS THAN (24000),
+  PARTITION p25000 VALUES LESS THAN (25000),
+  PARTITION p26000 VALUES LESS THAN (26000),
+  PARTITION p27000 VALUES LESS THAN (27000),
+  PARTITION p28000 VALUES LESS THAN (28000),
+  PARTITION p29000 VALUES LESS THAN (29000),
+  PARTITION p30000 VALUES LESS THAN (30000),
+  PARTITION p31000 VALUES LESS THAN (31000),
+  PARTITION p32000 VALUES LESS THAN (32000),
+  PARTITION p33000 VALUES LESS THAN (33000),
+  PARTITION p34000 VALUES LESS THAN (34000),
+  PARTITION p35000 VALUES LESS THAN (35000),
+  PARTITION p36000 VALUES LESS THAN (36000),
+  PARTITION p37000 VALUES LESS THAN (37000),
+  PARTITION p38000 VALUES LESS THAN (38000),
+  PARTITION p39000 VALUES LESS THAN (39000),
+  PARTITION p40000 VALUES LESS THAN (40000),
+  PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Create our indices
+CREATE INDEX fk_model_location_id ON model (location_id);
+CREATE INDEX fk_model_year_id ON model (year_id);
+CREATE INDEX fk_model_sex_id ON model (sex_id);
+CREATE INDEX fk_model_age_group_id ON model (age_group_id);
+CREATE INDEX ix_model_last_updated ON model (last_updated);
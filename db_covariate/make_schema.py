@@ -1,15 +1,65 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import os
 import re
-from subprocess import check_output
 import sys
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
 
 from db_tools import config
 
+from db_covariate.sql_parser import parse_sql_script
+
+try:
+    from urllib.parse import quote_plus
+except ImportError:
+    from urllib import quote_plus
+
 
 this_path = os.path.dirname(os.path.abspath(__file__))
 this_dir = os.path.dirname(__file__)
 
 
+# One executed statement from a DDL script and how long the server took to run
+# it, in seconds.
+StatementResult = namedtuple('StatementResult',
+                             ['script', 'statement', 'duration'])
+
+
+class SQLScriptError(Exception):
+    """Raised when the server rejects a statement from one of our DDL scripts.
+
+    Carries the script, the offending statement, and the server's error code
+    and message so a failed build points straight at the broken line instead
+    of a non-zero exit status from the mysql client.
+    """
+
+    def __init__(self, script, statement, code, message):
+        self.script = script
+        self.statement = statement
+        self.code = code
+        self.message = message
+        super(SQLScriptError, self).__init__(
+            '{script}: ({code}) {message}\n{statement}'.format(
+                script=os.path.basename(script), code=code, message=message,
+                statement=statement))
+
+
+# Statements in our DDL scripts that name the covariate schema itself. Table
+# references to other schemas (shared.covariate and friends) are left alone.
+_SCHEMA_STATEMENT = re.compile(
+    r'^(USE|DROP SCHEMA IF EXISTS|CREATE SCHEMA)(\s+)covariate\b',
+    re.IGNORECASE)
+
+
+def _use_schema(statement, schema):
+    """Point a statement that names the covariate schema at schema instead."""
+    return _SCHEMA_STATEMENT.sub(r'\1\2{}'.format(schema), statement)
+
+
 class CovariateDB(object):
 
     tables = ['model_version.sql',
@@ -18,27 +68,62 @@ class CovariateDB(object):
     triggers = []
     sprocs = []
 
-    def __init__(self, host, port, user, password, root_conn_str):
+    # Alternative building_blocks scripts for each table layout, keyed on the
+    # script they replace.
+    layouts = {
+        'standard': {},
+        # covariate.model RANGE partitioned on model_version_id. Partitioned
+        # tables cannot carry foreign keys; see orphaned_keys().
+        'partitioned': {'model.sql': 'model_partitioned.sql'},
+        # covariate.model with narrow key types and the per-row audit
+        # columns left to model_version.
+        'compact': {'model.sql': 'model_compact.sql'},
+    }
+
+    # CREATE TABLE statements captured from a freshly built schema, keyed on
+    # (host, port, schema, tables). Shared across instances so a
+    # function-scoped fixture only pays for the full build once per schema.
+    _snapshots = {}
+
+    def __init__(self, host, port, user, password, root_conn_str,
+                 schema='covariate', layout='standard'):
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.root_conn_str = root_conn_str
+        self.schema = schema
+        self._engine = None
+
+        if layout not in self.layouts:
+            raise ValueError('Unknown layout {!r}, expected one of {}'.format(
+                layout, ', '.join(sorted(self.layouts))))
+        self.layout = layout
+        self.tables = [self.layouts[layout].get(table, table)
+                       for table in self.tables]
+
+        self.add_conn_def('covariates')
 
-        # The following lines are necessary for exposing the newly created
-        # database to our pattern of database access through
-        # db_tools.ezfuncs.get_session which returns a sqlalchemy.orm.Session
-        # object.
+    def add_conn_def(self, conn_def):
+        """Register a db_tools connection definition for our schema.
+
+        This is necessary for exposing the newly created database to our
+        pattern of database access through db_tools.ezfuncs.get_session which
+        returns a sqlalchemy.orm.Session object.
+
+        Arguments:
+            conn_def (str): the name to register the connection under.
+        """
         params = re.match('.*://(.*):(.*)@(.*):(.*)/(.*)',
-                          root_conn_str)
+                          self.root_conn_str)
 
         new_conn_def = {
-            'covariates': {
+            conn_def: {
                 'host': params.group(3),
                 'port': params.group(4),
                 'user_name': params.group(1),
                 'password': params.group(2),
-                'default_schema': params.group(5),
+                'default_schema': self.schema,
                 'pool_recycle': 360
             }
         }
@@ -50,21 +135,578 @@ class CovariateDB(object):
 
         cfg.add_conn_defs(new_conn_def)
 
-    def execute_sql_script(self, sql_script):
-        cmd = ('mysql -h {host} -P {port} --user={user} --password={password} '
-               '< {sql}'.format(host=self.host,
-                                port=self.port,
-                                user=self.user,
-                                password=self.password,
-                                sql=sql_script))
-        stdout = check_output(cmd, shell=True)
-        return stdout
-
-    def build_db(self):
+    @property
+    def engine(self):
+        """A pooled sqlalchemy engine for running DDL against the server.
+
+        Uses the same driver as root_conn_str but connects without a default
+        schema, since make_schema.sql drops and recreates it.
+        """
+        if self._engine is None:
+            driver = self.root_conn_str.split('://')[0]
+            url = '{driver}://{user}:{password}@{host}:{port}'.format(
+                driver=driver,
+                user=quote_plus(str(self.user)),
+                password=quote_plus(str(self.password)),
+                host=self.host,
+                port=self.port)
+            self._engine = create_engine(url, pool_recycle=360)
+        return self._engine
+
+    def execute_sql_script(self, sql_script, connection=None):
+        """Run every statement in a SQL script over a single DBAPI connection.
+
+        Arguments:
+            sql_script (str, path): the absolute path to the SQL script. Any
+                statement selecting, creating, or dropping the covariate
+                schema is rewritten to use self.schema.
+            connection (DBAPI connection, optional): a connection checked out
+                of self.engine. If not given, one is borrowed from the pool for
+                the duration of the script.
+
+        Returns:
+            a list of StatementResult, one per statement, in execution order.
+
+        Raises:
+            SQLScriptError: if the server rejects any statement. Statements
+                before the failing one have already been executed.
+        """
+        return self._execute_statements(
+            sql_script, self._script_statements(sql_script), connection)
+
+    def _script_statements(self, sql_script):
+        """The statements in sql_script, pointed at self.schema."""
+        return [_use_schema(statement, self.schema)
+                for statement in parse_sql_script(sql_script)]
+
+    def _execute_statements(self, script, statements, connection=None):
+        """Execute statements in order on connection, timing each one.
+
+        Arguments:
+            script (str): where the statements came from, for reporting.
+            statements (list of str): the statements to execute.
+            connection (DBAPI connection, optional): a connection from
+                self.engine. If not given, one is borrowed from the pool.
+
+        Returns:
+            a list of StatementResult, one per statement.
+        """
+        if connection is None:
+            connection = self.engine.raw_connection()
+            try:
+                return self._execute_statements(script, statements,
+                                                connection)
+            finally:
+                connection.close()
+
+        results = []
+        cursor = connection.cursor()
+        try:
+            for statement in statements:
+                start = time.time()
+                try:
+                    cursor.execute(statement)
+                except self.engine.dialect.dbapi.Error as e:
+                    code, message = _server_error(e)
+                    raise SQLScriptError(script, statement, code, message)
+                results.append(StatementResult(script, statement,
+                                               time.time() - start))
+            connection.commit()
+        finally:
+            cursor.close()
+        return results
+
+    def build_db(self, use_snapshot=False, max_workers=None,
+                 defer_constraints=False):
+        """Create the covariate schema and build its tables, triggers, and
+        stored procedures.
+
+        Tables are built level by level from build_levels(): every table in a
+        level only references tables from earlier levels, so each level's
+        scripts run concurrently, each on its own pooled connection. Triggers
+        and then stored procedures follow in phases of their own once every
+        table exists.
+
+        Arguments:
+            use_snapshot (bool): if True, restore the schema from a snapshot
+                of an earlier build of this schema when one exists, and
+                take that snapshot after building when it doesn't. Ignored
+                when defer_constraints is set.
+            max_workers (int, optional): the most scripts to run at once.
+                Defaults to the size of the widest phase.
+            defer_constraints (bool): if True, create the tables with only
+                their primary keys and hold back every ADD CONSTRAINT and
+                CREATE INDEX statement until DeferredConstraints.finalize() is
+                called. Use this to bulk load rows before any secondary index
+                or foreign key has to be maintained.
+
+        Returns:
+            a list of StatementResult covering every statement executed, or a
+            DeferredConstraints handle holding those results when
+            defer_constraints is set.
+        """
+        if (use_snapshot and not defer_constraints and
+                self._snapshot_key in self._snapshots):
+            return self.restore()
+
         # Create the schema
-        self.execute_sql_script(os.path.join(this_dir, 'make_schema.sql'))
+        results = self.execute_sql_script(
+            os.path.join(this_dir, 'make_schema.sql'))
+
+        # Build the tables by dependency level, then triggers and sprocs
+        scripts = dict(zip(self.table_names, self.tables))
+        phases = [[scripts[table] for table in level]
+                  for level in self.build_levels()]
+        phases.extend(phase for phase in [self.triggers, self.sprocs]
+                      if phase)
+
+        def build_script(script):
+            sql_script = os.path.join(this_dir, 'building_blocks', script)
+            statements = self._script_statements(sql_script)
+            held_back = []
+            if defer_constraints and script in self.tables:
+                held_back = [s for s in statements if _is_deferrable(s)]
+                statements = [s for s in statements if not _is_deferrable(s)]
+            return (self._execute_statements(sql_script, statements),
+                    sql_script, held_back)
+
+        deferred = []
+        workers = max_workers or max(len(phase) for phase in phases)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for phase in phases:
+                for script_results, sql_script, held_back in executor.map(
+                        build_script, phase):
+                    results.extend(script_results)
+                    if held_back:
+                        # The held back statements name their tables without
+                        # a schema, so select ours before running them.
+                        use = 'USE {}'.format(self.schema)
+                        deferred.append((sql_script, [use] + held_back))
+
+        if defer_constraints:
+            return DeferredConstraints(self, results, deferred)
+        if use_snapshot:
+            self.snapshot()
+        return results
+
+    def table_dependencies(self):
+        """Return the covariate tables each table has foreign keys into.
+
+        Read from the REFERENCES clauses in the building_blocks scripts.
+        References into other schemas (shared.location and so on) are ignored
+        since those tables are never built here.
+
+        Returns:
+            a dict of table name to the set of table names it references.
+        """
+        dependencies = {}
+        for table, script in zip(self.table_names, self.tables):
+            sql_script = os.path.join(this_dir, 'building_blocks', script)
+            references = set()
+            for statement in parse_sql_script(sql_script):
+                for schema, name in re.findall(
+                        r'REFERENCES\s+(?:`?(\w+)`?\.)?`?(\w+)`?',
+                        statement, re.IGNORECASE):
+                    if (schema in ('', 'covariate', self.schema) and
+                            name != table):
+                        references.add(name)
+            dependencies[table] = references & set(self.table_names)
+        return dependencies
+
+    def build_levels(self):
+        """Group the tables into levels that can be built concurrently.
+
+        Each level only holds tables whose foreign keys point at tables in
+        earlier levels, so the number of levels is the depth of the
+        dependency graph rather than the number of tables.
+
+        Returns:
+            a list of lists of table names, in build order.
+
+        Raises:
+            ValueError: if the foreign keys form a cycle.
+        """
+        remaining = self.table_dependencies()
+        built = set()
+        levels = []
+        while remaining:
+            level = sorted(table for table, references in remaining.items()
+                           if references <= built)
+            if not level:
+                raise ValueError('Circular foreign keys between tables: '
+                                 '{}'.format(', '.join(sorted(remaining))))
+            levels.append(level)
+            built.update(level)
+            for table in level:
+                del remaining[table]
+        return levels
+
+    @property
+    def _snapshot_key(self):
+        return (self.host, str(self.port), self.schema, tuple(self.tables))
+
+    @property
+    def table_names(self):
+        """The names of the tables created by the building_blocks scripts."""
+        return [_table_name(os.path.join(this_dir, 'building_blocks', table))
+                for table in self.tables]
+
+    def orphaned_keys(self):
+        """Count the values in each foreign key column with no parent row.
+
+        Checks every foreign key declared by the standard building_blocks
+        scripts, whether or not the built tables actually enforce it. This is
+        how referential integrity is verified for the partitioned and compact
+        layouts of the model table, which cannot carry all of them.
+
+        Returns:
+            a dict of constraint name to the number of distinct orphaned key
+            values, which is 0 for every constraint when the data is sound.
+        """
+        queries = {}
+        for script in CovariateDB.tables:
+            sql_script = os.path.join(this_dir, 'building_blocks', script)
+            for fk in foreign_keys(sql_script):
+                parent = fk.parent_table
+                if '.' not in parent:
+                    parent = '{}.{}'.format(self.schema, parent)
+                queries[fk.name] = (
+                    'SELECT COUNT(DISTINCT c.{column}) '
+                    'FROM {schema}.{table} c '
+                    'LEFT JOIN {parent} p ON p.{parent_column} = c.{column} '
+                    'WHERE p.{parent_column} IS NULL'.format(
+                        column=fk.column, schema=self.schema, table=fk.table,
+                        parent=parent, parent_column=fk.parent_column))
+
+        orphans = {}
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for name, query in sorted(queries.items()):
+                cursor.execute(query)
+                orphans[name] = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            connection.close()
+        return orphans
+
+    def model_partitions(self):
+        """List the partitions of a partitioned covariate.model table.
+
+        Returns:
+            a list of (partition name, exclusive upper bound on
+            model_version_id, estimated row count) tuples in partition order.
+            The final partition's bound is 'MAXVALUE'.
+        """
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT partition_name, partition_description, table_rows "
+                "FROM information_schema.partitions "
+                "WHERE table_schema = %s AND table_name = 'model' "
+                "ORDER BY partition_ordinal_position", (self.schema,))
+            partitions = [tuple(row) for row in cursor.fetchall()]
+            cursor.close()
+        finally:
+            connection.close()
+        return partitions
+
+    def split_model_partition(self, less_than):
+        """Carve a new partition for model_version_ids below less_than out of
+        the catch-all pmax partition, ahead of those versions being loaded.
+
+        Arguments:
+            less_than (int): the new partition's exclusive upper bound.
+
+        Returns:
+            a list of StatementResult.
+        """
+        statement = (
+            'ALTER TABLE {schema}.model REORGANIZE PARTITION pmax INTO ('
+            'PARTITION p{bound} VALUES LESS THAN ({bound}), '
+            'PARTITION pmax VALUES LESS THAN MAXVALUE)'.format(
+                schema=self.schema, bound=int(less_than)))
+        return self._execute_statements('partition', [statement])
+
+    def truncate_model_partition(self, partition):
+        """Empty one partition of covariate.model, removing every model
+        version it holds without a row-by-row DELETE.
+
+        Arguments:
+            partition (str): the partition name, as listed by
+                model_partitions().
+
+        Returns:
+            a list of StatementResult.
+        """
+        statement = ('ALTER TABLE {schema}.model TRUNCATE PARTITION {name}'
+                     .format(schema=self.schema, name=partition))
+        return self._execute_statements('partition', [statement])
+
+    @contextmanager
+    def transactional_session(self):
+        """Yield a session whose work is all rolled back on exit.
+
+        The session is bound to a connection inside an outer transaction and
+        starts in a SAVEPOINT. Every commit() releases the current savepoint
+        and immediately opens a new one, so code under test can commit as
+        usual while nothing it writes outlives the block. AUTO_INCREMENT
+        counters are not transactional and will still advance.
+
+        Yields:
+            sqlalchemy.orm.Session bound to the covariate server, with our
+            schema as the default.
+        """
+        connection = self.engine.connect()
+        connection.execute('USE {}'.format(self.schema))
+        transaction = connection.begin()
+        session = Session(bind=connection)
+        session.begin_nested()
+
+        @event.listens_for(session, 'after_transaction_end')
+        def restart_savepoint(sesh, trans):
+            if trans.nested and not trans._parent.nested:
+                sesh.expire_all()
+                sesh.begin_nested()
+
+        try:
+            yield session
+        finally:
+            session.close()
+            transaction.rollback()
+            connection.close()
+
+    def reset(self):
+        """Empty every covariate table while leaving the DDL in place.
+
+        Tables are truncated in reverse build order, children before the
+        tables they reference, with foreign key checks off since InnoDB
+        refuses to truncate a referenced table otherwise. TRUNCATE also resets
+        AUTO_INCREMENT to 1, so each table is put back to the start declared
+        in its building_blocks script.
+
+        Returns:
+            a list of StatementResult covering every statement executed.
+        """
+        auto_increments = self.auto_increment_starts()
+        statements = []
+        build_order = [table for level in self.build_levels()
+                       for table in level]
+        for table in reversed(build_order):
+            statements.append('TRUNCATE TABLE {schema}.{table}'.format(
+                schema=self.schema, table=table))
+            if table in auto_increments:
+                statements.append(
+                    'ALTER TABLE {schema}.{table} AUTO_INCREMENT = {start}'
+                    .format(schema=self.schema, table=table,
+                            start=auto_increments[table]))
+        return self._execute_without_foreign_key_checks('reset', statements)
+
+    def auto_increment_starts(self):
+        """Return the AUTO_INCREMENT start each table is created with.
+
+        Read from the CREATE TABLE statements in the building_blocks scripts.
+        Tables declared with AUTO_INCREMENT=0 or without one are left out.
+
+        Returns:
+            a dict of table name to starting AUTO_INCREMENT value.
+        """
+        starts = {}
+        for table, script in zip(self.table_names, self.tables):
+            sql_script = os.path.join(this_dir, 'building_blocks', script)
+            for statement in parse_sql_script(sql_script):
+                if not statement.upper().startswith('CREATE TABLE'):
+                    continue
+                match = re.search(r'AUTO_INCREMENT\s*=\s*(\d+)', statement,
+                                  re.IGNORECASE)
+                if match and int(match.group(1)) > 1:
+                    starts[table] = int(match.group(1))
+        return starts
+
+    def snapshot(self):
+        """Capture the DDL of the current covariate schema so it can be
+        recreated later by restore().
+
+        SHOW CREATE TABLE gives us each table with its keys, indexes, foreign
+        keys, and AUTO_INCREMENT start already folded into one statement.
+
+        Returns:
+            the list of captured CREATE TABLE statements.
+        """
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            ddl = []
+            for table in self.table_names:
+                cursor.execute('SHOW CREATE TABLE {schema}.{table}'.format(
+                    schema=self.schema, table=table))
+                ddl.append(cursor.fetchone()[1])
+            cursor.close()
+        finally:
+            connection.close()
+
+        self._snapshots[self._snapshot_key] = ddl
+        return ddl
+
+    def restore(self):
+        """Drop the covariate schema and recreate it from the last snapshot.
+
+        Replaying one CREATE TABLE per table with foreign key checks off
+        avoids the table rebuild every ALTER TABLE ... ADD CONSTRAINT in the
+        building_blocks scripts triggers.
+
+        Returns:
+            a list of StatementResult covering every statement executed.
+
+        Raises:
+            KeyError: if no snapshot has been taken against this server.
+        """
+        ddl = self._snapshots[self._snapshot_key]
+        statements = ['DROP SCHEMA IF EXISTS {}'.format(self.schema),
+                      'CREATE SCHEMA {}'.format(self.schema),
+                      'USE {}'.format(self.schema)] + ddl
+        return self._execute_without_foreign_key_checks('snapshot',
+                                                        statements)
+
+    def _execute_without_foreign_key_checks(self, script, statements):
+        """Execute statements in order with foreign key checks off, on a
+        pooled connection of their own.
+
+        Checks are turned back on whether or not every statement succeeds,
+        since the connection goes back to the pool afterwards. If even that
+        fails, the connection is thrown away instead, so nothing later
+        borrows a connection that quietly accepts orphaned rows.
+
+        Arguments:
+            script (str): where the statements came from, for reporting.
+            statements (list of str): the statements to execute.
+
+        Returns:
+            a list of StatementResult, one per statement, including those
+            turning the checks off and on again.
+        """
+        connection = self.engine.raw_connection()
+        try:
+            return self._execute_statements(
+                script,
+                ['SET FOREIGN_KEY_CHECKS = 0'] + statements +
+                ['SET FOREIGN_KEY_CHECKS = 1'],
+                connection)
+        except Exception:
+            try:
+                cursor = connection.cursor()
+                cursor.execute('SET FOREIGN_KEY_CHECKS = 1')
+                cursor.close()
+            except Exception:
+                connection.invalidate()
+            raise
+        finally:
+            connection.close()
+
+
+# A FOREIGN KEY declared in one of our building_blocks scripts.
+ForeignKey = namedtuple('ForeignKey', ['name', 'table', 'column',
+                                       'parent_table', 'parent_column'])
+
+
+def foreign_keys(sql_script):
+    """Return the single-column foreign keys a SQL script adds.
+
+    Arguments:
+        sql_script (str, path): the absolute path to the SQL script.
+
+    Returns:
+        a list of ForeignKey, in script order.
+    """
+    pattern = re.compile(
+        r'ALTER\s+TABLE\s+`?(\w+)`?\s+ADD\s+CONSTRAINT\s+`?(\w+)`?\s+'
+        r'FOREIGN\s+KEY\s*\(\s*`?(\w+)`?\s*\)\s*'
+        r'REFERENCES\s+`?([\w.]+)`?\s*\(\s*`?(\w+)`?\s*\)',
+        re.IGNORECASE)
+    keys = []
+    for statement in parse_sql_script(sql_script):
+        match = pattern.match(statement)
+        if match:
+            table, name, column, parent_table, parent_column = match.groups()
+            keys.append(ForeignKey(name, table, column, parent_table,
+                                   parent_column))
+    return keys
+
+
+def _table_name(sql_script):
+    """The name of the table a building_blocks script creates."""
+    for statement in parse_sql_script(sql_script):
+        match = re.match(r'CREATE\s+TABLE\s+`?(\w+)`?', statement,
+                         re.IGNORECASE)
+        if match:
+            return match.group(1)
+    raise ValueError('{} does not create a table'.format(sql_script))
+
+
+class DeferredConstraints(object):
+    """The foreign keys, unique constraints, and secondary indexes held back
+    by CovariateDB.build_db(defer_constraints=True).
+
+    Attributes:
+        results (list of StatementResult): what build_db already executed.
+        deferred (list of tuple): (script, statements) pairs still to run, one
+            per table.
+    """
+
+    def __init__(self, cov_db, results, deferred):
+        self.cov_db = cov_db
+        self.results = results
+        self.deferred = deferred
+
+    def finalize(self, max_workers=None):
+        """Apply the held back statements.
+
+        Each table's statements run in their original script order on their
+        own connection, and tables are finalized concurrently. Building each
+        index once over the loaded rows gives a sorted, compact B-tree, and
+        every foreign key is checked against the existing rows as it is
+        added.
+
+        Arguments:
+            max_workers (int, optional): the most tables to finalize at once.
+
+        Returns:
+            a list of StatementResult covering every statement executed.
+
+        Raises:
+            SQLScriptError: if the loaded rows violate a constraint.
+        """
+        results = []
+        if not self.deferred:
+            return results
+
+        workers = max_workers or len(self.deferred)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for table_results in executor.map(
+                    lambda held_back: self.cov_db._execute_statements(
+                        *held_back),
+                    self.deferred):
+                results.extend(table_results)
+        self.deferred = []
+        return results
+
+
+def _is_deferrable(statement):
+    """Whether a building_blocks statement adds a constraint or an index
+    rather than creating the table itself."""
+    return bool(re.match(r'(ALTER\s+TABLE\s+\S+\s+ADD\s+CONSTRAINT|'
+                         r'CREATE\s+(UNIQUE\s+)?INDEX)\b',
+                         statement, re.IGNORECASE))
+
+
+def _server_error(exc):
+    """Pull the (code, message) pair out of a DBAPI exception.
 
-        # Build the tables in order
-        for table in self.tables:
-            table_sql_script = os.path.join(this_dir, 'building_blocks', table)
-            self.execute_sql_script(table_sql_script)
+    MySQL drivers put the server error number and message in exc.args.
+    Anything else is reported with a code of None.
+    """
+    args = getattr(exc, 'args', ())
+    if len(args) >= 2 and isinstance(args[0], int):
+        return args[0], args[1]
+    return None, str(exc)
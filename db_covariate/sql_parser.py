@@ -0,0 +1,212 @@
+"""Split MySQL scripts into individual statements.
+
+The lexer reads a script a line at a time and yields each statement as soon as
+its delimiter is seen, so arbitrarily large seed or dump files never have to be
+held in memory. It understands the parts of mysql client syntax our scripts
+use:
+
+    - '-- ', '#', and '/* */' comments (MySQL '/*! */' version comments are
+      kept, since the server executes them)
+    - single, double, and backtick quoted strings, including backslash escapes
+      and doubled quotes, so delimiters and comment markers inside a string
+      are left alone
+    - DELIMITER lines, which change the statement terminator for trigger and
+      stored procedure bodies
+"""
+import hashlib
+import json
+import os
+import re
+
+
+DEFAULT_DELIMITER = ';'
+
+# Parsed scripts keyed on the sha1 of their contents.
+_cache = {}
+
+# The characters that can start something the lexer has to treat specially
+# while outside of a string or comment.
+_SPECIAL = re.compile(r"""['"`#]|--|/\*""")
+
+_DELIMITER_LINE = re.compile(r'^\s*DELIMITER\s+(\S+)\s*$', re.IGNORECASE)
+
+
+def iter_statements(lines, delimiter=DEFAULT_DELIMITER):
+    """Yield the statements in a SQL script as they are read.
+
+    Arguments:
+        lines (iterable of str): the script, one line at a time. An open file
+            works.
+        delimiter (str): the statement terminator to start with.
+
+    Yields:
+        each statement, stripped of comments, surrounding whitespace, and its
+        terminating delimiter.
+    """
+    statement = []
+    # Whether statement holds anything besides whitespace yet.
+    started = False
+    # None outside of a quoted string, otherwise the quote character.
+    quote = None
+    in_comment = False
+
+    for line in lines:
+        if quote is None and not in_comment and not started:
+            match = _DELIMITER_LINE.match(line)
+            if match:
+                delimiter = match.group(1)
+                statement = []
+                continue
+
+        pos = 0
+        while pos < len(line):
+            if in_comment:
+                end = line.find('*/', pos)
+                if end == -1:
+                    break
+                in_comment = False
+                pos = end + 2
+                continue
+
+            if quote is not None:
+                end = _end_of_quote(line, pos, quote)
+                if end == -1:
+                    statement.append(line[pos:])
+                    break
+                statement.append(line[pos:end])
+                quote = None
+                pos = end
+                continue
+
+            special = _SPECIAL.search(line, pos)
+            stop = line.find(delimiter, pos)
+            if stop != -1 and (special is None or stop < special.start()):
+                statement.append(line[pos:stop])
+                text = ''.join(statement).strip()
+                if text:
+                    yield text
+                statement = []
+                started = False
+                pos = stop + len(delimiter)
+                continue
+
+            end = len(line) if special is None else special.start()
+            statement.append(line[pos:end])
+            started = started or bool(line[pos:end].strip())
+            if special is None:
+                break
+
+            token = special.group()
+            if token in ('"', "'", '`'):
+                statement.append(token)
+                started = True
+                quote = token
+                pos = end + 1
+            elif token == '/*':
+                if line.startswith('/*!', end):
+                    close = line.find('*/', end)
+                    if close == -1:
+                        raise ValueError('Version comments spanning lines '
+                                         'are not supported: {}'.format(line))
+                    statement.append(line[end:close + 2])
+                    started = True
+                    pos = close + 2
+                else:
+                    # A dropped comment still separates the tokens around
+                    # it, as in SELECT 1/*c*/FROM t.
+                    if end and not line[end - 1].isspace():
+                        statement.append(' ')
+                    in_comment = True
+                    pos = end + 2
+            elif token == '--' and not _starts_comment(line, end + 2):
+                statement.append(token)
+                started = True
+                pos = end + 2
+            else:
+                # A '-- ' or '#' comment runs to the end of the line.
+                statement.append('\n' if line.endswith('\n') else '')
+                break
+
+    text = ''.join(statement).strip()
+    if quote is not None:
+        raise ValueError('Unterminated {} quoted string: {}'.format(quote,
+                                                                    text))
+    if text:
+        yield text
+
+
+def _starts_comment(line, pos):
+    """'--' only starts a comment when followed by whitespace, a control
+    character, or the end of the line."""
+    return pos >= len(line) or line[pos] <= ' '
+
+
+def _end_of_quote(line, pos, quote):
+    """Return the index just past the quote that closes a string started before
+    pos, or -1 if the string continues past the end of the line."""
+    while pos < len(line):
+        char = line[pos]
+        if char == '\\' and quote != '`':
+            pos += 2
+        elif char == quote:
+            if line.startswith(quote * 2, pos):
+                pos += 2
+            else:
+                return pos + 1
+        else:
+            pos += 1
+    return -1
+
+
+def file_hash(sql_script):
+    """Return the sha1 hex digest of a file's contents, read in blocks."""
+    digest = hashlib.sha1()
+    with open(sql_script, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_sql_script(sql_script, cache_dir=None):
+    """Return the statements in a SQL script, caching the result.
+
+    Results are cached in memory, and on disk when cache_dir or the
+    DB_COVARIATE_SQL_CACHE environment variable names a directory. Both caches
+    are keyed on the sha1 of the script's contents, so an edited script is
+    always parsed again. Use iter_statements() on an open file instead for
+    scripts too large to hold in memory.
+
+    Arguments:
+        sql_script (str, path): the absolute path to the SQL script.
+        cache_dir (str, path, optional): directory for the on-disk cache.
+
+    Returns:
+        a list of statements in script order.
+    """
+    key = file_hash(sql_script)
+    if key in _cache:
+        return list(_cache[key])
+
+    cache_dir = cache_dir or os.environ.get('DB_COVARIATE_SQL_CACHE')
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, '{}.json'.format(key))
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r') as f:
+                _cache[key] = json.load(f)
+            return list(_cache[key])
+
+    with open(sql_script, 'r') as f:
+        statements = list(iter_statements(f))
+    _cache[key] = statements
+
+    if cache_file:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # Write to a temporary name first so concurrent runs never read a
+        # partially written cache file.
+        tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump(statements, f)
+        os.rename(tmp_file, cache_file)
+    return list(statements)
@@ -1,14 +1,109 @@
 import argparse
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
 import os
+import queue
+import threading
+import time
+import traceback
 
 from db_tools.query_tools import exec_query, query_2_df
 from db_tools.ezfuncs import get_session
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
 
+from db_covariate.make_schema import foreign_keys
+from db_covariate.sql_parser import parse_sql_script
+from etl_bulk import bulk_session, copy_query
+from etl_pipeline import Stage, StageError, downstream, run_stages
+from etl_retry import (LOCK_WAIT_TIMEOUT, backoff_delays, is_data_error,
+                       is_transient, server_error_code)
+from etl_throttle import Throttle
+from etl_chunks import (INT_MAX, INT_MIN, KEYSET_COLUMNS, YEAR_MAX,
+                        YEAR_MIN, Chunk, ChunkSizer, KeysetChunk, Progress,
+                        format_duration, last_chunks, lpt_makespan, lpt_order,
+                        plan_chunks)
 
-TABLE_CREATE_SCRIPTS = ['model_version_etl.sql', 'model_etl.sql']
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Per-process state for parallel copy workers, set up by _init_copy_worker.
+_worker_session = None
+_worker_sql_lines = None
+_worker_sizer = None
+_worker_source = None
+_worker_throttle = None
+
+
+# The covariate.model columns folded into each row's verification checksum,
+# besides model_version_id.
+CHECKSUM_COLUMNS = ['year_id', 'location_id', 'sex_id', 'age_group_id',
+                    'mean_value', 'upper_value', 'lower_value']
+
+# Model versions whose rows are estimated per EXPLAIN.
+ESTIMATE_BATCH_SIZE = 500
+
+# Model versions checksummed per query by verify_model_versions.
+VERIFY_BATCH_SIZE = 20
+
+# Cutover refuses to run while any other transaction has been open this many
+# seconds, since the RENAME would queue behind it holding every reader up.
+LONG_TRANSACTION_SECONDS = 60
+
+# Seconds the cutover RENAME waits for metadata locks before giving up.
+CUTOVER_LOCK_WAIT_SECONDS = 10
+
+# The renames that swap the _new tables in, applied left to right.
+CUTOVER_RENAMES = [('model', 'model_old'),
+                   ('model_new', 'model'),
+                   ('model_version', 'model_version_old'),
+                   ('model_version_new', 'model_version')]
+
+# How far before a pass starts its watermark is set. A row updated by a
+# transaction that was already open when the pass read the table can carry a
+# last_updated from before the pass started, so successive passes overlap by
+# this many seconds. Rewriting a row that was already synced is harmless.
+SYNC_OVERLAP_SECONDS = 300
+
+# How many times a transaction that hit a deadlock, lock wait timeout, or
+# lost connection is retried before its chunk is given up on.
+TRANSIENT_RETRIES = 5
+
+TABLE_CREATE_SCRIPTS = ['model_version_etl.sql', 'model_etl.sql',
+                        'etl_checkpoint.sql', 'etl_watermark.sql',
+                        'etl_dead_letter.sql']
+# Appended to a copy statement, which ends with its WHERE clause, to leave
+# out the covariate.model rows already set aside in etl_dead_letter.
+WITHOUT_DEAD_LETTERS = """
+  AND NOT EXISTS (SELECT 1
+                  FROM covariate.etl_dead_letter d
+                  WHERE d.model_version_id = m.model_version_id
+                    AND d.year_id = m.year_id
+                    AND d.location_id = m.location_id
+                    AND d.sex_id = m.sex_id
+                    AND d.age_group_id = m.age_group_id)"""
+
+# The most covariate.model rows --plan copies to measure the copy rate.
+CALIBRATION_ROWS = 50000
+
+# Creates covariate.etl_stage if it is missing. Unlike the tables above it is
+# kept from run to run, since it is what a rerun resumes from.
+STAGE_SCRIPT = 'etl_stage.sql'
 TABLE_COPY_SCRIPTS = {
     'model_version': 'model_version_copy.sql',
-    'model': 'model_copy.sql'
+    'model': 'model_copy.sql',
+    'model_keyset': 'model_copy_keyset.sql'
+}
+# Upserts of just the rows changed since a watermark, for --incremental.
+TABLE_SYNC_SCRIPTS = {
+    'model_version': 'model_version_sync.sql',
+    'model': 'model_sync.sql'
+}
+# The same copies as SELECTs, for loading into another server with --source.
+TABLE_EXTRACT_SCRIPTS = {
+    'model_version': 'model_version_extract.sql',
+    'model': 'model_extract.sql'
 }
 
 
@@ -31,35 +126,96 @@ def create_schema(sesh, root_dir):
         sesh.commit()
 
 
-def parse_sql_script(script):
-    """
-    Accepts a path to a sql script and parses the script to convert the
-    individual commands into elements in a list.
-
-    Requires the end of each SQL command to have '--' characters (SQL's inline
-    comment). This is necessary for identifying multi-line SQL commands and
-    parsing them appropriately.
-
-    Arguments:
-        script (str, path): the absolute path to the SQL script.
-
-    Returns:
-        a list of individual SQL commands contained in the script.
-    """
-    with open(script, 'r') as f:
-        raw_sql = f.read()
-
-    sql_lines = [x for x in raw_sql.replace('\n', '').split('--') if ';' in x]
-    return sql_lines
-
-
 def parse_args():
-    """Accept cmd line arguments to determine either test or prod servers."""
+    """Accept cmd line arguments to determine either test or prod servers,
+    and how many covariate.model rows to copy per transaction."""
     parser = argparse.ArgumentParser()
     parser.add_argument('--prod', type=str, default='test')
+    parser.add_argument('--rows-per-transaction', type=int, default=250000,
+                        help='the number of covariate.model rows to aim for '
+                             'in each copy transaction')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='the number of processes copying covariate.model '
+                             'chunks at once')
+    parser.add_argument('--exact-counts', action='store_true',
+                        help='plan chunks from exact row counts instead of '
+                             'index estimates; this scans all of '
+                             'covariate.model')
+    parser.add_argument('--restart', action='store_true',
+                        help='forget which stages earlier runs completed and '
+                             'start over from creating the _new tables; '
+                             'otherwise a run resumes from the first stage '
+                             'not yet complete')
+    parser.add_argument('--keyset', action='store_true',
+                        help='copy model versions larger than '
+                             '--rows-per-transaction by walking their primary '
+                             'key, committing every --rows-per-transaction '
+                             'rows')
+    parser.add_argument('--target-seconds', type=float, default=None,
+                        help='with --keyset, resize each slice to take about '
+                             'this long at the copy rate just measured, '
+                             'starting from --rows-per-transaction rows')
+    parser.add_argument('--fast-load', action='store_true',
+                        help='copy covariate.model with foreign key and '
+                             'unique checks off, then check every foreign '
+                             'key of model_new in one pass afterwards and '
+                             'set aside the rows that break one')
+    parser.add_argument('--cutover', action='store_true',
+                        help='once every model version is copied and '
+                             'verified, swap model_new and model_version_new '
+                             'in for the live tables, keeping those as '
+                             'model_old and model_version_old')
+    parser.add_argument('--rollback-cutover', action='store_true',
+                        help='swap model_old and model_version_old back in '
+                             'for the tables a --cutover replaced, and exit')
+    parser.add_argument('--incremental', action='store_true',
+                        help='after copying, bring the _new tables up to '
+                             'date with the rows inserted or updated, '
+                             'including those marked deleted, since the '
+                             'last copy or incremental pass, and verify '
+                             'them again')
+    parser.add_argument('--max-threads-running', type=int, default=50,
+                        help='pause the copy while more queries than this '
+                             'are running on the server')
+    parser.add_argument('--max-history-length', type=int, default=1000000,
+                        help='pause the copy while the InnoDB history list '
+                             'is longer than this')
+    parser.add_argument('--max-replica-lag', type=int, default=30,
+                        help='pause the copy while any --replica is more '
+                             'than this many seconds behind')
+    parser.add_argument('--replica', action='append', default=[],
+                        help='the db_tools connection definition of a '
+                             'replica whose lag to watch; may be repeated')
+    parser.add_argument('--max-throttle-wait', type=int, default=3600,
+                        help='give up on the copy if the server stays over '
+                             'any of these limits for this many seconds at '
+                             'a time')
+    parser.add_argument('--no-throttle', action='store_true',
+                        help='copy flat out, without checking server load')
+    parser.add_argument('--plan', action='store_true',
+                        help='list the model versions a full copy would '
+                             'copy with their estimated rows and bytes, the '
+                             'chunks it would copy them in, and how long it '
+                             'would take, then exit without changing '
+                             'anything')
+    parser.add_argument('--source', type=str, default=None,
+                        help='the db_tools connection definition of the '
+                             'server to copy from, when it is not the '
+                             'target server; rows are spooled to local files '
+                             'under TMPDIR and loaded with LOAD DATA')
 
     args = parser.parse_args()
-    return args.prod
+    if args.target_seconds is not None and not args.keyset:
+        # Only keyset slices are resized as the copy goes.
+        parser.error('--target-seconds can only be used with --keyset')
+    if args.source and args.keyset:
+        parser.error('--keyset cannot be used with --source')
+    if args.source and args.incremental:
+        parser.error('--incremental cannot be used with --source')
+    if args.source and (args.cutover or args.rollback_cutover):
+        # The target server has no live tables to swap the _new ones in for.
+        parser.error('--cutover cannot be used with --source')
+    return args
 
 
 def get_model_version_ids(sesh):
@@ -78,102 +234,1995 @@ def get_model_version_ids(sesh):
     return res.model_version_id.tolist()
 
 
-def write_success_file(code_dir, completed_mvids):
+def get_model_version_rows(sesh, model_version_ids):
+    """Return the number of covariate.model rows for each model version.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        model_version_ids (intlist): the model versions to count, in the
+            order they will be copied.
+
+    Returns:
+        a list of (model_version_id, row count) pairs in the same order as
+        model_version_ids. Versions with no rows are counted as 0.
+    """
+    q = """
+        SELECT model_version_id, COUNT(*) AS row_count
+        FROM covariate.model
+        WHERE model_version_id IN :model_version_ids
+        GROUP BY model_version_id
     """
-    Save a log of the model_version_ids successfully ETL'ed to the new table.
+    params = {'model_version_ids': tuple(model_version_ids)}
+    counts = dict(sesh.execute(q, params=params).fetchall())
+    return [(mvid, int(counts.get(mvid, 0))) for mvid in model_version_ids]
+
+
+def estimate_model_version_rows(sesh, model_version_ids):
+    """Estimate the number of covariate.model rows for each model version.
+
+    Each estimate is the optimizer's index dive into the primary key for one
+    model_version_id, which reads a handful of index pages no matter how big
+    the version is, unlike an exact count. EXPLAIN of a UNION ALL reports
+    every SELECT in it separately, so ESTIMATE_BATCH_SIZE versions are
+    estimated per round trip.
 
     Arguments:
-        code_dir (str, path): our code directory
-        completed_mvids (intlist): A list of successfully copied
-            model_version_ids
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        model_version_ids (intlist): the model versions to estimate.
+
+    Returns:
+        a list of (model_version_id, estimated rows) pairs in the same order
+        as model_version_ids.
     """
-    with open(os.path.join(code_dir, 'complete.txt'), 'w') as f:
-        f.write('model_versions completed:')
-        for mvid in completed_mvids:
-            f.write("{}".format(mvid))
+    ids = [int(mvid) for mvid in model_version_ids]
+    estimates = {}
+    for start in range(0, len(ids), ESTIMATE_BATCH_SIZE):
+        batch = ids[start:start + ESTIMATE_BATCH_SIZE]
+        q = 'EXPLAIN {}'.format(' UNION ALL '.join(
+            'SELECT 1 FROM covariate.model WHERE model_version_id = {}'.format(
+                mvid) for mvid in batch))
+        res = query_2_df(q, session=sesh)
+        # SELECTs are numbered from 1 in the order written; the UNION RESULT
+        # row, if any, has no id.
+        res = res[res.id.notnull()]
+        for select_id, rows in zip(res.id, res.rows.fillna(0)):
+            estimates[batch[int(select_id) - 1]] = int(rows)
+    return [(mvid, estimates.get(int(mvid), 0)) for mvid in model_version_ids]
 
 
-def main():
-    """The main function is responsible for running the full ETL pipeline from
-    front to back.
+def get_model_row_bytes(sesh):
+    """Return the average size of a covariate.model row in bytes, from the
+    table statistics. Secondary indexes are not counted.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to the server
+            holding covariate.model.
+    """
+    q = """
+        SELECT avg_row_length
+        FROM information_schema.tables
+        WHERE table_schema = 'covariate'
+          AND table_name = 'model'
+    """
+    row_bytes = sesh.execute(q).scalar()
+    sesh.rollback()
+    return int(row_bytes or 0)
 
-    First we will create the variables needed to generate our tables: including
-    the directories, file names, and database server we'll point to.
 
-    Next we will create the database schema and build the empty tables. The
-    empty tables will have '_new' attached to the end of them. This will allow
-    us to copy data over from the existing table before dropping the existing
-    table and renaming the '_new' table with the original table name.
+def get_year_rows(sesh, model_version_id):
+    """Return the number of covariate.model rows in each year of one model
+    version. This is a range scan over the primary key prefix.
 
-    Finally we will ETL the data. The model_version table is small enough that
-    we can just copy the entire table (except for models from GBD Round 3 and
-    earlier).
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        model_version_id (int): the model version to count.
 
-    For the model table, we will iterate over the individual model_version_ids
-    and copy all the data from the model table one model_version at a time.
+    Returns:
+        a list of (year_id, row count) pairs in year_id order.
     """
-    code_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+    q = """
+        SELECT year_id, COUNT(*) AS row_count
+        FROM covariate.model
+        WHERE model_version_id = {mvid}
+        GROUP BY year_id
+        ORDER BY year_id
+    """.format(mvid=int(model_version_id))
+    res = query_2_df(q, session=sesh)
+    return [(int(year_id), int(count))
+            for year_id, count in zip(res.year_id, res.row_count)]
 
-    environment = parse_args()
 
-    if environment == 'prod':
-        sesh = get_session('covariate')
-    else:
-        sesh = get_session('covariate-test')
+def copy_model_chunks(sesh, chunks, sql_lines, sizer, source=None,
+                      throttle=None):
+    """Copy covariate.model into model_new one chunk per transaction.
+
+    Once a chunk of a model version fails, the rest of that version's chunks
+    are skipped.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        chunks (list of etl_chunks.Chunk): the copy plan, in order.
+        sql_lines (list of str): the parsed model_copy.sql statements.
+        sizer (etl_chunks.ChunkSizer): sizes KeysetChunk slices.
+        source (sqlalchemy.orm.session.Session, optional): connection to the
+            server to copy from, if not sesh's.
+        throttle (etl_throttle.Throttle, optional): waits out server load
+            before each transaction.
+
+    Returns:
+        (completed, failed) lists of model_version_ids. A version is only
+        completed once every chunk holding it has been committed.
+    """
+    last = last_chunks(chunks)
+    progress = Progress(chunks, 1)
+    completed = []
+    failed = []
+
+    for index, chunk in enumerate(chunks):
+        if any(mvid in failed for mvid in chunk.model_version_ids):
+            progress.chunk_done(index, copied=False)
+            continue
+        try:
+            copy_chunk(sesh, chunk, sql_lines, sizer, source, throttle)
+        except StageError:
+            # The throttle gave up; later chunks would only wait as long.
+            raise
+        except Exception as e:  # I'm unsure what the exception could be
+            failed.extend(chunk.model_version_ids)
+            print(e)
+            print(failed)
+            progress.chunk_done(index, copied=False)
+        else:
+            completed.extend(mvid for mvid in chunk.model_version_ids
+                             if last[mvid] == index)
+            progress.chunk_done(index)
+        print(progress)
+
+    return completed, failed
+
+
+def copy_chunk(sesh, chunk, sql_lines, sizer, source=None, throttle=None):
+    """Copy one chunk of covariate.model into model_new, checkpoint it, and
+    commit both together. A KeysetChunk is handed to copy_keyset_chunk
+    instead.
+
+    A chunk that hits a deadlock, lock wait timeout, or lost connection is
+    rolled back and retried up to TRANSIENT_RETRIES times, after a jittered
+    exponential backoff. Rows that can't be written are set aside in
+    covariate.etl_dead_letter by copy_chunk_rows. A chunk that fails any
+    other way, or keeps failing, is rolled back and checkpointed as failed.
+
+    With a source, the chunk is read from the source server and loaded into
+    sesh's with LOAD DATA, and sql_lines are the model_extract.sql
+    statements.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        chunk (etl_chunks.Chunk): the rows to copy.
+        sql_lines (list of str): the parsed model_copy.sql statements.
+        sizer (etl_chunks.ChunkSizer): sizes KeysetChunk slices.
+        source (sqlalchemy.orm.session.Session, optional): connection to the
+            server to copy from, if not sesh's.
+        throttle (etl_throttle.Throttle, optional): waits out server load
+            before each transaction.
+
+    Raises:
+        whatever the database raised, after rolling the chunk back.
+    """
+    if isinstance(chunk, KeysetChunk):
+        copy_keyset_chunk(sesh, chunk, sizer, throttle)
+        return
+
+    delays = backoff_delays(TRANSIENT_RETRIES)
+    while True:
+        if throttle is not None:
+            throttle.wait(sesh, source)
+        start = time.time()
+        try:
+            copy_chunk_rows(sesh, chunk, sql_lines, source)
+            record_checkpoint(sesh, chunk, time.time() - start)
+            sesh.commit()
+            return
+        except Exception as e:
+            discard_transaction(sesh)
+            delay = next(delays, None) if is_transient(e) else None
+            if delay is not None:
+                print('{} copying model_version_ids {}, retrying in '
+                      '{:.1f}s'.format(e, chunk.model_version_ids, delay))
+                time.sleep(delay)
+                continue
+            try:
+                record_failure(sesh, chunk, e)
+            except Exception:
+                # The connection itself may be gone; the original error is
+                # the one worth raising.
+                discard_transaction(sesh)
+            raise
+
+
+def discard_transaction(sesh):
+    """Roll back sesh's transaction, or close sesh if even that fails, as it
+    can once the connection is gone. Either way sesh can be used again, and
+    nothing is raised that would hide the error being handled.
 
-    # Create our tables
-    for table in TABLE_CREATE_SCRIPTS:
-        sql_script = os.path.join(code_dir, table)
-        # Parse into a list of individual commands
-        sql_lines = parse_sql_script(sql_script)
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): the session to roll back.
+    """
+    try:
+        sesh.rollback()
+    except Exception:
+        sesh.close()
+
+
+def copy_chunk_rows(sesh, chunk, sql_lines, source=None):
+    """Copy the rows of one chunk in the current transaction.
 
-        # Run those commands one at a time and commit the session.
+    If a row can't be written, the transaction is rolled back, the chunk's
+    rows that break a foreign key are set aside by set_aside_orphans, and
+    the chunk is copied again without them. Rows loaded from a source
+    server are not set aside, since the check runs on this server.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        chunk (etl_chunks.Chunk): the rows to copy.
+        sql_lines (list of str): the parsed model_copy.sql statements, or
+            model_extract.sql with a source.
+        source (sqlalchemy.orm.session.Session, optional): connection to the
+            server to copy from, if not sesh's.
+    """
+    try:
         for line in sql_lines:
-            exec_query(line, session=sesh)
+            if source is None:
+                sesh.execute(line, params=chunk.params)
+            else:
+                copy_query(source, sesh, line, chunk.params,
+                           'covariate.model_new')
+    except Exception as e:
+        if source is not None or not is_data_error(e):
+            raise
+        sesh.rollback()
+        after, through = chunk.key_range
+        if not set_aside_orphans(sesh, 'model', chunk.model_version_ids,
+                                 after, through):
+            raise
+        for line in sql_lines:
+            sesh.execute(line + WITHOUT_DEAD_LETTERS, params=chunk.params)
+
+
+def copy_keyset_chunk(sesh, chunk, sizer, throttle=None):
+    """Copy one large model version into model_new a slice at a time.
+
+    Each slice runs from just past the last primary key copied through the
+    key sizer.rows rows further on, found with a walk of the primary key
+    index, and commits together with its position in covariate.etl_checkpoint.
+    Every slice's timing goes back to sizer to size the next one, and the
+    slice after any wait on the throttle is smaller too. A slice that hits a
+    deadlock, lock wait timeout, or lost connection is rolled back and
+    retried like a chunk in copy_chunk, at a smaller size after a lock wait
+    timeout. Rows that can't be written are set aside by copy_key_range. A
+    copy that stopped partway starts again just past the last committed
+    slice. A failed slice is rolled back and the version checkpointed as
+    failed, keeping the position of the slices already committed.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        chunk (etl_chunks.KeysetChunk): the model version to copy.
+        sizer (etl_chunks.ChunkSizer): sizes each slice.
+        throttle (etl_throttle.Throttle, optional): waits out server load
+            before each transaction.
+
+    Raises:
+        whatever the database raised, after rolling the slice back.
+    """
+    mvid = chunk.model_version_ids[0]
+    after = get_keyset_positions(sesh).get(mvid, (INT_MIN,) * 4)
+
+    delays = backoff_delays(TRANSIENT_RETRIES)
+    while True:
+        if throttle is not None and throttle.wait(sesh):
+            sizer.back_off()
+        start = time.time()
+        try:
+            through = next_keyset_boundary(sesh, mvid, after, sizer.rows)
+            is_last = through is None
+            if is_last:
+                through = (INT_MAX,) * 4
+            row_count = copy_key_range(sesh, mvid, after, through)
+            record_keyset_position(sesh, chunk, through, row_count,
+                                   time.time() - start, is_last)
             sesh.commit()
+        except Exception as e:
+            discard_transaction(sesh)
+            delay = next(delays, None) if is_transient(e) else None
+            if delay is not None:
+                if server_error_code(e) == LOCK_WAIT_TIMEOUT:
+                    sizer.back_off()
+                print('{} copying model_version_id {}, retrying {} rows in '
+                      '{:.1f}s'.format(e, mvid, sizer.rows, delay))
+                time.sleep(delay)
+                continue
+            try:
+                record_failure(sesh, chunk, e)
+            except Exception:
+                discard_transaction(sesh)
+            raise
+        if is_last:
+            return
+        delays = backoff_delays(TRANSIENT_RETRIES)
+        sizer.observe(row_count, time.time() - start)
+        after = through
 
-    # ETL the model_version table.
-    # Here we need to make a copy of all rows (with a slight modification to
-    # swap data_version_id with covariate_id) from the existing model_version
-    # table that are associated with GBD round greater than round 3.
-    mv_etl_script = os.path.join(code_dir, TABLE_COPY_SCRIPTS['model_version'])
-    sql_lines = parse_sql_script(mv_etl_script)
 
-    for line in sql_lines:
-        exec_query(line, session=sesh)
+def copy_key_range(sesh, model_version_id, after, through):
+    """Copy the rows of one model version in a primary key range, setting
+    aside any that can't be written.
+
+    The copy runs in a savepoint of the current transaction. If a row in the
+    range can't be written, the savepoint is rolled back, the range's rows
+    that break a foreign key are set aside by set_aside_orphans, and the
+    rest of the range is copied again without them.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        model_version_id (int): the model version to copy.
+        after (tuple of int): the (year_id, location_id, sex_id,
+            age_group_id) key the range starts after.
+        through (tuple of int): the last key in the range.
+
+    Returns:
+        the number of rows copied into model_new.
+
+    Raises:
+        any error that isn't a data error, or a data error with no row to
+        blame, leaving the transaction to the caller.
+    """
+    sql_script = os.path.join(this_dir, TABLE_COPY_SCRIPTS['model_keyset'])
+    sql_lines = parse_sql_script(sql_script)
+    params = keyset_params(model_version_id, after, through)
+    savepoint = sesh.begin_nested()
+    try:
+        row_count = 0
+        for line in sql_lines:
+            row_count += sesh.execute(line, params=params).rowcount
+    except Exception as e:
+        savepoint.rollback()
+        if not is_data_error(e):
+            raise
+        if not set_aside_orphans(sesh, 'model', [model_version_id], after,
+                                 through):
+            raise
+        row_count = 0
+        for line in sql_lines:
+            row_count += sesh.execute(line + WITHOUT_DEAD_LETTERS,
+                                      params=params).rowcount
+        return row_count
+    savepoint.commit()
+    return row_count
+
+
+def set_aside_orphans(sesh, table, model_version_ids=None, after=None,
+                      through=None):
+    """Copy the rows of a table that break one of model_new's foreign keys
+    into covariate.etl_dead_letter, in the current transaction.
+
+    Each foreign key declared in model_etl.sql is checked with a single
+    anti-join against its parent table, so the rows at fault are found and
+    set aside together however many there are. A row that breaks more than
+    one foreign key is set aside once, with the last of its errors.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        table (str): the covariate table to check, either model before its
+            rows are copied or model_new once they have been loaded.
+        model_version_ids (list of int, optional): the model versions to
+            check. Defaults to all of them.
+        after (tuple of int, optional): the (year_id, location_id, sex_id,
+            age_group_id) key each version's rows start after.
+        through (tuple of int, optional): the last key of each version's
+            rows, given along with after.
+
+    Returns:
+        whether any row was set aside.
+    """
+    conditions = []
+    params = {}
+    if model_version_ids is not None:
+        conditions.append('m.model_version_id IN :model_version_ids')
+        params['model_version_ids'] = tuple(model_version_ids)
+    if after is not None:
+        conditions.extend([keyset_condition('after', 'm'),
+                           keyset_condition('through', 'm')])
+        params.update(keyset_params(None, after, through))
+        del params['model_version_id']
+
+    sql_script = os.path.join(this_dir, 'model_etl.sql')
+    set_aside = 0
+    for fk in foreign_keys(sql_script):
+        parent = fk.parent_table
+        if '.' not in parent:
+            parent = 'covariate.{}'.format(parent)
+        q = """
+            INSERT INTO covariate.etl_dead_letter
+                (model_version_id, year_id, location_id, sex_id,
+                 age_group_id, mean_value, upper_value, lower_value, error)
+            SELECT m.model_version_id, m.year_id, m.location_id, m.sex_id,
+                   m.age_group_id, m.mean_value, m.upper_value,
+                   m.lower_value,
+                   CONCAT('no {parent} row for {column} ', m.{column})
+            FROM covariate.{table} m
+            LEFT JOIN {parent} p ON p.{parent_column} = m.{column}
+            WHERE {conditions}
+            ON DUPLICATE KEY UPDATE
+                error = VALUES(error)
+        """.format(parent=parent, column=fk.column, table=table,
+                   parent_column=fk.parent_column,
+                   conditions='\n              AND '.join(
+                       ['p.{} IS NULL'.format(fk.parent_column)] +
+                       conditions))
+        set_aside += sesh.execute(q, params=params).rowcount
+    if set_aside:
+        print('Set aside covariate.{} rows of model_version_ids {} with no '
+              'parent row'.format(table, model_version_ids or 'all'))
+    return bool(set_aside)
+
+
+def get_dead_letters(sesh):
+    """Return how many rows of each model version have been set aside in
+    covariate.etl_dead_letter.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+
+    Returns:
+        a dict of model_version_id to row count.
+    """
+    q = """
+        SELECT model_version_id, COUNT(*) AS row_count
+        FROM covariate.etl_dead_letter
+        GROUP BY model_version_id
+    """
+    rows = sesh.execute(q).fetchall()
+    sesh.rollback()
+    return {int(mvid): int(count) for mvid, count in rows}
+
+
+def next_keyset_boundary(sesh, model_version_id, after, slice_rows):
+    """Return the primary key slice_rows rows past after within one model
+    version, or None if fewer rows than that remain.
+
+    The lookup walks the primary key index from after, so it reads index
+    entries only and never more than one slice of them.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        model_version_id (int): the model version being copied.
+        after (tuple of int): the (year_id, location_id, sex_id,
+            age_group_id) key the slice starts after.
+        slice_rows (int): the number of rows in a slice.
+
+    Returns:
+        a (year_id, location_id, sex_id, age_group_id) tuple, or None.
+    """
+    q = """
+        SELECT year_id, location_id, sex_id, age_group_id
+        FROM covariate.model
+        WHERE model_version_id = :model_version_id
+          AND {after}
+        ORDER BY year_id, location_id, sex_id, age_group_id
+        LIMIT 1 OFFSET {offset}
+    """.format(after=keyset_condition('after'),
+               offset=int(slice_rows) - 1)
+    params = keyset_params(model_version_id, after, after)
+    row = sesh.execute(q, params=params).fetchone()
+    return None if row is None else tuple(int(value) for value in row)
+
+
+def keyset_condition(bound, alias=None):
+    """The condition for rows whose primary key suffix comes after the
+    after_ bind parameters, or at or before the through_ ones.
+
+    MySQL 5.7 does not use a row constructor comparison such as
+    (year_id, location_id, ...) > (...) as an index range, so each slice
+    would scan from the start of its model version. Written out as nested
+    ORs, and with the year_id bound repeated on its own, the range optimizer
+    turns the comparison into a range of the primary key.
+
+    Arguments:
+        bound (str): either 'after' or 'through'.
+        alias (str, optional): the table alias to qualify columns with.
+    """
+    strict, last = ('>', '>') if bound == 'after' else ('<', '<=')
+    columns = ['{}.{}'.format(alias, column) if alias else column
+               for column in KEYSET_COLUMNS]
+    params = [':{}_{}'.format(bound, column) for column in KEYSET_COLUMNS]
+    condition = '{} {} {}'.format(columns[-1], last, params[-1])
+    for column, param in reversed(list(zip(columns[:-1], params[:-1]))):
+        condition = '({column} {op} {param} OR ({column} = {param} AND ' \
+                    '{rest}))'.format(column=column, op=strict, param=param,
+                                      rest=condition)
+    return '{} {}= {} AND {}'.format(columns[0], strict, params[0],
+                                     condition)
+
+
+def keyset_params(model_version_id, after, through):
+    """The bind parameters for model_copy_keyset.sql."""
+    params = {'model_version_id': model_version_id}
+    for column, start, end in zip(KEYSET_COLUMNS, after, through):
+        params['after_{}'.format(column)] = start
+        params['through_{}'.format(column)] = end
+    return params
+
+
+def fast_load_session(sesh, local_infile=False):
+    """Return a new session on the same server as sesh whose connections have
+    foreign key and unique checks turned off.
+
+    With checks off, InnoDB no longer looks up the parent row of all five
+    foreign keys for each row copied, and buffers secondary index changes.
+    Nothing is verified while loading, so set_aside_loaded_orphans() has to
+    be run once the copy is done.
+
+    The session has an engine and a single pooled connection of its own, so
+    no connection with checks off is ever handed to anything else. Pass it
+    to close_fast_load_session() once the copy is done.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): a session on the target
+            server.
+        local_infile (bool): allow LOAD DATA LOCAL INFILE, as bulk_session()
+            does.
+    """
+    connect_args = {'local_infile': 1} if local_infile else {}
+    engine = create_engine(sesh.get_bind().url, connect_args=connect_args,
+                           pool_size=1, max_overflow=0, pool_recycle=360)
+
+    # Set on every connection the engine opens, including reconnects after a
+    # lost connection.
+    @event.listens_for(engine, 'connect')
+    def skip_checks(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('SET SESSION foreign_key_checks = 0, '
+                       'unique_checks = 0')
+        cursor.close()
+
+    return Session(bind=engine)
+
+
+def close_fast_load_session(sesh):
+    """Close a session from fast_load_session() along with its connection."""
+    sesh.close()
+    sesh.get_bind().dispose()
+
+
+def set_aside_loaded_orphans(sesh):
+    """Move the rows of model_new that break one of its foreign keys into
+    covariate.etl_dead_letter, once a copy with fast_load_session() is done.
+
+    Their model versions are then left out of verification and block the
+    cutover like any other with rows set aside, rather than sitting in
+    model_new with checkpoints that say they were copied.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+
+    Returns:
+        whether any row was moved.
+    """
+    if not set_aside_orphans(sesh, 'model_new'):
+        sesh.rollback()
+        return False
+    sesh.execute("""
+        DELETE n
+        FROM covariate.model_new n
+        JOIN covariate.etl_dead_letter d
+          ON d.model_version_id = n.model_version_id
+         AND d.year_id = n.year_id
+         AND d.location_id = n.location_id
+         AND d.sex_id = n.sex_id
+         AND d.age_group_id = n.age_group_id
+    """)
+    sesh.commit()
+    return True
+
+
+def copy_model_chunks_parallel(conn_def, chunks, sql_lines, workers,
+                               sizer, fast_load=False, source_conn_def=None,
+                               throttle=None):
+    """Copy covariate.model into model_new with a pool of worker processes.
+
+    Each worker opens its own session and is handed the next chunk as soon
+    as it finishes one. Chunks are handed out largest first, so the biggest
+    model versions start early instead of trailing at the end of the run.
+    The source primary key starts with model_version_id, so concurrent
+    workers read disjoint ranges of the index. Only one chunk per worker is
+    handed out at a time, so once a chunk of a model version fails the rest
+    of that version's chunks are skipped, as in copy_model_chunks.
+
+    Arguments:
+        conn_def (str): the db_tools connection definition for each worker's
+            session.
+        chunks (list of etl_chunks.Chunk): the copy plan, in order.
+        sql_lines (list of str): the parsed model_copy.sql statements.
+        workers (int): the number of worker processes.
+        sizer (etl_chunks.ChunkSizer): sizes KeysetChunk slices.
+        fast_load (bool): copy with foreign key and unique checks off.
+        source_conn_def (str, optional): the db_tools connection definition
+            of the server to copy from, if not conn_def's.
+        throttle (etl_throttle.Throttle, optional): waits out server load
+            before each transaction, in every worker.
+
+    Returns:
+        (completed, failed) lists of model_version_ids. A version is only
+        completed once every chunk holding it has been committed.
+    """
+    chunks = lpt_order(chunks)
+    outstanding = Counter(mvid for chunk in chunks
+                          for mvid in chunk.model_version_ids)
+    progress = Progress(chunks, workers)
+    completed = []
+    failed = []
+
+    # Spawn rather than fork so no worker inherits the parent's pooled
+    # database connections.
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(workers, initializer=_init_copy_worker,
+                        initargs=(conn_def, sql_lines, sizer, fast_load,
+                                  source_conn_def, throttle))
+    queued = deque(enumerate(chunks))
+    finished = queue.Queue()
+
+    def hand_out():
+        # Start the next chunk whose versions haven't failed, if any.
+        while queued:
+            index, chunk = queued.popleft()
+            if any(mvid in failed for mvid in chunk.model_version_ids):
+                progress.chunk_done(index, copied=False)
+                continue
+            pool.apply_async(
+                _copy_chunk_worker, ((index, chunk),),
+                callback=finished.put,
+                error_callback=lambda e, index=index: finished.put((index, e)))
+            return 1
+        return 0
+
+    # Set when a worker gives up on the throttle, which stops the copy.
+    aborted = None
+    try:
+        running = sum(hand_out() for _ in range(workers))
+        while running:
+            index, error = finished.get()
+            running -= 1
+            if isinstance(error, StageError):
+                aborted = error
+            if isinstance(error, Exception):
+                error = '{}: {}'.format(type(error).__name__, error)
+            chunk = chunks[index]
+            progress.chunk_done(index, copied=error is None)
+            print(progress)
+            if error is not None:
+                failed.extend(mvid for mvid in chunk.model_version_ids
+                              if mvid not in failed)
+                print(error)
+                print(failed)
+            else:
+                for mvid in chunk.model_version_ids:
+                    outstanding[mvid] -= 1
+                    if outstanding[mvid] == 0 and mvid not in failed:
+                        completed.append(mvid)
+            if aborted is None:
+                running += hand_out()
+    finally:
+        pool.close()
+        pool.join()
+
+    if aborted is not None:
+        raise aborted
+
+    return completed, failed
+
+
+def _init_copy_worker(conn_def, sql_lines, sizer, fast_load,
+                      source_conn_def, throttle):
+    """Open the sessions a copy worker process uses for every chunk."""
+    global _worker_session, _worker_sql_lines, _worker_sizer, _worker_source
+    global _worker_throttle
+    _worker_session = get_session(conn_def)
+    if source_conn_def:
+        _worker_session = bulk_session(_worker_session)
+        _worker_source = get_session(source_conn_def)
+    if fast_load:
+        sesh = _worker_session
+        _worker_session = fast_load_session(
+            sesh, local_infile=bool(source_conn_def))
+        sesh.close()
+    _worker_sql_lines = sql_lines
+    _worker_sizer = sizer
+    _worker_throttle = throttle
+
+
+def _copy_chunk_worker(task):
+    """Copy one (index, chunk) task in a worker process.
+
+    Returns:
+        (index, error) where error is None on success, or the error message
+        otherwise. Database exceptions don't always pickle, so only the
+        message is sent back.
+
+    Raises:
+        StageError: if the throttle gave up, to stop the whole copy.
+    """
+    index, chunk = task
+    try:
+        copy_chunk(_worker_session, chunk, _worker_sql_lines,
+                   _worker_sizer, _worker_source, _worker_throttle)
+    except StageError:
+        raise
+    except Exception as e:
+        return index, '{}: {}'.format(type(e).__name__, e)
+    return index, None
+
+
+def get_checkpoints(sesh):
+    """Return the covariate.model year ranges already copied, per version.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+
+    Returns:
+        a dict of model_version_id to a list of (year_start, year_end) ranges
+        checkpointed as complete.
+    """
+    q = """
+        SELECT model_version_id, year_start, year_end
+        FROM covariate.etl_checkpoint
+        WHERE status = 'complete'
+    """
+    res = query_2_df(q, session=sesh)
+    done = defaultdict(list)
+    for mvid, start, end in zip(res.model_version_id, res.year_start,
+                                res.year_end):
+        done[int(mvid)].append((int(start), int(end)))
+    return dict(done)
+
+
+def get_keyset_positions(sesh):
+    """Return where each unfinished keyset copy stopped.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+
+    Returns:
+        a dict of model_version_id to the (year_id, location_id, sex_id,
+        age_group_id) primary key of the last row committed.
+    """
+    q = """
+        SELECT model_version_id, last_year_id, last_location_id, last_sex_id,
+               last_age_group_id
+        FROM covariate.etl_checkpoint
+        WHERE status != 'complete'
+          AND last_year_id IS NOT NULL
+    """
+    res = query_2_df(q, session=sesh)
+    positions = {}
+    for row in res.itertuples(index=False):
+        positions[int(row[0])] = tuple(int(value) for value in row[1:])
+    return positions
+
+
+def record_checkpoint(sesh, chunk, duration):
+    """Checkpoint every model version in a chunk as complete.
+
+    Runs inside the chunk's copy transaction and counts the rows the copy just
+    wrote, so the checkpoint commits or rolls back together with them.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): the session copying the chunk.
+        chunk (etl_chunks.Chunk): the chunk just copied.
+        duration (float): seconds the copy took.
+    """
+    q = """
+        INSERT INTO covariate.etl_checkpoint
+            (model_version_id, year_start, year_end, status, row_count,
+             duration, error)
+        SELECT mv.model_version_id, :year_start, :year_end, 'complete',
+               COUNT(m.model_version_id), :duration, NULL
+        FROM covariate.model_version_new mv
+        LEFT JOIN covariate.model_new m
+            ON m.model_version_id = mv.model_version_id
+            AND m.year_id BETWEEN :year_start AND :year_end
+        WHERE mv.model_version_id IN :model_version_ids
+        GROUP BY mv.model_version_id
+        ON DUPLICATE KEY UPDATE
+            status = VALUES(status),
+            row_count = VALUES(row_count),
+            duration = VALUES(duration),
+            error = NULL
+    """
+    params = dict(chunk.params, duration=duration)
+    sesh.execute(q, params=params)
+
+
+def record_keyset_position(sesh, chunk, through, row_count, duration,
+                           is_last):
+    """Checkpoint how far a keyset copy has got, inside the slice's copy
+    transaction. Row counts and durations accumulate across slices.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): the session copying the slice.
+        chunk (etl_chunks.KeysetChunk): the model version being copied.
+        through (tuple of int): the primary key of the slice's last row.
+        row_count (int): rows the slice copied.
+        duration (float): seconds the slice took to copy.
+        is_last (bool): whether this slice finishes the version.
+    """
+    q = """
+        INSERT INTO covariate.etl_checkpoint
+            (model_version_id, year_start, year_end, status, row_count,
+             duration, last_year_id, last_location_id, last_sex_id,
+             last_age_group_id, error)
+        VALUES (:model_version_id, :year_start, :year_end, :status,
+                :row_count, :duration, :through_year_id,
+                :through_location_id, :through_sex_id, :through_age_group_id,
+                NULL)
+        ON DUPLICATE KEY UPDATE
+            status = VALUES(status),
+            row_count = row_count + VALUES(row_count),
+            duration = duration + VALUES(duration),
+            last_year_id = VALUES(last_year_id),
+            last_location_id = VALUES(last_location_id),
+            last_sex_id = VALUES(last_sex_id),
+            last_age_group_id = VALUES(last_age_group_id),
+            error = NULL
+    """
+    mvid = chunk.model_version_ids[0]
+    params = dict(chunk.params, status='complete' if is_last else 'partial',
+                  row_count=row_count, duration=duration)
+    params.update(keyset_params(mvid, through, through))
+    sesh.execute(q, params=params)
+
+
+def record_failure(sesh, chunk, error):
+    """Checkpoint every model version in a rolled back chunk as failed.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): the session that copied the
+            chunk, already rolled back.
+        chunk (etl_chunks.Chunk): the chunk that failed.
+        error (Exception): what went wrong.
+    """
+    q = """
+        INSERT INTO covariate.etl_checkpoint
+            (model_version_id, year_start, year_end, status, error)
+        VALUES (:model_version_id, :year_start, :year_end, 'failed', :error)
+        ON DUPLICATE KEY UPDATE
+            status = VALUES(status),
+            error = VALUES(error)
+    """
+    params = chunk.params
+    for mvid in chunk.model_version_ids:
+        sesh.execute(q, params=dict(params, model_version_id=mvid,
+                                    error=str(error)[:1000]))
+    sesh.commit()
+
+
+def get_model_checksums(sesh, table, model_version_ids):
+    """Return the row count and checksum of each model version in a table.
+
+    The checksum is the sum of a CRC32 of every row's key and value columns.
+    A sum doesn't depend on the order rows are read in, so the same rows give
+    the same checksum in covariate.model and model_new, on any server.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to the server
+            holding the table.
+        table (str): either 'model' or 'model_new'.
+        model_version_ids (intlist): the model versions to checksum.
+
+    Returns:
+        a dict of model_version_id to (row count, checksum). Versions without
+        rows are left out.
+    """
+    # CONCAT_WS skips NULLs, so stand in for them to keep a NULL upper_value
+    # from hashing the same as a NULL lower_value.
+    columns = ', '.join("COALESCE({}, 'NULL')".format(column)
+                        for column in CHECKSUM_COLUMNS)
+    q = """
+        SELECT model_version_id, COUNT(*) AS row_count,
+               SUM(CRC32(CONCAT_WS('#', {columns}))) AS checksum
+        FROM covariate.{table}
+        WHERE model_version_id IN :model_version_ids
+        GROUP BY model_version_id
+    """.format(columns=columns, table=table)
+    params = {'model_version_ids': tuple(model_version_ids)}
+    rows = sesh.execute(q, params=params).fetchall()
+    sesh.rollback()
+    return {int(mvid): (int(count), int(checksum))
+            for mvid, count, checksum in rows}
+
+
+def verify_model_versions(conn_def, source_conn_def, model_version_ids,
+                          workers):
+    """Find the model versions whose rows in model_new differ from
+    covariate.model.
+
+    Versions are checksummed in batches by workers threads, each with its own
+    sessions. Each batch is one grouped scan of the primary key range of its
+    versions on either side.
+
+    Arguments:
+        conn_def (str): the db_tools connection definition of the server
+            holding model_new.
+        source_conn_def (str or None): the db_tools connection definition of
+            the server holding covariate.model, if not conn_def's.
+        model_version_ids (intlist): the model versions to verify.
+        workers (int): the number of batches to verify at once.
+
+    Returns:
+        a sorted list of the model_version_ids whose row count or checksum
+        differs.
+    """
+    local = threading.local()
+    opened = []
+    lock = threading.Lock()
+
+    def verify_batch(batch):
+        if not hasattr(local, 'target'):
+            local.target = get_session(conn_def)
+            local.source = local.target
+            if source_conn_def:
+                local.source = get_session(source_conn_def)
+            with lock:
+                opened.extend({local.target, local.source})
+        expected = get_model_checksums(local.source, 'model', batch)
+        actual = get_model_checksums(local.target, 'model_new', batch)
+        return [mvid for mvid in batch
+                if expected.get(mvid) != actual.get(mvid)]
+
+    ids = list(model_version_ids)
+    batches = [ids[i:i + VERIFY_BATCH_SIZE]
+               for i in range(0, len(ids), VERIFY_BATCH_SIZE)]
+    mismatched = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            for batch_mismatches in executor.map(verify_batch, batches):
+                mismatched.extend(batch_mismatches)
+    finally:
+        for session in opened:
+            session.close()
+    return sorted(mismatched)
+
+
+def reset_model_version(sesh, model_version_id, error, batch_rows):
+    """Remove a model version from model_new and its checkpoints, so a
+    rerun copies it again from scratch, and checkpoint it as failed.
+
+    Rows are deleted batch_rows per transaction, like the copy, to keep each
+    transaction's locks and undo log small. The checkpoints are only cleared
+    once every row is gone, so if this stops partway the version still
+    looks copied and the next verification clears it again.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        model_version_id (int): the model version to clear.
+        error (str): why it is being copied again.
+        batch_rows (int): the number of rows to delete per transaction.
+    """
+    params = {'model_version_id': model_version_id, 'year_start': YEAR_MIN,
+              'year_end': YEAR_MAX, 'error': error}
+    q = """
+        DELETE FROM covariate.model_new
+        WHERE model_version_id = :model_version_id
+        ORDER BY year_id, location_id, sex_id, age_group_id
+        LIMIT {batch_rows}
+    """.format(batch_rows=int(batch_rows))
+    while True:
+        deleted = sesh.execute(q, params=params).rowcount
         sesh.commit()
+        if deleted < batch_rows:
+            break
+    sesh.execute("""
+        DELETE FROM covariate.etl_checkpoint
+        WHERE model_version_id = :model_version_id
+    """, params=params)
+    sesh.execute("""
+        INSERT INTO covariate.etl_checkpoint
+            (model_version_id, year_start, year_end, status, error)
+        VALUES (:model_version_id, :year_start, :year_end, 'failed', :error)
+    """, params=params)
+    sesh.commit()
+
+
+def get_long_transactions(sesh, seconds):
+    """Return the other transactions that have been open longer than
+    seconds.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        seconds (int): how long a transaction may have been open.
+
+    Returns:
+        a list of (connection id, start time, current query) tuples.
+    """
+    q = """
+        SELECT trx_mysql_thread_id, trx_started, trx_query
+        FROM information_schema.innodb_trx
+        WHERE trx_started < NOW() - INTERVAL {seconds} SECOND
+          AND trx_mysql_thread_id != CONNECTION_ID()
+        ORDER BY trx_started
+    """.format(seconds=int(seconds))
+    rows = sesh.execute(q).fetchall()
+    sesh.rollback()
+    return [tuple(row) for row in rows]
+
+
+def cutover_blockers(sesh, renames):
+    """Return the reasons a set of renames cannot run now, if any.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        renames (list of (str, str)): (old name, new name) pairs of tables in
+            the covariate schema, applied left to right.
+
+    Returns:
+        a list of messages, empty if the renames are safe to run.
+    """
+    q = """
+        SELECT table_name
+        FROM information_schema.tables
+        WHERE table_schema = 'covariate'
+    """
+    tables = set(row[0] for row in sesh.execute(q).fetchall())
+    sesh.rollback()
+
+    blockers = []
+    for old, new in renames:
+        if old not in tables:
+            blockers.append('covariate.{} does not exist'.format(old))
+        elif new in tables:
+            blockers.append('covariate.{} already exists'.format(new))
+        tables.discard(old)
+        tables.add(new)
+
+    for thread_id, started, query in get_long_transactions(
+            sesh, LONG_TRANSACTION_SECONDS):
+        blockers.append('connection {} has had a transaction open since '
+                        '{}: {}'.format(thread_id, started, query))
+    return blockers
+
+
+def rename_tables(sesh, renames):
+    """Apply renames as a single RENAME TABLE statement.
+
+    The server swaps every table at once under metadata locks, so readers see
+    either all the old tables or all the new ones, and nothing is copied.
+    Foreign keys follow the tables they reference to their new names. If the
+    metadata locks can't be had within CUTOVER_LOCK_WAIT_SECONDS the rename
+    fails and nothing changes, rather than holding up every query behind it.
+    The session's own lock_wait_timeout is put back afterwards. If the rename
+    fails, its error is raised even if putting the timeout back fails too,
+    as it will once the connection is gone.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        renames (list of (str, str)): (old name, new name) pairs of tables in
+            the covariate schema, applied left to right.
+    """
+    previous = sesh.execute('SELECT @@SESSION.lock_wait_timeout').scalar()
+    sesh.execute('SET SESSION lock_wait_timeout = {}'.format(
+        CUTOVER_LOCK_WAIT_SECONDS))
+    restore = 'SET SESSION lock_wait_timeout = {}'.format(int(previous))
+    try:
+        sesh.execute('RENAME TABLE {}'.format(', '.join(
+            'covariate.{} TO covariate.{}'.format(old, new)
+            for old, new in renames)))
+    except Exception:
+        try:
+            sesh.execute(restore)
+        except Exception:
+            discard_transaction(sesh)
+        raise
+    sesh.execute(restore)
+
+
+def rollback_renames(renames):
+    """The renames that undo renames."""
+    return [(new, old) for old, new in reversed(renames)]
+
+
+def get_watermarks(sesh):
+    """Return the current watermark of each source table.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+
+    Returns:
+        a dict of table name to datetime.
+
+    Raises:
+        StageError: if either table has no watermark, which the create
+            stage sets.
+    """
+    q = """
+        SELECT table_name, watermark
+        FROM covariate.etl_watermark
+    """
+    rows = sesh.execute(q).fetchall()
+    sesh.rollback()
+    watermarks = dict(rows)
+    missing = [table for table in TABLE_SYNC_SCRIPTS
+               if table not in watermarks]
+    if missing:
+        raise StageError('No watermark for covariate.{} in '
+                         'covariate.etl_watermark; rerun with --restart to '
+                         'create the ETL tables and copy again'.format(
+                             ', covariate.'.join(missing)))
+    return watermarks
+
+
+def get_changed_model_versions(sesh, watermark):
+    """Return the model versions with covariate.model rows last updated at or
+    after watermark, read from the index on last_updated alone.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        watermark (datetime): the earliest change to look for.
+
+    Returns:
+        a set of model_version_ids.
+
+    Raises:
+        StageError: if covariate.model has no index on last_updated, without
+            which finding the changes would scan the whole table.
+    """
+    q = """
+        SELECT COUNT(*)
+        FROM information_schema.statistics
+        WHERE table_schema = 'covariate'
+          AND table_name = 'model'
+          AND column_name = 'last_updated'
+          AND seq_in_index = 1
+    """
+    if not sesh.execute(q).scalar():
+        sesh.rollback()
+        raise StageError('covariate.model has no index on last_updated; add '
+                         'ix_model_last_updated from model.sql before '
+                         'running --incremental')
+    q = """
+        SELECT DISTINCT model_version_id
+        FROM covariate.model
+        WHERE last_updated >= :watermark
+    """
+    rows = sesh.execute(q, params={'watermark': watermark}).fetchall()
+    sesh.rollback()
+    return set(int(row[0]) for row in rows)
+
+
+def next_watermark(sesh):
+    """Return the watermark to record for a pass starting now: the server's
+    clock, less SYNC_OVERLAP_SECONDS."""
+    q = 'SELECT NOW() - INTERVAL {} SECOND'.format(SYNC_OVERLAP_SECONDS)
+    watermark = sesh.execute(q).scalar()
+    sesh.rollback()
+    return watermark
+
+
+def set_watermark(sesh, table, watermark):
+    """Record that every change to a source table last updated before
+    watermark has been copied.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        table (str): either 'model' or 'model_version'.
+        watermark (datetime): the new watermark.
+    """
+    q = """
+        INSERT INTO covariate.etl_watermark (table_name, watermark)
+        VALUES (:table_name, :watermark)
+        ON DUPLICATE KEY UPDATE watermark = VALUES(watermark)
+    """
+    sesh.execute(q, params={'table_name': table, 'watermark': watermark})
+    sesh.commit()
+
+
+def sync_changes(sesh, rows_per_transaction, throttle=None):
+    """Bring model_version_new and model_new up to date with the changes
+    made to model_version and model since their watermarks.
+
+    model_version is synced first, in one transaction, so that new model
+    versions exist before their rows are synced. The model versions with
+    changed covariate.model rows are then found from the index on
+    last_updated, and only those are synced, in the same chunks a full copy
+    would use, one transaction each, each scanning only its own primary key
+    range. Each table's watermark only moves forward once all of its changes
+    have been synced. Rows and model versions marked DELETE are synced like
+    any other change: they are still in the live tables, which the full
+    copy and the verification mirror as they are.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        rows_per_transaction (int): the number of covariate.model rows to
+            scan per transaction.
+        throttle (etl_throttle.Throttle, optional): waits out server load
+            before each transaction.
+
+    Returns:
+        (completed, failed) lists of model_version_ids whose rows were or
+        could not be synced.
+    """
+    watermarks = get_watermarks(sesh)
+    watermark = next_watermark(sesh)
+
+    sql_script = os.path.join(this_dir, TABLE_SYNC_SCRIPTS['model_version'])
+    params = {'watermark': watermarks['model_version']}
+    for line in parse_sql_script(sql_script):
+        sesh.execute(line, params=params)
+    sesh.commit()
+    set_watermark(sesh, 'model_version', watermark)
+
+    completed, failed = sync_model(sesh, watermarks['model'],
+                                   rows_per_transaction, throttle)
+    if not failed:
+        set_watermark(sesh, 'model', watermark)
+    return completed, failed
+
+
+def sync_model(sesh, watermark, rows_per_transaction, throttle=None):
+    """Write the covariate.model rows last updated at or after watermark
+    over model_new, for sync_changes.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        watermark (datetime): the earliest change to sync.
+        rows_per_transaction (int): the number of covariate.model rows to
+            scan per transaction.
+        throttle (etl_throttle.Throttle, optional): waits out server load
+            before each transaction.
+
+    Returns:
+        (completed, failed) lists of model_version_ids whose rows were or
+        could not be synced.
+    """
+    changed = get_changed_model_versions(sesh, watermark)
+    version_rows = estimate_model_version_rows(
+        sesh, [mvid for mvid in get_model_version_ids(sesh)
+               if mvid in changed])
+    chunks = plan_chunks(version_rows, rows_per_transaction,
+                         lambda mvid: get_year_rows(sesh, mvid))
+    sql_script = os.path.join(this_dir, TABLE_SYNC_SCRIPTS['model'])
+    sql_lines = parse_sql_script(sql_script)
+    completed = []
+    failed = []
+    for chunk in chunks:
+        params = dict(chunk.params, watermark=watermark)
+        if throttle is not None:
+            throttle.wait(sesh)
+        try:
+            for line in sql_lines:
+                sesh.execute(line, params=params)
+            sesh.commit()
+        except Exception as e:
+            sesh.rollback()
+            failed.extend(mvid for mvid in chunk.model_version_ids
+                          if mvid not in failed)
+            print(e)
+        else:
+            completed.extend(mvid for mvid in chunk.model_version_ids
+                             if mvid not in completed)
+    completed = [mvid for mvid in completed if mvid not in failed]
+    return completed, failed
+
+
+def write_success_file(code_dir, completed_mvids):
+    """
+    Save a log of the model_version_ids successfully ETL'ed to the new table,
+    one per line. covariate.etl_checkpoint is the record the ETL resumes
+    from; this file is for people.
+
+    Arguments:
+        code_dir (str, path): our code directory
+        completed_mvids (intlist): A list of successfully copied
+            model_version_ids
+    """
+    with open(os.path.join(code_dir, 'complete.txt'), 'w') as f:
+        f.write('model_versions completed:\n')
+        for mvid in completed_mvids:
+            f.write("{}\n".format(mvid))
+
+
+def copy_model(args, conn_def, sesh, source, source_sesh, model_version_ids,
+               throttle):
+    """Plan and copy the covariate.model chunks not yet checkpointed.
+
+    Arguments:
+        args (argparse.Namespace): the parsed command line.
+        conn_def (str): the db_tools connection definition of our server.
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        source (sqlalchemy.orm.session.Session or None): connection to the
+            server to copy from, if not sesh's.
+        source_sesh (sqlalchemy.orm.session.Session): connection to whichever
+            server holds covariate.model.
+        model_version_ids (intlist): the model versions in
+            model_version_new.
+        throttle (etl_throttle.Throttle or None): waits out server load
+            before each transaction.
 
+    Returns:
+        (completed, failed) lists of model_version_ids.
+    """
     # ETL the model table.
     # This is a little trickier. There are hundreds of millions of rows we need
     # to copy. So we are going to read the model_version_ids from the newly
-    # created model_version_new table and then iterate over these
-    # model_version_ids to process one at a time. We'll keep track of which
-    # ones have successfully finished so we'll have a record of what has
-    # already been copied in the event of failure midway.
-    completed = []
-    failed = []
-    # Return a sorted list of model_version_ids from the newly etl'ed table.
-    model_version_ids = get_model_version_ids(sesh)
+    # created model_version_new table, count their rows, and plan chunks that
+    # keep every transaction close to the same size: one commit for many small
+    # versions, several for one huge one. Every chunk is checkpointed in
+    # covariate.etl_checkpoint as it commits, so after a failure midway a
+    # rerun skips whatever has already been copied.
+    if args.exact_counts:
+        version_rows = get_model_version_rows(source_sesh, model_version_ids)
+    else:
+        version_rows = estimate_model_version_rows(source_sesh,
+                                                   model_version_ids)
+    sizer = ChunkSizer(args.rows_per_transaction,
+                       target_seconds=args.target_seconds)
+    done_ranges = get_checkpoints(sesh)
+    keyset_positions = get_keyset_positions(sesh)
+    chunks = plan_chunks(version_rows, args.rows_per_transaction,
+                         lambda mvid: get_year_rows(source_sesh, mvid),
+                         done_ranges,
+                         keyset=args.keyset,
+                         keyset_positions=keyset_positions)
 
-    model_etl_script = os.path.join(code_dir, TABLE_COPY_SCRIPTS['model'])
+    if source is None:
+        model_etl_script = os.path.join(this_dir,
+                                        TABLE_COPY_SCRIPTS['model'])
+    else:
+        model_etl_script = os.path.join(this_dir,
+                                        TABLE_EXTRACT_SCRIPTS['model'])
     sql_lines = parse_sql_script(model_etl_script)
 
-    for mvid in model_version_ids:
-        for line in sql_lines:
-            # This might fail if we haven't specified USE covariate;...
+    if args.workers > 1:
+        completed, failed = copy_model_chunks_parallel(
+            conn_def, chunks, sql_lines, args.workers, sizer,
+            fast_load=args.fast_load, source_conn_def=args.source,
+            throttle=throttle)
+    elif args.fast_load:
+        copy_sesh = fast_load_session(sesh, local_infile=source is not None)
+        try:
+            completed, failed = copy_model_chunks(copy_sesh, chunks,
+                                                  sql_lines, sizer, source,
+                                                  throttle)
+        finally:
+            close_fast_load_session(copy_sesh)
+    else:
+        completed, failed = copy_model_chunks(sesh, chunks, sql_lines, sizer,
+                                              source, throttle)
+    return completed, failed
+
+
+def calibrate_copy(sesh, source, model_version_id, rows):
+    """Time a copy of up to rows covariate.model rows of one model version,
+    and return the rows copied per second.
+
+    The rows are read with model_extract.sql and copied the way the ETL
+    copies a chunk, with INSERT ... SELECT on one server or through a spool
+    file from source. They go into a temporary table created from
+    model_etl.sql's definition of model_new, in the session's default
+    schema, so the calibration needs neither covariate.model nor the _new
+    tables on sesh's server. The table is dropped again with the
+    transaction rolled back, so nothing is left behind.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server; a session from bulk_session() when copying from source.
+        source (sqlalchemy.orm.session.Session or None): connection to the
+            server to copy from, if not sesh's.
+        model_version_id (int): the model version to copy rows of.
+        rows (int): the most rows to copy.
+
+    Returns:
+        the rows copied per second, or None if the version has no rows.
+    """
+    create = next(
+        line for line in parse_sql_script(os.path.join(this_dir,
+                                                       'model_etl.sql'))
+        if line.startswith('CREATE TABLE model_new '))
+    create = create.replace('CREATE TABLE model_new ',
+                            'CREATE TEMPORARY TABLE etl_calibration ', 1)
+    extract = parse_sql_script(os.path.join(
+        this_dir, TABLE_EXTRACT_SCRIPTS['model']))[0]
+    q = '{} LIMIT {}'.format(extract, int(rows))
+    params = Chunk((model_version_id,), None, None, rows).params
+    # Temporary tables belong to one connection, which the session keeps
+    # until the transaction ends.
+    sesh.execute(create)
+    try:
+        start = time.time()
+        if source is None:
+            copied = sesh.execute('INSERT INTO etl_calibration ' + q,
+                                  params=params).rowcount
+        else:
+            copied = copy_query(source, sesh, q, params, 'etl_calibration')
+        seconds = time.time() - start
+    finally:
+        sesh.execute('DROP TEMPORARY TABLE etl_calibration')
+        sesh.rollback()
+    if not copied or seconds <= 0:
+        return None
+    return copied / seconds
+
+
+def print_plan(args, conn_def):
+    """Print what a full copy of covariate.model would do, for --plan.
+
+    Every model version from a GBD round after 3 is listed with its estimated
+    rows and bytes, followed by the chunks it would be copied in and the wall
+    time the copy would take at the rate of a short calibration copy.
+
+    Row counts are always the optimizer's estimates, even with
+    --exact-counts, so nothing scans covariate.model in full. Splitting a
+    version larger than --rows-per-transaction into years counts its rows
+    per year, a range scan over that version's primary key prefix alone.
+
+    Arguments:
+        args (argparse.Namespace): the parsed command line.
+        conn_def (str): the db_tools connection definition of our server.
+    """
+    sesh = get_session(conn_def)
+    source = None
+    source_sesh = sesh
+    if args.source:
+        source = source_sesh = get_session(args.source)
+        sesh = bulk_session(sesh)
+
+    model_version_ids = sorted(
+        get_model_version_updates(source_sesh, 'model_version'))
+    version_rows = estimate_model_version_rows(source_sesh,
+                                               model_version_ids)
+    row_bytes = get_model_row_bytes(source_sesh)
+    print('{:>16} {:>14} {:>16}'.format('model_version_id', 'est. rows',
+                                        'est. bytes'))
+    for mvid, rows in version_rows:
+        print('{:>16} {:>14} {:>16}'.format(mvid, rows, rows * row_bytes))
+    total_rows = sum(rows for _, rows in version_rows)
+    print('{} model versions, about {} rows and {} bytes'.format(
+        len(version_rows), total_rows, total_rows * row_bytes))
+
+    chunks = plan_chunks(version_rows, args.rows_per_transaction,
+                         lambda mvid: get_year_rows(source_sesh, mvid),
+                         keyset=args.keyset)
+    print('\n{} chunks of about {} rows:'.format(len(chunks),
+                                                 args.rows_per_transaction))
+    for index, chunk in enumerate(chunks):
+        if isinstance(chunk, KeysetChunk):
+            span = 'by primary key'
+        elif chunk.is_whole:
+            span = 'whole'
+        else:
+            span = 'years {}-{}'.format(chunk.year_start, chunk.year_end)
+        print('{:>6} {:>12} rows  {}  model versions {}'.format(
+            index, chunk.rows, span,
+            ', '.join(str(mvid) for mvid in chunk.model_version_ids)))
+
+    # The largest version is the most like the bulk of the copy.
+    rate = None
+    if total_rows:
+        largest, _ = max(version_rows, key=lambda pair: pair[1])
+        rate = calibrate_copy(sesh, source, largest,
+                              min(CALIBRATION_ROWS, args.rows_per_transaction))
+    sesh.close()
+    if source is not None:
+        source.close()
+    if rate is None:
+        print('\nNo rows to calibrate the copy rate with')
+        return
+    seconds = lpt_makespan([chunk.rows for chunk in chunks],
+                           args.workers) / rate
+    print('\nCalibration copied {:.0f} rows per second; with {} workers the '
+          'copy would take about {}'.format(rate, args.workers,
+                                            format_duration(seconds)))
+
+
+def get_stages(sesh):
+    """Return the status of every stage that has started, by name.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+    """
+    q = """
+        SELECT stage, status
+        FROM covariate.etl_stage
+    """
+    rows = sesh.execute(q).fetchall()
+    sesh.rollback()
+    return dict(rows)
+
+
+def record_stage(sesh, stage, status, error=None):
+    """Record that a stage has started, completed, or failed.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        stage (str): the stage's name.
+        status (str): one of 'running', 'complete', or 'failed'.
+        error (Exception, optional): why a failed stage failed.
+    """
+    q = """
+        INSERT INTO covariate.etl_stage (stage, status, error)
+        VALUES (:stage, :status, :error)
+        ON DUPLICATE KEY UPDATE
+            status = VALUES(status),
+            error = VALUES(error)
+    """
+    params = {'stage': stage, 'status': status,
+              'error': None if error is None else str(error)[:1000]}
+    sesh.execute(q, params=params)
+    sesh.commit()
+
+
+def clear_stages(sesh, stages=None):
+    """Forget that stages ran, so the next run runs them again.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to our database
+            server.
+        stages (list of str, optional): the stages to forget. Defaults to
+            every stage.
+    """
+    if stages is None:
+        sesh.execute('DELETE FROM covariate.etl_stage')
+    elif stages:
+        sesh.execute("""
+            DELETE FROM covariate.etl_stage
+            WHERE stage IN :stages
+        """, params={'stages': tuple(stages)})
+    sesh.commit()
+
+
+def get_model_version_updates(sesh, table):
+    """Return when each model version the ETL copies was last updated.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): connection to the server
+            holding the table.
+        table (str): either 'model_version', of which only the versions from
+            GBD rounds after 3 are read, or 'model_version_new'.
+
+    Returns:
+        a dict of model_version_id to its last_updated datetime.
+    """
+    if table == 'model_version':
+        q = """
+            SELECT mv.model_version_id, mv.last_updated
+            FROM covariate.model_version mv
+            JOIN covariate.data_version dv USING (data_version_id)
+            WHERE mv.gbd_round_id > 3
+        """
+    else:
+        q = """
+            SELECT model_version_id, last_updated
+            FROM covariate.model_version_new
+        """
+    rows = sesh.execute(q).fetchall()
+    sesh.rollback()
+    return {int(mvid): updated for mvid, updated in rows}
+
+
+class ETL(object):
+    """The stages of the ETL, with what they share.
+
+    Each stage runs in a thread of its own alongside any stage it doesn't
+    depend on, so every stage opens its own sessions. A stage that can't
+    finish its work raises StageError, which leaves it and everything that
+    depends on it to the next run.
+
+    Arguments:
+        args (argparse.Namespace): the parsed command line.
+        conn_def (str): the db_tools connection definition of our server.
+        throttle (etl_throttle.Throttle or None): waits out server load
+            before each copy transaction.
+    """
+
+    def __init__(self, args, conn_def, throttle):
+        self.args = args
+        self.conn_def = conn_def
+        self.throttle = throttle
+        self.code_dir = os.path.abspath(
+            os.path.dirname(os.path.dirname(__file__)))
+        # Completed stages whose work a later stage undid. They and every
+        # stage after them are marked not done once the run is over, when no
+        # stage is still running to mark itself complete afterwards.
+        self.reopened = []
+
+    def stages(self):
+        """Return the stages of this run, in the order they are declared.
+
+        sync only runs with --incremental and cutover only with --cutover.
+        verify_mv and analyze don't depend on each other or on verify, so
+        they run alongside it.
+        """
+        stages = [
+            Stage('create', [], self.create),
+            Stage('copy_mv', ['create'], self.copy_mv),
+            Stage('copy_model', ['copy_mv'], self.copy_model),
+        ]
+        if self.args.incremental:
+            stages.append(Stage('sync', ['copy_model'], self.sync))
+        stages.extend([
+            Stage('verify_mv', ['copy_mv', 'sync'], self.verify_mv),
+            Stage('verify', ['copy_model', 'sync'], self.verify),
+            Stage('analyze', ['copy_model', 'sync'], self.analyze),
+        ])
+        if self.args.cutover:
+            stages.append(Stage('cutover', ['verify_mv', 'verify',
+                                            'analyze'], self.cutover))
+        return stages
+
+    def session(self):
+        """Open a new session on our server, which can load spool files
+        when copying from --source."""
+        sesh = get_session(self.conn_def)
+        if self.args.source:
+            sesh = bulk_session(sesh)
+        return sesh
+
+    def source_session(self):
+        """Open a new session on whichever server holds covariate.model."""
+        return get_session(self.args.source or self.conn_def)
+
+    def create(self):
+        """Drop and create the _new tables and the ETL's own tables, and
+        set the watermarks --incremental starts from."""
+        sesh = self.session()
+        try:
+            for table in TABLE_CREATE_SCRIPTS:
+                sql_script = os.path.join(this_dir, table)
+                # Parse into a list of individual commands
+                sql_lines = parse_sql_script(sql_script)
+
+                # Run those commands one at a time and commit the session.
+                for line in sql_lines:
+                    exec_query(line, session=sesh)
+                    sesh.commit()
+
+            # Anything changed after this point is picked up by
+            # --incremental.
+            source_sesh = self.source_session()
             try:
-                sesh.execute(line, params={'model_version_id': mvid})
-                sesh.commit()
-                completed.append(mvid)
-            except Exception as e:  # I'm unsure what the exception could be
-                failed.append(mvid)
-                print(e)
-                print(failed)
+                watermark = next_watermark(source_sesh)
+            finally:
+                source_sesh.close()
+            for table in TABLE_SYNC_SCRIPTS:
+                set_watermark(sesh, table, watermark)
+        finally:
+            sesh.close()
+
+    def copy_mv(self):
+        """Copy model_version into model_version_new.
+
+        Here we need to make a copy of all rows (with a slight modification
+        to swap data_version_id with covariate_id) from the existing
+        model_version table that are associated with GBD round greater than
+        round 3. Nothing references model_version_new yet, so whatever an
+        earlier, failed attempt left there is cleared first.
+        """
+        sesh = self.session()
+        try:
+            sesh.execute('DELETE FROM covariate.model_version_new')
+            sesh.commit()
+            if self.args.source is None:
+                mv_etl_script = os.path.join(
+                    this_dir, TABLE_COPY_SCRIPTS['model_version'])
+                for line in parse_sql_script(mv_etl_script):
+                    exec_query(line, session=sesh)
+                    sesh.commit()
+            else:
+                mv_etl_script = os.path.join(
+                    this_dir, TABLE_EXTRACT_SCRIPTS['model_version'])
+                source = self.source_session()
+                try:
+                    for line in parse_sql_script(mv_etl_script):
+                        copy_query(source, sesh, line, {},
+                                   'covariate.model_version_new')
+                        sesh.commit()
+                finally:
+                    source.close()
+        finally:
+            sesh.close()
+
+    def copy_model(self):
+        """Copy the covariate.model rows not yet checkpointed into
+        model_new, and write the model versions copied to complete.txt.
+
+        With --fast-load every foreign key of model_new is then checked in
+        one pass, and rows with orphaned keys are moved into
+        covariate.etl_dead_letter. Versions with rows set aside there are
+        copied as far as they can be, but are reported and left out of
+        complete.txt.
+        """
+        args = self.args
+        sesh = self.session()
+        source = None
+        source_sesh = sesh
+        if args.source:
+            source = source_sesh = self.source_session()
+        try:
+            completed, failed = copy_model(
+                args, self.conn_def, sesh, source, source_sesh,
+                get_model_version_ids(sesh), self.throttle)
+
+            if args.fast_load:
+                # Nothing was checked on the way in, so check it all now.
+                set_aside_loaded_orphans(sesh)
+
+            dead_letters = get_dead_letters(sesh)
+        finally:
+            sesh.close()
+            if source is not None:
+                source.close()
+
+        if dead_letters:
+            print('{} model versions are missing rows set aside in '
+                  'covariate.etl_dead_letter: {}'.format(
+                      len(dead_letters), sorted(dead_letters)))
+            completed = [mvid for mvid in completed
+                         if mvid not in dead_letters]
+
+        # In the event of a failure, or success! Let's print out a list of
+        # the model versions that succeeded.
+        write_success_file(self.code_dir, completed)
+        if failed:
+            raise StageError('{} model versions failed: {}'.format(
+                len(failed), failed))
+
+    def sync(self):
+        """Bring the _new tables up to date with the changes made since the
+        last copy or sync, for --incremental."""
+        sesh = self.session()
+        try:
+            _, failed = sync_changes(sesh, self.args.rows_per_transaction,
+                                     self.throttle)
+        finally:
+            sesh.close()
+        if failed:
+            raise StageError('{} model versions failed to sync: {}'.format(
+                len(failed), failed))
+
+    def verify_mv(self):
+        """Check that model_version_new holds every model version it should,
+        each as last updated in covariate.model_version."""
+        sesh = self.session()
+        source = self.source_session()
+        try:
+            expected = get_model_version_updates(source, 'model_version')
+            actual = get_model_version_updates(sesh, 'model_version_new')
+        finally:
+            sesh.close()
+            source.close()
+        mismatched = sorted(mvid for mvid in set(expected) | set(actual)
+                            if expected.get(mvid) != actual.get(mvid))
+        if mismatched:
+            # copy_mv can't be redone without copy_model after it, so this
+            # is left for --incremental or --restart to fix.
+            raise StageError('{} model versions in model_version_new are '
+                             'missing, extra, or out of date: {}'.format(
+                                 len(mismatched), mismatched))
+
+    def verify(self):
+        """Compare every model version in model_new against covariate.model
+        by row count and checksum.
+
+        Versions that differ are cleared from model_new along with their
+        checkpoints, and copy_model and everything after it are reopened, so
+        the next run copies them again and analyzes the result. Versions with
+        rows in covariate.etl_dead_letter are known to differ and are left
+        alone; the cutover refuses to run until they are dealt with.
+        """
+        sesh = self.session()
+        try:
+            dead_letters = get_dead_letters(sesh)
+            mismatched = verify_model_versions(
+                self.conn_def, self.args.source,
+                [mvid for mvid in get_model_version_ids(sesh)
+                 if mvid not in dead_letters],
+                self.args.workers)
+            for mvid in mismatched:
+                reset_model_version(sesh, mvid, 'row count or checksum '
+                                                'differs from covariate.model',
+                                    self.args.rows_per_transaction)
+            if mismatched:
+                self.reopened.append('copy_model')
+        finally:
+            sesh.close()
+        if mismatched:
+            raise StageError('{} model versions failed verification: '
+                             '{}'.format(len(mismatched), mismatched))
+
+    def analyze(self):
+        """Refresh the index statistics of the _new tables, so queries
+        against them are planned from what was copied rather than from the
+        empty tables they started as."""
+        sesh = self.session()
+        try:
+            sesh.execute('ANALYZE TABLE covariate.model_version_new, '
+                         'covariate.model_new').fetchall()
+            sesh.commit()
+        finally:
+            sesh.close()
+
+    def cutover(self):
+        """Swap the _new tables in for the live ones in one RENAME TABLE.
+
+        Refuses while covariate.etl_dead_letter holds any rows, since those
+        are missing from model_new. Once they have been fixed and copied by
+        hand, or accepted as lost, delete them from etl_dead_letter.
+        """
+        sesh = self.session()
+        try:
+            blockers = cutover_blockers(sesh, CUTOVER_RENAMES)
+            dead_letters = get_dead_letters(sesh)
+            if dead_letters:
+                blockers.insert(0, '{} rows of model versions {} are set '
+                                   'aside in covariate.etl_dead_letter'.format(
+                                       sum(dead_letters.values()),
+                                       sorted(dead_letters)))
+            if blockers:
+                raise StageError('Not cutting over:\n{}'.format(
+                    '\n'.join(blockers)))
+            rename_tables(sesh, CUTOVER_RENAMES)
+        finally:
+            sesh.close()
+        print('Cut over to the new model and model_version tables; '
+              'model_old and model_version_old are kept for '
+              '--rollback-cutover')
+
+
+def main():
+    """The main function is responsible for running the full ETL pipeline from
+    front to back, as a graph of stages:
+
+        create      drop and create the '_new' tables, which will let us
+                    copy data over from the existing tables before renaming
+                    the '_new' tables to the original names
+        copy_mv     copy model_version, which is small enough to copy whole
+                    (except for models from GBD Round 3 and earlier)
+        copy_model  copy covariate.model in chunks
+        sync        with --incremental, catch up on changes since the copy
+        verify_mv   check model_version_new against model_version
+        verify      check model_new against covariate.model
+        analyze     refresh the index statistics of the '_new' tables
+        cutover     with --cutover, swap the '_new' tables in
+
+    Each stage starts once every stage it depends on has completed, so
+    verify_mv runs alongside copy_model, and verify alongside analyze. Every
+    stage's progress is kept in covariate.etl_stage, and a rerun skips the
+    stages already complete; in particular the tables are only recreated by
+    the first run, or after --restart.
+
+    For the model table, we will plan chunks of roughly --rows-per-transaction
+    rows each: small model versions are batched into one transaction and large
+    ones are split into ranges of year_ids. Each chunk is copied and committed
+    on its own, by --workers processes in parallel, together with a row in
+    covariate.etl_checkpoint, and a rerun only copies the chunks not yet
+    checkpointed. With --keyset, large model versions are instead copied by
+    walking their primary key, one commit per --rows-per-transaction rows,
+    and resume mid-version. --target-seconds lets the slice size follow the
+    copy rate, so slices grow while the server is quiet and shrink when it is
+    busy. --fast-load copies with foreign key and unique checks off and
+    checks every foreign key of model_new in one pass at the end instead,
+    moving the rows that break one into covariate.etl_dead_letter.
+    Unless --no-throttle is given, the copy pauses before each transaction
+    while the server is busier than --max-threads-running,
+    --max-history-length, or --max-replica-lag allow, and gives up once a
+    pause has lasted --max-throttle-wait seconds. --source copies from
+    another server, spooling each chunk to a local file and loading it with
+    LOAD DATA.
+
+    verify compares every copied model version against its source by row
+    count and checksum, and clears any that differ for the next run to copy
+    again. The cutover renames the '_new' tables over the originals in one
+    atomic RENAME TABLE, keeping the originals as '_old' tables, which
+    --rollback-cutover swaps back in. Since the copy can take hours, pass
+    --incremental to catch up on the rows changed since it started; only what
+    changed since the last pass is read back, and everything after sync is
+    run again.
+
+    --plan lists what a full copy would do and how long it would take
+    without changing anything, to size the maintenance window beforehand.
+    """
+    args = parse_args()
+
+    if args.prod == 'prod':
+        conn_def = 'covariate'
+    else:
+        conn_def = 'covariate-test'
+    if args.plan:
+        print_plan(args, conn_def)
+        return
+
+    sesh = get_session(conn_def)
+    try:
+        for line in parse_sql_script(os.path.join(this_dir, STAGE_SCRIPT)):
+            exec_query(line, session=sesh)
+            sesh.commit()
+
+        if args.rollback_cutover:
+            renames = rollback_renames(CUTOVER_RENAMES)
+            blockers = cutover_blockers(sesh, renames)
+            if blockers:
+                print('Not rolling back the cutover:\n{}'.format(
+                    '\n'.join(blockers)))
+                return
+            rename_tables(sesh, renames)
+            clear_stages(sesh, ['cutover'])
+            print('Rolled back the cutover')
+            return
+
+        throttle = None
+        if not args.no_throttle:
+            throttle = Throttle(max_threads_running=args.max_threads_running,
+                                max_history_length=args.max_history_length,
+                                max_replica_lag=args.max_replica_lag,
+                                replicas=args.replica,
+                                max_wait=args.max_throttle_wait)
+
+        etl = ETL(args, conn_def, throttle)
+        stages = etl.stages()
+        if args.restart:
+            clear_stages(sesh)
+        elif args.incremental:
+            clear_stages(sesh, downstream(stages, ['sync']))
+        done = [stage for stage, status in get_stages(sesh).items()
+                if status == 'complete']
+        for stage in stages:
+            if stage.name in done:
+                print('Skipping {}, already complete'.format(stage.name))
+
+        def record(stage, status, error):
+            record_stage(sesh, stage, status, error)
+            if status != 'failed':
+                print('{} {}'.format(stage, status))
+            elif isinstance(error, StageError):
+                print('{} failed: {}'.format(stage, error))
+            else:
+                # Anything else is unexpected, so keep where it came from.
+                print('{} failed:\n{}'.format(stage, ''.join(
+                    traceback.format_exception(type(error), error,
+                                               error.__traceback__))))
 
-    # In the event of a failure, or success! Let's print out a list of the
-    # model versions that succeeded so we can start from where we left off.
-    if len(failed):
-        write_success_file(code_dir, completed)
+        _, failed, blocked = run_stages(stages, done, record)
+        clear_stages(sesh, downstream(stages, etl.reopened))
+        if failed:
+            print('Stages failed: {}. Not run: {}. Rerun to resume from '
+                  'them.'.format(', '.join(failed),
+                                 ', '.join(blocked) or 'none'))
+    finally:
+        sesh.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,182 @@
+"""Copy covariate tables between servers through LOAD DATA LOCAL INFILE.
+
+INSERT ... SELECT only works when the source and target tables live on the
+same server. To copy across servers, each chunk is instead streamed out of the
+source through a server-side cursor into a tab separated spool file on local
+disk, then loaded into the target with LOAD DATA LOCAL INFILE, which skips the
+per-statement parsing of row by row INSERTs.
+
+Spool files use LOAD DATA's default format: tab separated fields, newline
+terminated lines, backslash escapes, and \\N for NULL.
+"""
+import datetime
+import io
+import os
+import tempfile
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+
+# Rows fetched from the source per round trip while spooling.
+FETCH_ROWS = 10000
+
+# The engines behind bulk_session(), one per process and target server, so
+# every bulk session shares one connection pool rather than opening its own.
+_engines = {}
+_engines_lock = threading.Lock()
+
+_ESCAPES = [('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r'),
+            ('\0', '\\0')]
+
+
+class LoadError(Exception):
+    """Raised when LOAD DATA loads fewer rows than were spooled.
+
+    LOAD DATA LOCAL behaves as LOAD DATA IGNORE: rows with duplicate keys,
+    broken foreign keys, or values that don't convert are skipped with only
+    a warning, so the row count is the only sign any were lost.
+    """
+
+
+def bulk_session(sesh):
+    """Return a new session on the same server as sesh that is allowed to
+    send local files with LOAD DATA LOCAL INFILE, and close sesh.
+
+    MySQL drivers refuse LOAD DATA LOCAL unless the connection was opened with
+    local_infile set, so the target needs connections of its own. They come
+    from an engine kept for the life of the process, which closing the
+    session returns them to. Copy worker processes each get engines of their
+    own, since pooled connections can't be shared across a fork.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): a session on the target
+            server, which the new session replaces.
+    """
+    url = sesh.get_bind().url
+    key = (os.getpid(), str(url))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = create_engine(
+                url, connect_args={'local_infile': 1}, pool_recycle=360)
+    sesh.close()
+    return Session(bind=engine)
+
+
+def spool_query(source, query, params):
+    """Stream the result of a query on the source server into a spool file.
+
+    Arguments:
+        source (sqlalchemy.orm.session.Session): connection to the source
+            server.
+        query (str): the SELECT to run. Its column names must match the
+            target table's.
+        params (dict): bind parameters for query.
+
+    Returns:
+        (path, columns, row_count) for the spool file written, in the
+        directory named by TMPDIR or the system default. The caller is
+        responsible for removing it.
+    """
+    result = source.connection().execution_options(
+        stream_results=True).execute(text(query), params)
+    columns = list(result.keys())
+    row_count = 0
+    handle, path = tempfile.mkstemp(suffix='.tsv')
+    try:
+        with io.open(handle, 'w', encoding='utf-8', newline='\n') as f:
+            while True:
+                rows = result.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                for row in rows:
+                    f.write('\t'.join(_field(value) for value in row))
+                    f.write('\n')
+                row_count += len(rows)
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        result.close()
+    return path, columns, row_count
+
+
+def load_spool(sesh, path, table, columns):
+    """Load a spool file into a table on the target server.
+
+    Runs in sesh's current transaction, so the load commits or rolls back with
+    whatever else the transaction holds.
+
+    Arguments:
+        sesh (sqlalchemy.orm.session.Session): a session from bulk_session().
+        path (str, path): the spool file.
+        table (str): the fully qualified table to load into.
+        columns (list of str): the table columns, in spool file order.
+
+    Returns:
+        the number of rows loaded.
+    """
+    q = """
+        LOAD DATA LOCAL INFILE :path
+        INTO TABLE {table}
+        CHARACTER SET utf8
+        ({columns})
+    """.format(table=table, columns=', '.join(columns))
+    return sesh.execute(q, params={'path': path}).rowcount
+
+
+def copy_query(source, sesh, query, params, table):
+    """Copy the result of a query on the source server into a table on the
+    target server, through a spool file that is removed afterwards.
+
+    The load joins sesh's current transaction and is left for the caller to
+    commit. The read transaction on the source is ended either way.
+
+    Every row spooled must be loaded. If any were skipped, the first few of
+    the server's warnings say why, and the caller should roll back.
+
+    Arguments:
+        source (sqlalchemy.orm.session.Session): connection to the source
+            server.
+        sesh (sqlalchemy.orm.session.Session): a session from bulk_session().
+        query (str): the SELECT to run on the source.
+        params (dict): bind parameters for query.
+        table (str): the fully qualified table to load into.
+
+    Returns:
+        the number of rows loaded.
+
+    Raises:
+        LoadError: if fewer rows were loaded than spooled.
+    """
+    try:
+        path, columns, spooled = spool_query(source, query, params)
+    finally:
+        source.rollback()
+    try:
+        loaded = load_spool(sesh, path, table, columns)
+    finally:
+        os.remove(path)
+    if loaded != spooled:
+        warnings = sesh.execute('SHOW WARNINGS LIMIT 5').fetchall()
+        raise LoadError('Loaded {} of {} rows into {}: {}'.format(
+            loaded, spooled, table,
+            '; '.join(str(warning[2]) for warning in warnings)))
+    return loaded
+
+
+def _field(value):
+    """Format one value for a spool file."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, float):
+        # repr() keeps every significant digit of a double.
+        return repr(value)
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    value = '{}'.format(value)
+    for char, escape in _ESCAPES:
+        value = value.replace(char, escape)
+    return value
@@ -0,0 +1,31 @@
+-- --------------------------------------------------
+-- covariate.etl_checkpoint
+-- --------------------------------------------------
+-- One row per model version per chunk copied into model_new. Rows are written
+-- in the same transaction as the copy itself, so a committed chunk always has
+-- a checkpoint and a rolled back one never does. A restarted ETL skips every
+-- year range marked complete here.
+--
+-- A version copied by keyset pagination has a single whole version row that
+-- is partial until its last slice commits. Each slice updates the last
+-- primary key copied, so a restarted ETL continues just past it.
+
+USE covariate;
+
+DROP TABLE IF EXISTS etl_checkpoint;
+
+CREATE TABLE etl_checkpoint (
+  model_version_id int(11) NOT NULL COMMENT 'the model version copied',
+  year_start int(11) NOT NULL COMMENT 'first year_id in the chunk, or the smallest int for a whole version',
+  year_end int(11) NOT NULL COMMENT 'last year_id in the chunk, or the largest int for a whole version',
+  status varchar(8) COLLATE utf8_unicode_ci NOT NULL COMMENT 'Either complete, partial, or failed',
+  row_count int(11) NOT NULL DEFAULT 0 COMMENT 'rows of this model version copied by the chunk',
+  duration double NOT NULL DEFAULT 0 COMMENT 'seconds the chunk took to copy',
+  last_year_id int(11) DEFAULT NULL COMMENT 'year_id of the last row a keyset copy committed',
+  last_location_id int(11) DEFAULT NULL COMMENT 'location_id of the last row a keyset copy committed',
+  last_sex_id int(11) DEFAULT NULL COMMENT 'sex_id of the last row a keyset copy committed',
+  last_age_group_id int(11) DEFAULT NULL COMMENT 'age_group_id of the last row a keyset copy committed',
+  error varchar(1000) COLLATE utf8_unicode_ci DEFAULT NULL COMMENT 'why a failed chunk failed',
+  last_updated datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'When this row was last written',
+  PRIMARY KEY (model_version_id, year_start, year_end)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
@@ -0,0 +1,328 @@
+"""Planning how the covariate.model ETL breaks its work into transactions.
+
+Nothing in here talks to the database; the ETL hands in row counts and gets
+back the chunks it should copy, one transaction each, the order to copy them
+in, and estimates of how long the rest of the copy will take.
+"""
+from collections import namedtuple
+import time
+
+
+# The widest possible year_id range, used for chunks that copy whole model
+# versions. Every key column is an int(11), so the same bounds sit before and
+# after every possible primary key.
+YEAR_MIN = INT_MIN = -2147483648
+YEAR_MAX = INT_MAX = 2147483647
+
+# The covariate.model primary key after model_version_id, in index order.
+KEYSET_COLUMNS = ('year_id', 'location_id', 'sex_id', 'age_group_id')
+
+
+class Chunk(namedtuple('Chunk', ['model_version_ids', 'year_start',
+                                 'year_end', 'rows'])):
+    """One transaction's worth of covariate.model rows.
+
+    Either a batch of whole model versions (year_start and year_end are None)
+    or a contiguous year_id range of a single large model version.
+
+    Attributes:
+        model_version_ids (tuple of int): the model versions copied.
+        year_start (int or None): the first year_id copied.
+        year_end (int or None): the last year_id copied.
+        rows (int): the expected number of rows.
+    """
+    __slots__ = ()
+
+    @property
+    def is_whole(self):
+        """Whether the chunk copies every row of its model versions."""
+        return self.year_start is None
+
+    @property
+    def params(self):
+        """The bind parameters for model_copy.sql. model_version_ids is
+        passed as a tuple, which the MySQL drivers render as a parenthesized
+        list for the IN clause."""
+        return {
+            'model_version_ids': tuple(self.model_version_ids),
+            'year_start': YEAR_MIN if self.is_whole else self.year_start,
+            'year_end': YEAR_MAX if self.is_whole else self.year_end,
+        }
+
+    @property
+    def key_range(self):
+        """The (after, through) primary key range the chunk copies from each
+        of its model versions, as (year_id, location_id, sex_id,
+        age_group_id) tuples. after itself is not in the range."""
+        params = self.params
+        return ((params['year_start'], INT_MIN, INT_MIN, INT_MIN),
+                (params['year_end'], INT_MAX, INT_MAX, INT_MAX))
+
+
+class KeysetChunk(Chunk):
+    """A single large model version copied a slice at a time.
+
+    Rather than one transaction, the version's primary key is walked in
+    slices of a bounded number of rows, each committed on its own along with
+    the last key it copied, so the copy can pick up mid-version.
+    """
+    __slots__ = ()
+
+
+def plan_chunks(version_rows, target_rows, year_rows, done_ranges=None,
+                keyset=False, keyset_positions=None):
+    """Group model versions into chunks of roughly target_rows rows.
+
+    Consecutive small model versions are batched together until the next one
+    would take the batch past target_rows. A model version with more than
+    target_rows rows on its own is split into year_id ranges instead.
+
+    When resuming, done_ranges says what an earlier run already copied. Model
+    versions copied in full are left out of the plan. Versions copied in part
+    are always split, and only the year_ids not yet copied are planned, so no
+    row is copied twice even if target_rows has changed.
+
+    With keyset set, versions larger than target_rows become a KeysetChunk
+    instead of being split by year. A version with a saved keyset position
+    always does, so a resumed run carries on from where it stopped. A version
+    already copied in part by year ranges is still finished by year ranges,
+    since a keyset copy would start over from its first row.
+
+    Arguments:
+        version_rows (list of (int, int)): (model_version_id, row count)
+            pairs, in the order they should be copied.
+        target_rows (int): the number of rows to aim for per transaction.
+        year_rows (callable): called with a model_version_id, returns
+            (year_id, row count) pairs for that version in year_id order. Only
+            called for versions that need splitting.
+        done_ranges (dict, optional): model_version_id to a list of
+            (year_start, year_end) ranges already copied, as recorded in the
+            checkpoint table.
+        keyset (bool): copy large versions by keyset pagination.
+        keyset_positions (dict, optional): model_version_id to the last
+            primary key copied by an unfinished keyset copy.
+
+    Returns:
+        a list of Chunk in copy order. Every model version still to copy
+        appears in at least one chunk, including versions with no rows.
+    """
+    done_ranges = done_ranges or {}
+    keyset_positions = keyset_positions or {}
+    chunks = []
+    batch = []
+    batch_rows = 0
+
+    def flush():
+        if batch:
+            chunks.append(Chunk(tuple(batch), None, None, batch_rows))
+        return [], 0
+
+    for mvid, rows in version_rows:
+        ranges = done_ranges.get(mvid, [])
+        if (YEAR_MIN, YEAR_MAX) in ranges:
+            continue
+
+        if ranges:
+            batch, batch_rows = flush()
+            # Split each run of years between copied ranges separately so no
+            # chunk's year range spans rows that are already copied.
+            run = []
+            for year_id, count in year_rows(mvid):
+                if any(start <= year_id <= end for start, end in ranges):
+                    chunks.extend(split_version(mvid, run, target_rows))
+                    run = []
+                else:
+                    run.append((year_id, count))
+            chunks.extend(split_version(mvid, run, target_rows))
+            continue
+
+        if mvid in keyset_positions or (keyset and rows > target_rows):
+            batch, batch_rows = flush()
+            chunks.append(KeysetChunk((mvid,), None, None, rows))
+            continue
+
+        if rows > target_rows:
+            batch, batch_rows = flush()
+            chunks.extend(split_version(mvid, year_rows(mvid), target_rows))
+            continue
+
+        if batch and batch_rows + rows > target_rows:
+            batch, batch_rows = flush()
+        batch.append(mvid)
+        batch_rows += rows
+
+    flush()
+    return chunks
+
+
+def split_version(mvid, year_rows, target_rows):
+    """Split one model version into chunks of contiguous year_ids.
+
+    Years are never split, so a single year holding more than target_rows
+    rows becomes a chunk of its own.
+
+    Arguments:
+        mvid (int): the model_version_id.
+        year_rows (list of (int, int)): (year_id, row count) pairs in year_id
+            order.
+        target_rows (int): the number of rows to aim for per transaction.
+
+    Returns:
+        a list of Chunk covering every year of the version.
+    """
+    chunks = []
+    start = end = None
+    rows = 0
+    for year_id, count in year_rows:
+        if start is not None and rows + count > target_rows:
+            chunks.append(Chunk((mvid,), start, end, rows))
+            start, rows = None, 0
+        if start is None:
+            start = year_id
+        end = year_id
+        rows += count
+
+    if start is not None:
+        chunks.append(Chunk((mvid,), start, end, rows))
+    return chunks
+
+
+def last_chunks(chunks):
+    """Map each model_version_id to the index of the last chunk copying it,
+    so the ETL knows when a split version has been copied in full."""
+    last = {}
+    for index, chunk in enumerate(chunks):
+        for mvid in chunk.model_version_ids:
+            last[mvid] = index
+    return last
+
+
+def lpt_order(chunks):
+    """Order chunks largest first.
+
+    Handing the largest remaining chunk to whichever worker frees up first is
+    longest-processing-time-first scheduling, which keeps the biggest model
+    versions from being left for the end of the run where they would finish
+    long after every other worker has gone idle.
+    """
+    return sorted(chunks, key=lambda chunk: chunk.rows, reverse=True)
+
+
+def lpt_makespan(sizes, workers):
+    """Return the largest total any worker is assigned when sizes are handed
+    out largest first, each to the least loaded of workers workers."""
+    loads = [0] * max(workers, 1)
+    for size in sorted(sizes, reverse=True):
+        least = loads.index(min(loads))
+        loads[least] += size
+    return max(loads)
+
+
+class ChunkSizer(object):
+    """Choose how many rows the next keyset slice should copy.
+
+    With a target_seconds the size follows the copy rate: after each slice
+    the next one is sized to take about target_seconds at the rate just
+    measured, growing by at most a factor of two per slice so one quick slice
+    cannot overshoot. A slice whose rate falls below half the running average
+    is taken as a sign the server is under load and halves the size. Lock
+    wait timeouts call back_off(), which also halves it. Without a
+    target_seconds the size only ever changes through back_off().
+
+    Attributes:
+        rows (int): the size of the next slice.
+        rate (float or None): the running average rows per second.
+    """
+    # Weight of the newest slice in the running average rate.
+    smoothing = 0.3
+
+    def __init__(self, rows, target_seconds=None, min_rows=1000,
+                 max_rows=None):
+        self.min_rows = min(min_rows, rows)
+        self.max_rows = max_rows or rows * 20
+        self.rows = rows
+        self.target_seconds = target_seconds
+        self.rate = None
+
+    def observe(self, rows, seconds):
+        """Size the next slice from one that copied rows in seconds."""
+        if not rows or seconds <= 0:
+            return
+        rate = rows / float(seconds)
+        average = rate if self.rate is None else self.rate
+        self.rate = self.smoothing * rate + (1 - self.smoothing) * average
+        if self.target_seconds is None:
+            return
+
+        size = min(rate * self.target_seconds, self.rows * 2)
+        if rate < average / 2:
+            size = min(size, self.rows / 2)
+        self._resize(size)
+
+    def back_off(self):
+        """Halve the size after a lock wait timeout. Returns False if it is
+        already as small as allowed."""
+        if self.rows <= self.min_rows:
+            return False
+        self._resize(self.rows / 2)
+        return True
+
+    def _resize(self, size):
+        self.rows = int(max(self.min_rows, min(self.max_rows, size)))
+
+
+class Progress(object):
+    """Track copied chunks and estimate how long the rest will take.
+
+    The estimate assumes every worker copies at the average per-worker rate
+    seen so far and that the remaining chunks are scheduled largest first.
+    """
+
+    def __init__(self, chunks, workers, clock=time.time):
+        self.remaining = dict(enumerate(chunks))
+        self.workers = workers
+        self.total_rows = sum(chunk.rows for chunk in chunks)
+        self.rows_done = 0
+        self.clock = clock
+        self.start = clock()
+
+    def chunk_done(self, index, copied=True):
+        """Mark the chunk at index in the original plan as finished. Only
+        the rows of chunks that were copied count toward the copy rate;
+        skipped and failed chunks just leave the rows still to copy."""
+        chunk = self.remaining.pop(index)
+        if copied:
+            self.rows_done += chunk.rows
+
+    def rows_per_second(self):
+        """The average number of rows each worker has copied per second."""
+        elapsed = self.clock() - self.start
+        if not elapsed or not self.rows_done:
+            return None
+        return self.rows_done / (elapsed * self.workers)
+
+    def remaining_seconds(self):
+        """Estimated wall time until every remaining chunk is copied, or None
+        before any rows have been copied."""
+        rate = self.rows_per_second()
+        if rate is None:
+            return None
+        sizes = [chunk.rows for chunk in self.remaining.values()]
+        return lpt_makespan(sizes, self.workers) / rate
+
+    def __str__(self):
+        seconds = self.remaining_seconds()
+        eta = 'unknown' if seconds is None else format_duration(seconds)
+        return '{done}/{total} rows copied, {eta} remaining'.format(
+            done=self.rows_done, total=self.total_rows, eta=eta)
+
+
+def format_duration(seconds):
+    """Format a number of seconds as e.g. '2h 05m 09s'."""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '{}h {:02d}m {:02d}s'.format(hours, minutes, seconds)
+    if minutes:
+        return '{}m {:02d}s'.format(minutes, seconds)
+    return '{}s'.format(seconds)
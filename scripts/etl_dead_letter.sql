@@ -0,0 +1,25 @@
+-- --------------------------------------------------
+-- covariate.etl_dead_letter
+-- --------------------------------------------------
+-- covariate.model rows the ETL could not write to model_new, such as rows
+-- with a key missing from a shared table. They are set aside here in the same
+-- transaction as the rest of their chunk, so one bad row doesn't hold up its
+-- whole model version.
+
+USE covariate;
+
+DROP TABLE IF EXISTS etl_dead_letter;
+
+CREATE TABLE etl_dead_letter (
+  model_version_id int(11) NOT NULL COMMENT 'the model version of the row',
+  year_id int(11) NOT NULL COMMENT 'the year_id of the row',
+  location_id int(11) NOT NULL COMMENT 'the location_id of the row',
+  sex_id int(11) NOT NULL COMMENT 'the sex_id of the row',
+  age_group_id int(11) NOT NULL COMMENT 'the age_group_id of the row',
+  mean_value double NOT NULL COMMENT 'mean value',
+  upper_value double DEFAULT NULL COMMENT 'upper value',
+  lower_value double DEFAULT NULL COMMENT 'lower value',
+  error varchar(1000) COLLATE utf8_unicode_ci NOT NULL COMMENT 'why the row could not be copied',
+  last_updated datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'When this row was last written',
+  PRIMARY KEY (model_version_id, year_id, location_id, sex_id, age_group_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
@@ -0,0 +1,90 @@
+"""Run the ETL as a graph of named stages that can pick up where it stopped.
+
+Each stage names the stages it needs to have finished first. A stage starts
+as soon as everything it needs has succeeded, so stages that don't depend on
+each other run at the same time. Which stages have succeeded is kept by the
+caller between runs, and a rerun skips them.
+"""
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# One step of the ETL. requires names the stages that must succeed before it
+# runs, and run is called with no arguments to carry it out.
+Stage = namedtuple('Stage', ['name', 'requires', 'run'])
+
+
+class StageError(Exception):
+    """Raised by a stage that ran but could not finish its work, such as a
+    copy where some model versions failed."""
+
+
+def run_stages(stages, done, record, max_workers=None):
+    """Run every stage not already done, each once its requirements have
+    succeeded.
+
+    Requirements on stages that aren't in stages are ignored, so optional
+    stages can be left out of a run. A stage whose requirements failed or
+    were never met doesn't run. Stages run in threads, while record is only
+    ever called from the calling thread.
+
+    Arguments:
+        stages (list of Stage): the stages of this run.
+        done (iterable of str): names of the stages that already succeeded
+            in an earlier run.
+        record (callable): called with (name, status, error) as each stage
+            starts ('running', None) and finishes ('complete', None) or
+            ('failed', the exception).
+        max_workers (int, optional): the most stages to run at once.
+            Defaults to all of them.
+
+    Returns:
+        (succeeded, failed, blocked) lists of stage names, where blocked
+        stages never ran because a requirement failed.
+    """
+    names = set(stage.name for stage in stages)
+    succeeded = set(done) & names
+    pending = [stage for stage in stages if stage.name not in succeeded]
+    failed = []
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1) \
+            as executor:
+        while True:
+            for stage in list(pending):
+                requires = [name for name in stage.requires if name in names]
+                if all(name in succeeded for name in requires):
+                    pending.remove(stage)
+                    record(stage.name, 'running', None)
+                    running[executor.submit(stage.run)] = stage.name
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    succeeded.add(name)
+                    record(name, 'complete', None)
+                else:
+                    failed.append(name)
+                    record(name, 'failed', error)
+
+    ordered = [stage.name for stage in stages]
+    return ([name for name in ordered if name in succeeded], failed,
+            [stage.name for stage in pending])
+
+
+def downstream(stages, names):
+    """Return the names of the given stages and every stage that requires
+    one of them, directly or not, in the order of stages."""
+    found = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for stage in stages:
+            if stage.name not in found and found.intersection(stage.requires):
+                found.add(stage.name)
+                changed = True
+    return [stage.name for stage in stages if stage.name in found]
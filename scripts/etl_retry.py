@@ -0,0 +1,75 @@
+"""Tell apart the errors worth retrying from the ones a retry can't fix.
+
+A chunk that fails because of contention or a dropped connection will
+usually succeed if it is simply run again a little later. A chunk that fails
+because some row can't be written never will, however many times it is
+retried; the ETL narrows those down to the rows at fault instead.
+"""
+import random
+
+
+# Server and client error numbers for failures that leave nothing wrong with
+# the data: deadlocks, lock wait timeouts, and lost or refused connections.
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+TRANSIENT_ERRORS = frozenset([
+    DEADLOCK,
+    LOCK_WAIT_TIMEOUT,
+    2003,  # can't connect to the server
+    2006,  # server has gone away
+    2013,  # lost connection to the server during a query
+])
+
+# Server error numbers for rows that can't be written as they are. A
+# duplicate key (1062) is left out on purpose: model_new only holds rows
+# copied from covariate.model's own primary key, so a duplicate means the
+# chunk was planned over rows already copied, which no row can be blamed for.
+DATA_ERRORS = frozenset([
+    1048,  # column cannot be null
+    1264,  # out of range value
+    1265,  # data truncated
+    1292,  # incorrect date or time value
+    1366,  # incorrect value for a column
+    1406,  # data too long for a column
+    1452,  # foreign key constraint fails
+])
+
+
+def server_error_code(exc):
+    """Return the MySQL error number behind a database exception, or None.
+
+    SQLAlchemy wraps the driver's exception in exc.orig, and MySQL drivers
+    put the error number first in its args.
+    """
+    args = getattr(getattr(exc, 'orig', exc), 'args', ())
+    if args and isinstance(args[0], int):
+        return args[0]
+    return None
+
+
+def is_transient(exc):
+    """Whether running the same transaction again may well succeed."""
+    return server_error_code(exc) in TRANSIENT_ERRORS
+
+
+def is_data_error(exc):
+    """Whether exc was caused by a row that can't be written."""
+    return server_error_code(exc) in DATA_ERRORS
+
+
+def backoff_delays(retries, base=1.0, cap=60.0, rand=random.random):
+    """Yield how long to sleep before each of retries retries.
+
+    Delays grow exponentially from base up to cap, and each is drawn
+    uniformly from zero up to that bound ("full jitter"), so workers that
+    failed together, say on both sides of a deadlock, don't all retry at the
+    same moment.
+
+    Arguments:
+        retries (int): the number of delays to yield.
+        base (float): the bound on the first delay, in seconds.
+        cap (float): the largest bound on any delay, in seconds.
+        rand (callable): returns a float in [0, 1).
+    """
+    for attempt in range(retries):
+        yield rand() * min(cap, base * 2 ** attempt)
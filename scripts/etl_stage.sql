@@ -0,0 +1,17 @@
+-- --------------------------------------------------
+-- covariate.etl_stage
+-- --------------------------------------------------
+-- One row per stage of the ETL that has started. A rerun skips every stage
+-- marked complete here and starts again from the first one that isn't, so
+-- unlike the other ETL tables this one is only created if it is missing and
+-- survives the create stage. etl.py --restart clears it.
+
+USE covariate;
+
+CREATE TABLE IF NOT EXISTS etl_stage (
+  stage varchar(32) COLLATE utf8_unicode_ci NOT NULL COMMENT 'the name of the stage',
+  status varchar(8) COLLATE utf8_unicode_ci NOT NULL COMMENT 'Either running, complete, or failed',
+  error varchar(1000) COLLATE utf8_unicode_ci DEFAULT NULL COMMENT 'why a failed stage failed',
+  last_updated datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'When this row was last written',
+  PRIMARY KEY (stage)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
@@ -0,0 +1,158 @@
+"""Hold the covariate.model ETL back while the database server is under load.
+
+Between chunks, the copy samples how busy the server is, and the server it
+copies from if that is another one, and waits out any period where one of
+these is over its limit:
+
+    - Threads_running, the number of queries executing at once
+    - the InnoDB history list length, the undo log not yet purged, which long
+      copy transactions grow and which slows every read
+    - replication lag (Seconds_Behind_Master) of any replicas named
+"""
+import time
+
+from db_tools.ezfuncs import get_session
+
+from etl_pipeline import StageError
+
+
+class Throttle(object):
+    """Wait between chunks while the server is over any of its limits.
+
+    Each wait that finds a limit exceeded sleeps for pause seconds, doubling
+    up to max_pause for as long as the server stays over, and then samples
+    again. A limit of None is not checked. A wait that would go on past
+    max_wait seconds in all gives up instead, so a replica that has stopped
+    replicating can't hold the ETL up forever.
+
+    Arguments:
+        max_threads_running (int or None): the most queries that may be
+            running on the server at once.
+        max_history_length (int or None): the longest the InnoDB history list
+            may be.
+        max_replica_lag (int or None): the most seconds any replica may be
+            behind.
+        replicas (list of str): db_tools connection definitions of the
+            replicas whose lag is checked.
+        pause (float): seconds to sleep the first time a limit is exceeded.
+        max_pause (float): the longest single sleep.
+        max_wait (float or None): the longest a single wait may take in all,
+            or None to wait for as long as it takes.
+    """
+
+    def __init__(self, max_threads_running=None, max_history_length=None,
+                 max_replica_lag=None, replicas=(), pause=10, max_pause=300,
+                 max_wait=None, sleep=time.sleep):
+        self.max_threads_running = max_threads_running
+        self.max_history_length = max_history_length
+        self.max_replica_lag = max_replica_lag
+        self.replicas = list(replicas)
+        self.pause = pause
+        self.max_pause = max_pause
+        self.max_wait = max_wait
+        self.sleep = sleep
+        self._replica_sessions = None
+
+    def __getstate__(self):
+        # Sessions don't pickle; each copy worker opens its own.
+        state = dict(self.__dict__)
+        state['_replica_sessions'] = None
+        return state
+
+    def wait(self, sesh, source=None):
+        """Sleep until the server, and the source server if any, are within
+        every limit.
+
+        Arguments:
+            sesh (sqlalchemy.orm.session.Session): connection to the server
+                being copied into, between transactions.
+            source (sqlalchemy.orm.session.Session, optional): connection to
+                the server being copied from, if not sesh's.
+
+        Returns:
+            the number of seconds spent waiting.
+
+        Raises:
+            StageError: if the server is still over a limit after max_wait
+                seconds.
+        """
+        pause = self.pause
+        waited = 0
+        while True:
+            reasons = self.check(sesh, source)
+            if not reasons:
+                return waited
+            if self.max_wait is not None and waited >= self.max_wait:
+                raise StageError('Gave up after pausing the copy for {}s: '
+                                 '{}'.format(waited, '; '.join(reasons)))
+            if self.max_wait is not None:
+                pause = min(pause, self.max_wait - waited)
+            print('Pausing the copy for {}s: {}'.format(pause,
+                                                        '; '.join(reasons)))
+            self.sleep(pause)
+            waited += pause
+            pause = min(pause * 2, self.max_pause)
+
+    def check(self, sesh, source=None):
+        """Return a description of every limit the servers are over now."""
+        reasons = self.load(sesh)
+        if source is not None:
+            reasons.extend('source server: {}'.format(reason)
+                           for reason in self.load(source))
+
+        if self.max_replica_lag is not None and self.replicas:
+            if self._replica_sessions is None:
+                self._replica_sessions = [get_session(replica)
+                                          for replica in self.replicas]
+            for replica, replica_sesh in zip(self.replicas,
+                                             self._replica_sessions):
+                lag = replica_lag(replica_sesh)
+                if lag is None:
+                    reasons.append('{} is not replicating'.format(replica))
+                elif lag > self.max_replica_lag:
+                    reasons.append('{} is {}s behind'.format(replica, lag))
+        return reasons
+
+    def load(self, sesh):
+        """Return a description of every limit on running queries and
+        history list length that sesh's server is over now."""
+        reasons = []
+        if self.max_threads_running is not None:
+            running = threads_running(sesh)
+            if running > self.max_threads_running:
+                reasons.append('{} threads running'.format(running))
+        if self.max_history_length is not None:
+            length = history_list_length(sesh)
+            if length > self.max_history_length:
+                reasons.append('history list length {}'.format(length))
+        sesh.rollback()
+        return reasons
+
+
+def threads_running(sesh):
+    """Return the number of queries running on the server right now."""
+    row = sesh.execute("SHOW GLOBAL STATUS LIKE 'Threads_running'").fetchone()
+    return int(row[1])
+
+
+def history_list_length(sesh):
+    """Return the InnoDB history list length: the number of committed
+    transactions whose undo log has not been purged yet."""
+    q = """
+        SELECT count
+        FROM information_schema.innodb_metrics
+        WHERE name = 'trx_rseg_history_len'
+    """
+    return int(sesh.execute(q).scalar())
+
+
+def replica_lag(sesh):
+    """Return a replica's Seconds_Behind_Master, or None if its replication
+    threads are not running."""
+    result = sesh.execute('SHOW SLAVE STATUS')
+    row = result.fetchone()
+    sesh.rollback()
+    if row is None:
+        return None
+    lag = dict(zip(result.keys(), row))['Seconds_Behind_Master']
+    return None if lag is None else int(lag)
@@ -0,0 +1,19 @@
+-- --------------------------------------------------
+-- covariate.etl_watermark
+-- --------------------------------------------------
+-- One row per source table the ETL copies. Every change to the source table
+-- last updated before the watermark is already in its _new table, so an
+-- incremental re-sync only has to look at rows last updated since. The
+-- watermark is set when a full copy starts and moved forward after each
+-- incremental pass that completes without failures.
+
+USE covariate;
+
+DROP TABLE IF EXISTS etl_watermark;
+
+CREATE TABLE etl_watermark (
+  table_name varchar(64) COLLATE utf8_unicode_ci NOT NULL COMMENT 'the source table, either model or model_version',
+  watermark datetime NOT NULL COMMENT 'changes last updated before this have been copied',
+  last_updated datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'When this row was last written',
+  PRIMARY KEY (table_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
@@ -1,5 +1,8 @@
--- This script represents the ETL of a single model_version's data from the
--- model table to its new schema for GBD 2019.
+-- This script represents the ETL of one chunk of the model table to its new
+-- schema for GBD 2019: either a batch of whole model versions, or a range of
+-- year_ids within a single large model version.
+-- The statement has to end with its WHERE clause, since the ETL appends a
+-- condition to it to leave out rows set aside in etl_dead_letter.
 
 INSERT INTO model_new
   (model_version_id,
@@ -29,5 +32,6 @@ SELECT m.model_version_id,
        m.last_updated_by,
        m.last_updated_action
 FROM model m
-WHERE model_verion_id = :model_version_id
+WHERE m.model_version_id IN :model_version_ids
+  AND m.year_id BETWEEN :year_start AND :year_end
 ;
\ No newline at end of file
@@ -0,0 +1,56 @@
+-- This script represents the ETL of one slice of a single large model
+-- version from the model table to its new schema for GBD 2019. The slice is
+-- every row whose (year_id, location_id, sex_id, age_group_id) primary key
+-- suffix falls after the last key already copied and up to and including the
+-- slice's last key, so walking the primary key in slices copies each row
+-- exactly once. The key comparisons are spelled out column by column rather
+-- than as row constructors, which MySQL 5.7 can't use as an index range.
+-- The statement has to end with its WHERE clause, since the ETL appends a
+-- condition to it to leave out rows set aside in etl_dead_letter.
+
+INSERT INTO model_new
+  (model_version_id,
+   year_id,
+   location_id,
+   sex_id,
+   age_group_id,
+   mean_value,
+   upper_value,
+   lower_value,
+   date_inserted,
+   inserted_by,
+   last_updated,
+   last_updated_by,
+   last_updated_action)
+SELECT m.model_version_id,
+       m.year_id,
+       m.location_id,
+       m.sex_id,
+       m.age_group_id,
+       m.mean_value,
+       m.upper_value,
+       m.lower_value,
+       m.date_inserted,
+       m.inserted_by,
+       m.last_updated,
+       m.last_updated_by,
+       m.last_updated_action
+FROM model m
+WHERE m.model_version_id = :model_version_id
+  AND m.year_id >= :after_year_id
+  AND (m.year_id > :after_year_id
+       OR (m.year_id = :after_year_id
+           AND (m.location_id > :after_location_id
+                OR (m.location_id = :after_location_id
+                    AND (m.sex_id > :after_sex_id
+                         OR (m.sex_id = :after_sex_id
+                             AND m.age_group_id > :after_age_group_id))))))
+  AND m.year_id <= :through_year_id
+  AND (m.year_id < :through_year_id
+       OR (m.year_id = :through_year_id
+           AND (m.location_id < :through_location_id
+                OR (m.location_id = :through_location_id
+                    AND (m.sex_id < :through_sex_id
+                         OR (m.sex_id = :through_sex_id
+                             AND m.age_group_id <= :through_age_group_id))))))
+;
\ No newline at end of file
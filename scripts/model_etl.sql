@@ -25,14 +25,15 @@ CREATE TABLE model_new (
 COMMENT='For GBD Round 6, potential duplicated rows were avoided by limiting the covariate.model table to GBD Round 4 and above. Covariate data from GBD Round 3 and earlier has been archived.';--
 
 -- CONSTRAINTS --
-ALTER TABLE model ADD CONSTRAINT fk_model_model_version_id FOREIGN KEY (model_version_id) REFERENCES model_version_etl (model_version_id);--
-ALTER TABLE model ADD CONSTRAINT fk_model_location_id FOREIGN KEY (location_id) REFERENCES shared.location (location_id);--
-ALTER TABLE model ADD CONSTRAINT fk_model_sex_id FOREIGN KEY (sex_id) REFERENCES shared.sex (sex_id);--
-ALTER TABLE model ADD CONSTRAINT fk_model_year_id FOREIGN KEY (year_id) REFERENCES shared.year (year_id);--
-ALTER TABLE model ADD CONSTRAINT fk_model_age_group_id FOREIGN KEY (age_group_id) REFERENCES shared.age_group (age_group_id);--
+ALTER TABLE model_new ADD CONSTRAINT fk_model_new_model_version_id FOREIGN KEY (model_version_id) REFERENCES model_version_new (model_version_id);--
+ALTER TABLE model_new ADD CONSTRAINT fk_model_new_location_id FOREIGN KEY (location_id) REFERENCES shared.location (location_id);--
+ALTER TABLE model_new ADD CONSTRAINT fk_model_new_sex_id FOREIGN KEY (sex_id) REFERENCES shared.sex (sex_id);--
+ALTER TABLE model_new ADD CONSTRAINT fk_model_new_year_id FOREIGN KEY (year_id) REFERENCES shared.year (year_id);--
+ALTER TABLE model_new ADD CONSTRAINT fk_model_new_age_group_id FOREIGN KEY (age_group_id) REFERENCES shared.age_group (age_group_id);--
 
 -- INDICES --
 CREATE INDEX fk_model_location_id ON model_new (location_id);--
 CREATE INDEX fk_model_year_id ON model_new (year_id);--
 CREATE INDEX fk_model_sex_id ON model_new (sex_id);--
 CREATE INDEX fk_model_age_group_id ON model_new (age_group_id);--
+CREATE INDEX ix_model_last_updated ON model_new (last_updated);--
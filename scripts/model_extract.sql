@@ -0,0 +1,21 @@
+-- This script reads one chunk of the model table in its new schema for GBD
+-- 2019, for loading into model_new on another server with LOAD DATA. The
+-- selected columns are named after their model_new columns.
+
+SELECT m.model_version_id,
+       m.year_id,
+       m.location_id,
+       m.sex_id,
+       m.age_group_id,
+       m.mean_value,
+       m.upper_value,
+       m.lower_value,
+       m.date_inserted,
+       m.inserted_by,
+       m.last_updated,
+       m.last_updated_by,
+       m.last_updated_action
+FROM model m
+WHERE m.model_version_id IN :model_version_ids
+  AND m.year_id BETWEEN :year_start AND :year_end
+;
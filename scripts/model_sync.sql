@@ -0,0 +1,50 @@
+-- This script represents an incremental re-sync of one chunk of the model
+-- table into model_new after the initial ETL: either a batch of whole model
+-- versions, or a range of year_ids within a single large model version. Only
+-- rows last updated at or after :watermark are touched, and only model
+-- versions with such rows, found from the index on last_updated, are planned
+-- into chunks. Every such row is written over model_new as it is, including
+-- rows whose last_updated_action is DELETE: those are still in the model
+-- table, so they stay in model_new, as the full copy and the verification
+-- have them.
+
+INSERT INTO model_new
+  (model_version_id,
+   year_id,
+   location_id,
+   sex_id,
+   age_group_id,
+   mean_value,
+   upper_value,
+   lower_value,
+   date_inserted,
+   inserted_by,
+   last_updated,
+   last_updated_by,
+   last_updated_action)
+SELECT m.model_version_id,
+       m.year_id,
+       m.location_id,
+       m.sex_id,
+       m.age_group_id,
+       m.mean_value,
+       m.upper_value,
+       m.lower_value,
+       m.date_inserted,
+       m.inserted_by,
+       m.last_updated,
+       m.last_updated_by,
+       m.last_updated_action
+FROM model m
+WHERE m.model_version_id IN :model_version_ids
+  AND m.year_id BETWEEN :year_start AND :year_end
+  AND m.last_updated >= :watermark
+ON DUPLICATE KEY UPDATE
+  model_new.mean_value = VALUES(mean_value),
+  model_new.upper_value = VALUES(upper_value),
+  model_new.lower_value = VALUES(lower_value),
+  model_new.date_inserted = VALUES(date_inserted),
+  model_new.inserted_by = VALUES(inserted_by),
+  model_new.last_updated = VALUES(last_updated),
+  model_new.last_updated_by = VALUES(last_updated_by),
+  model_new.last_updated_action = VALUES(last_updated_action);
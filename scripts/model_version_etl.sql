@@ -4,6 +4,8 @@
 
 USE covariate;--
 
+-- model_new references model_version_new, so it has to go first.
+DROP TABLE IF EXISTS model_new;--
 DROP TABLE IF EXISTS model_version_new;--
 
 CREATE TABLE model_version_new (
@@ -27,9 +29,9 @@ CREATE TABLE model_version_new (
 ) ENGINE=InnoDB AUTO_INCREMENT=24338 DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
 
 -- CONSTRAINTS --
-ALTER TABLE model_version ADD CONSTRAINT fk_model_version_covariate_id FOREIGN KEY (covariate_id) REFERENCES shared.covariate (covariate_id);--
-ALTER TABLE model_version ADD CONSTRAINT fk_model_version_gbd_round_id FOREIGN KEY (gbd_round_id) REFERENCES shared.gbd_round (gbd_round_id);--
-ALTER TABLE model_version ADD CONSTRAINT covariate_id_gbd_round_id_is_best UNIQUE (covariate_id, gbd_round_id, is_best);--
+ALTER TABLE model_version_new ADD CONSTRAINT fk_model_version_new_covariate_id FOREIGN KEY (covariate_id) REFERENCES shared.covariate (covariate_id);--
+ALTER TABLE model_version_new ADD CONSTRAINT fk_model_version_new_gbd_round_id FOREIGN KEY (gbd_round_id) REFERENCES shared.gbd_round (gbd_round_id);--
+ALTER TABLE model_version_new ADD CONSTRAINT covariate_id_gbd_round_id_is_best UNIQUE (covariate_id, gbd_round_id, is_best);--
 
 -- INDICES --
 CREATE INDEX fk_model_version_covariate_id ON model_version_new (covariate_id);--
@@ -0,0 +1,23 @@
+-- This script reads the model_version table in its new schema for GBD 2019,
+-- for loading into model_version_new on another server with LOAD DATA. The
+-- selected columns are named after their model_version_new columns.
+
+SELECT mv.model_version_id,
+       dv.covariate_id,
+       mv.gbd_round_id,
+       mv.description,
+       mv.code_version,
+       mv.status,
+       mv.is_best,
+       mv.best_start,
+       mv.best_end,
+       mv.best_user,
+       mv.best_description,
+       mv.date_inserted,
+       mv.inserted_by,
+       mv.last_updated,
+       mv.last_updated_by,
+       mv.last_updated_action
+FROM model_version mv
+JOIN data_version dv USING (data_version_id)
+WHERE mv.gbd_round_id > 3;
@@ -0,0 +1,61 @@
+-- This script represents an incremental re-sync of the model_version table
+-- into model_version_new after the initial ETL. Only model versions from GBD
+-- rounds greater than 3 last updated at or after :watermark are touched.
+-- Every such version is written over model_version_new as it is, including
+-- versions whose last_updated_action is DELETE: those are still in the
+-- model_version table, so they stay in model_version_new, as the full copy
+-- and the verification have them.
+
+INSERT INTO model_version_new
+  (model_version_id,
+   covariate_id,
+   gbd_round_id,
+   description,
+   code_version,
+   status,
+   is_best,
+   best_start,
+   best_end,
+   best_user,
+   best_description,
+   date_inserted,
+   inserted_by,
+   last_updated,
+   last_updated_by,
+   last_updated_action)
+SELECT mv.model_version_id,
+       dv.covariate_id,
+       mv.gbd_round_id,
+       mv.description,
+       mv.code_version,
+       mv.status,
+       mv.is_best,
+       mv.best_start,
+       mv.best_end,
+       mv.best_user,
+       mv.best_description,
+       mv.date_inserted,
+       mv.inserted_by,
+       mv.last_updated,
+       mv.last_updated_by,
+       mv.last_updated_action
+FROM model_version mv
+JOIN data_version dv USING (data_version_id)
+WHERE mv.gbd_round_id > 3
+  AND mv.last_updated >= :watermark
+ON DUPLICATE KEY UPDATE
+  model_version_new.covariate_id = VALUES(covariate_id),
+  model_version_new.gbd_round_id = VALUES(gbd_round_id),
+  model_version_new.description = VALUES(description),
+  model_version_new.code_version = VALUES(code_version),
+  model_version_new.status = VALUES(status),
+  model_version_new.is_best = VALUES(is_best),
+  model_version_new.best_start = VALUES(best_start),
+  model_version_new.best_end = VALUES(best_end),
+  model_version_new.best_user = VALUES(best_user),
+  model_version_new.best_description = VALUES(best_description),
+  model_version_new.date_inserted = VALUES(date_inserted),
+  model_version_new.inserted_by = VALUES(inserted_by),
+  model_version_new.last_updated = VALUES(last_updated),
+  model_version_new.last_updated_by = VALUES(last_updated_by),
+  model_version_new.last_updated_action = VALUES(last_updated_action);
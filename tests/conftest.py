@@ -1,27 +1,156 @@
+from collections import namedtuple
+from contextlib import contextmanager
+import fcntl
+import json
+import os
 import pytest
 import socket
+import sys
+import time
 
 from cluster_utils.ephemerdb import create_ephemerdb
 from db_shared.make_schema import SharedUp
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
 
 from db_covariate.make_schema import CovariateDB
 
+# The ETL in scripts/ is not part of the package, and its modules import each
+# other by name, so its tests import them from the scripts directory.
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from etl import TABLE_CREATE_SCRIPTS, this_dir as etl_dir
+
+
+# The connection details of a server another xdist worker started, which is
+# all the fixtures need of it.
+SharedServer = namedtuple('SharedServer',
+                          ['db_port', 'db_root_pass', 'root_conn_str'])
+
+
+def _xdist_root(config, tmp_path_factory):
+    """The directory shared by every xdist worker of this test run, or None
+    when not running under xdist."""
+    if getattr(config, 'workerinput', None) is None:
+        return None
+    return str(tmp_path_factory.getbasetemp().parent)
+
+
+@contextmanager
+def _locked(root, name):
+    """Hold a lock shared by every xdist worker of this test run. Outside
+    xdist, when root is None, there is nobody to share it with."""
+    if root is None:
+        yield
+        return
+    with open(os.path.join(root, '{}.lock'.format(name)), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_server(root):
+    """The shared server's state, or None if no worker has started one."""
+    path = os.path.join(root, 'server.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_server(root, state):
+    with open(os.path.join(root, 'server.json'), 'w') as f:
+        json.dump(state, f)
+
+
+def _build_once(request, tmp_path_factory, name, build):
+    """Call build once per test run and server.
+
+    Under xdist whichever worker gets here first calls it, while the others
+    wait, and every later worker finds it done. Otherwise it is just called.
+    """
+    root = _xdist_root(request.config, tmp_path_factory)
+    if root is None:
+        build()
+        return
+    with _locked(root, 'server'):
+        state = _read_server(root)
+        if name not in state['built']:
+            build()
+            state['built'].append(name)
+            _write_server(root, state)
+
 
 @pytest.fixture(scope='session')
-def server_instance():
-    server = create_ephemerdb('5.7')
-    server.start()
-    yield server
+def server_instance(request, tmp_path_factory):
+    """Starts one MySQL server for the whole test run.
+
+    Under pytest-xdist every worker uses the same server, each in its own
+    schema. The first worker to get here starts it and shares its connection
+    details with the rest through a file next to their temporary
+    directories, and it stops the server once no other worker is using it.
+    A worker that only gets here after that starts a new one the same way.
+
+    Yields:
+        cluster_utils.ephemerdb.EphemerDB object, or a SharedServer holding
+        the connection details of the one another worker started.
+    """
+    root = _xdist_root(request.config, tmp_path_factory)
+    if root is None:
+        server = create_ephemerdb('5.7')
+        server.start()
+        yield server
+        server.stop()
+        return
+
+    server = None
+    with _locked(root, 'server'):
+        state = _read_server(root)
+        if state is None or state['stopped']:
+            server = create_ephemerdb('5.7')
+            server.start()
+            state = {'db_port': server.db_port,
+                     'db_root_pass': server.db_root_pass,
+                     'root_conn_str': server.root_conn_str,
+                     'users': 0, 'stopped': False, 'built': []}
+        state['users'] += 1
+        _write_server(root, state)
+
+    if server is None:
+        yield SharedServer(state['db_port'], state['db_root_pass'],
+                           state['root_conn_str'])
+    else:
+        yield server
+
+    with _locked(root, 'server'):
+        state = _read_server(root)
+        state['users'] -= 1
+        _write_server(root, state)
+    if server is None:
+        return
+    while True:
+        with _locked(root, 'server'):
+            state = _read_server(root)
+            if not state['users']:
+                state['stopped'] = True
+                _write_server(root, state)
+                break
+        time.sleep(1)
     server.stop()
 
 
 @pytest.fixture(scope='session')
-def shared_db(server_instance):
+def shared_db(request, tmp_path_factory, server_instance):
+    """Builds the shared database once per test run, however many xdist
+    workers use the server."""
     shared = SharedUp(host=socket.gethostname(),
                       port=server_instance.db_port,
                       user="root",
                       password=server_instance.db_root_pass)
-    shared.build_db()
+    _build_once(request, tmp_path_factory, 'shared', shared.build_db)
     yield
 
 
@@ -30,29 +159,184 @@ def cov_conn_def():
     return 'cov'
 
 
-@pytest.fixture(scope='function')
-def covariate_db(shared_db, server_instance):
-    """Creates the covariate database in our existing mysql docker container
-    holding the shared database.
+@pytest.fixture(scope='session')
+def covariate_schema_name(request):
+    """The covariate schema name for this test process.
+
+    Under pytest-xdist each worker gets its own schema (covariate_gw0,
+    covariate_gw1, ...) on the one server they share, so workers never touch
+    each other's tables. A plain pytest run uses covariate.
+    """
+    workerinput = getattr(request.config, 'workerinput', None)
+    if workerinput is None:
+        return 'covariate'
+    return 'covariate_{}'.format(workerinput['workerid'])
+
 
-    At the beginning of each test function, this fixture should be called to
-    instantiate a new instance of the covariate database. When a new instance
-    is called, all existing tables and rows for model and model_version will be
-    dropped.
+@pytest.fixture(scope='session')
+def covariate_schema(shared_db, server_instance, covariate_schema_name):
+    """Builds the covariate database once per test session in our existing
+    mysql docker container holding the shared database.
 
     Arguments (required fixtures):
         shared_db (db_shared.make_schema.SharedUp): this is a fixture that
             created our shared database and holds the credentials that we need
             to build additional tables that rely on shared data.
         server_instance (cluster_utils.ephemerdb.EphemerDB)
+        covariate_schema_name (str): the schema to build.
+
+    Returns:
+        db_covariate.make_schema.CovariateDB object.
+    """
+    cov_db = CovariateDB(host=socket.gethostname(),
+                         port=server_instance.db_port,
+                         user="root",
+                         password=server_instance.db_root_pass,
+                         root_conn_str=server_instance.root_conn_str,
+                         schema=covariate_schema_name)
+    cov_db.build_db(use_snapshot=True)
+    return cov_db
+
+
+@pytest.fixture(scope='function')
+def covariate_db(covariate_schema):
+    """Hands each test function an empty covariate database.
+
+    The schema itself is built once per session by covariate_schema. At the
+    beginning of each test function, all existing rows for model and
+    model_version are truncated and AUTO_INCREMENT counters are put back to
+    their initial values, which is far cheaper than dropping and rebuilding
+    the schema.
+
+    Arguments (required fixtures):
+        covariate_schema (db_covariate.make_schema.CovariateDB): the session
+            wide covariate database.
 
     Returns:
         db_covariate.make_schema.CovaraiteDB object.
     """
+    covariate_schema.reset()
+    return covariate_schema
+
+
+@pytest.fixture(scope='function')
+def covariate_session(covariate_schema):
+    """Hands each test function a session inside a transaction that is rolled
+    back when the test finishes.
+
+    Tests can insert and commit freely; their commits only release a
+    SAVEPOINT, so no rows are left behind for the next test and there is no
+    need to close the session by hand.
+
+    Arguments (required fixtures):
+        covariate_schema (db_covariate.make_schema.CovariateDB): the session
+            wide covariate database.
+
+    Yields:
+        sqlalchemy.orm.Session object.
+    """
+    with covariate_schema.transactional_session() as sesh:
+        yield sesh
+
+
+@pytest.fixture(scope='function')
+def layout_db(covariate_db, covariate_schema_name):
+    """Hands each test function a way to build the covariate database in
+    another table layout, next to covariate_db on the same server.
+
+    Each layout gets a schema named after this process's covariate schema,
+    such as covariate_gw1_partitioned, so xdist workers never share one, and
+    every schema built is dropped when the test finishes.
+
+    Arguments (required fixtures):
+        covariate_db (db_covariate.make_schema.CovariateDB): the covariate
+            database whose server and credentials to use.
+        covariate_schema_name (str): the covariate schema for this process.
+
+    Yields:
+        a function that takes a layout name and returns the built
+        db_covariate.make_schema.CovariateDB object.
+    """
+    built = []
+
+    def build(layout):
+        cov_db = CovariateDB(host=covariate_db.host,
+                             port=covariate_db.port,
+                             user=covariate_db.user,
+                             password=covariate_db.password,
+                             root_conn_str=covariate_db.root_conn_str,
+                             schema='{}_{}'.format(covariate_schema_name,
+                                                   layout),
+                             layout=layout)
+        built.append(cov_db)
+        cov_db.build_db()
+        return cov_db
+
+    yield build
+    for cov_db in built:
+        cov_db._execute_statements(
+            'teardown', ['DROP SCHEMA IF EXISTS {}'.format(cov_db.schema)])
+
+
+@pytest.fixture(scope='session')
+def etl_schema(request, tmp_path_factory, covariate_schema, server_instance):
+    """Builds the covariate schema the ETL in scripts/ runs against.
+
+    The ETL names the covariate schema in every query, so unlike the other
+    tests its tests can't have a schema per xdist worker. Outside xdist this
+    is covariate_schema itself. Under xdist it is built once per run, and
+    the workers take turns with it through etl_db.
+
+    Returns:
+        db_covariate.make_schema.CovariateDB object.
+    """
+    if covariate_schema.schema == 'covariate':
+        return covariate_schema
     cov_db = CovariateDB(host=socket.gethostname(),
                          port=server_instance.db_port,
                          user="root",
                          password=server_instance.db_root_pass,
                          root_conn_str=server_instance.root_conn_str)
-    cov_db.build_db()
+    _build_once(request, tmp_path_factory, 'covariate', cov_db.build_db)
     return cov_db
+
+
+@pytest.fixture(scope='function')
+def etl_db(request, tmp_path_factory, etl_schema):
+    """Hands each test function the covariate schema with model and
+    model_version empty and the ETL's own tables just created, as the ETL's
+    create stage leaves them.
+
+    Under xdist only one worker at a time has it, since every worker shares
+    the one covariate schema.
+
+    Arguments (required fixtures):
+        etl_schema (db_covariate.make_schema.CovariateDB): the covariate
+            schema.
+
+    Yields:
+        db_covariate.make_schema.CovariateDB object, which the db_tools
+        connection definition 'covariates' points at.
+    """
+    with _locked(_xdist_root(request.config, tmp_path_factory), 'etl'):
+        etl_schema.reset()
+        for script in TABLE_CREATE_SCRIPTS:
+            etl_schema.execute_sql_script(os.path.join(etl_dir, script))
+        etl_schema.add_conn_def('covariates')
+        yield etl_schema
+
+
+@pytest.fixture(scope='function')
+def etl_session(etl_db):
+    """Hands each test function a session on the ETL's server with covariate
+    as its default schema, like the sessions the ETL opens itself.
+
+    Yields:
+        sqlalchemy.orm.Session object.
+    """
+    engine = create_engine('{}/covariate'.format(etl_db.engine.url),
+                           pool_recycle=360)
+    sesh = Session(bind=engine)
+    yield sesh
+    sesh.close()
+    engine.dispose()
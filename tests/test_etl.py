@@ -0,0 +1,367 @@
+import argparse
+import os
+
+import pytest
+
+from db_covariate.sql_parser import parse_sql_script
+from etl import (CUTOVER_RENAMES, ETL, TABLE_COPY_SCRIPTS, calibrate_copy,
+                 close_fast_load_session, copy_model_chunks,
+                 cutover_blockers, fast_load_session, get_checkpoints,
+                 get_dead_letters, get_model_version_rows, get_year_rows,
+                 keyset_params, rename_tables, reset_model_version,
+                 rollback_renames, set_aside_loaded_orphans, sync_model,
+                 this_dir, verify_model_versions)
+from etl_chunks import ChunkSizer, plan_chunks
+from etl_pipeline import StageError
+
+
+class LostConnection(Exception):
+    """Stands in for the driver error of a connection dropped mid-query."""
+
+
+class DroppingSession(object):
+    """Stands in for a session whose connection drops during a RENAME TABLE,
+    so every statement after it fails too."""
+
+    def __init__(self):
+        self.gone = False
+
+    def execute(self, statement):
+        if self.gone:
+            raise LostConnection('not connected')
+        if statement.startswith('RENAME'):
+            self.gone = True
+            raise LostConnection('lost connection during the rename')
+        return self
+
+    def scalar(self):
+        return 50
+
+    def rollback(self):
+        self.execute('ROLLBACK')
+
+    def close(self):
+        pass
+
+
+def fill_model(sesh):
+    """Fill model_version and model_version_new with three model versions,
+    as copy_mv would leave them, and give each of them ten covariate.model
+    rows, two for each year from 2013 to 2017."""
+    for table in ('model_version', 'model_version_new'):
+        sesh.execute("""
+            INSERT INTO covariate.{table} (model_version_id, covariate_id,
+                gbd_round_id, description, code_version, status, is_best)
+            VALUES (1, 100, 5, 'pigs per capita', 'version 1', 1, 1),
+                   (2, 728, 4, 'gun violence', 'version 2', 1, 0),
+                   (3, 881, 5, 'sdi', 'version 3', 1, 1)
+        """.format(table=table))
+    sesh.execute("""
+        INSERT INTO covariate.model (model_version_id, year_id, location_id,
+            sex_id, age_group_id, mean_value, upper_value, lower_value)
+        SELECT mv.model_version_id, y.year_id, 1, s.sex_id, 22,
+               mv.model_version_id + y.year_id / 10000, NULL, 0.5
+        FROM covariate.model_version mv
+        CROSS JOIN (SELECT 2013 AS year_id UNION ALL SELECT 2014
+                    UNION ALL SELECT 2015 UNION ALL SELECT 2016
+                    UNION ALL SELECT 2017) y
+        CROSS JOIN (SELECT 1 AS sex_id UNION ALL SELECT 2) s
+    """)
+    sesh.commit()
+
+
+def copy_lines():
+    """The parsed model_copy.sql statements."""
+    return parse_sql_script(os.path.join(this_dir,
+                                         TABLE_COPY_SCRIPTS['model']))
+
+
+def plan(sesh, target_rows, done_ranges=None):
+    """Plan a copy of the three model versions fill_model() adds."""
+    return plan_chunks(get_model_version_rows(sesh, [1, 2, 3]), target_rows,
+                       lambda mvid: get_year_rows(sesh, mvid), done_ranges)
+
+
+def add_orphan(sesh):
+    """Give model version 2 an eleventh covariate.model row, for a location
+    that isn't in shared.location."""
+    sesh.execute('SET SESSION foreign_key_checks = 0')
+    sesh.execute("""
+        INSERT INTO covariate.model (model_version_id, year_id, location_id,
+            sex_id, age_group_id, mean_value, upper_value, lower_value)
+        VALUES (2, 2015, -1, 1, 22, 2.5, NULL, 0.5)
+    """)
+    sesh.execute('SET SESSION foreign_key_checks = 1')
+    sesh.commit()
+
+
+def model_new_rows(sesh):
+    """Return the number of model_new rows of each model version."""
+    rows = sesh.execute("""
+        SELECT model_version_id, COUNT(*)
+        FROM covariate.model_new
+        GROUP BY model_version_id
+    """).fetchall()
+    sesh.rollback()
+    return {int(mvid): int(count) for mvid, count in rows}
+
+
+def test_rollback_renames():
+    """Rolling back should undo each rename, last first, so the tables end
+    up where they started."""
+    renames = rollback_renames(CUTOVER_RENAMES)
+    assert renames == [('model_version', 'model_version_new'),
+                       ('model_version_old', 'model_version'),
+                       ('model', 'model_new'),
+                       ('model_old', 'model')]
+
+    tables = {'model', 'model_new', 'model_version', 'model_version_new'}
+    for old, new in CUTOVER_RENAMES + renames:
+        tables.remove(old)
+        tables.add(new)
+    assert tables == {'model', 'model_new', 'model_version',
+                      'model_version_new'}
+
+
+def test_failed_rename_keeps_its_error():
+    """If the connection drops during the rename, putting lock_wait_timeout
+    back fails too, and the rename's own error should be the one raised."""
+    with pytest.raises(LostConnection, match='during the rename'):
+        rename_tables(DroppingSession(), CUTOVER_RENAMES)
+
+
+def test_keyset_params():
+    assert keyset_params(7, (1990, 1, 2, 3), (2000, 4, 5, 6)) == {
+        'model_version_id': 7,
+        'after_year_id': 1990, 'after_location_id': 1, 'after_sex_id': 2,
+        'after_age_group_id': 3,
+        'through_year_id': 2000, 'through_location_id': 4,
+        'through_sex_id': 5, 'through_age_group_id': 6}
+
+
+def test_copy_resumes_from_checkpoints(etl_session):
+    """Each chunk copied should be checkpointed, so a plan made afterwards
+    only holds what is left: nothing of a version copied in full, and only
+    the remaining years of one copied in part."""
+    sesh = etl_session
+    fill_model(sesh)
+    # Four rows per transaction splits every version into two years a chunk.
+    chunks = plan(sesh, 4)
+    assert len(chunks) == 9
+
+    _, failed = copy_model_chunks(sesh, chunks[:4], copy_lines(),
+                                  ChunkSizer(4))
+    assert failed == []
+    done = get_checkpoints(sesh)
+    assert sorted(done[1]) == [(2013, 2014), (2015, 2016), (2017, 2017)]
+    assert done[2] == [(2013, 2014)]
+    assert 3 not in done
+    assert model_new_rows(sesh) == {1: 10, 2: 4}
+
+    chunks = plan(sesh, 4, done)
+    assert [(chunk.model_version_ids, chunk.year_start, chunk.year_end)
+            for chunk in chunks] == [((2,), 2015, 2016), ((2,), 2017, 2017),
+                                     ((3,), 2013, 2014), ((3,), 2015, 2016),
+                                     ((3,), 2017, 2017)]
+    completed, failed = copy_model_chunks(sesh, chunks, copy_lines(),
+                                          ChunkSizer(4))
+    assert completed == [2, 3] and failed == []
+    assert model_new_rows(sesh) == {1: 10, 2: 10, 3: 10}
+    assert plan(sesh, 4, get_checkpoints(sesh)) == []
+
+
+def test_failed_chunk_is_copied_again(etl_session):
+    """A chunk that fails should be rolled back and checkpointed as failed,
+    so the next plan holds it again while the chunks that worked stay
+    done."""
+    sesh = etl_session
+    fill_model(sesh)
+    # A row already in model_new makes version 2's copy fail on its key.
+    sesh.execute("""
+        INSERT INTO covariate.model_new (model_version_id, year_id,
+            location_id, sex_id, age_group_id, mean_value)
+        VALUES (2, 2013, 1, 1, 22, 0)
+    """)
+    sesh.commit()
+
+    completed, failed = copy_model_chunks(sesh, plan(sesh, 10), copy_lines(),
+                                          ChunkSizer(10))
+    assert completed == [1, 3] and failed == [2]
+    assert model_new_rows(sesh) == {1: 10, 2: 1, 3: 10}
+    status = sesh.execute("""
+        SELECT status
+        FROM covariate.etl_checkpoint
+        WHERE model_version_id = 2
+    """).scalar()
+    sesh.rollback()
+    assert status == 'failed'
+    assert [chunk.model_version_ids
+            for chunk in plan(sesh, 10, get_checkpoints(sesh))] == [(2,)]
+
+
+def test_verify_finds_and_resets_changed_versions(etl_session):
+    """verify_model_versions() should find a version with a changed value,
+    though its row count is the same, and one with a row missing, and
+    reset_model_version() should clear them for the next plan to copy
+    again."""
+    sesh = etl_session
+    fill_model(sesh)
+    copy_model_chunks(sesh, plan(sesh, 10), copy_lines(), ChunkSizer(10))
+    assert verify_model_versions('covariates', None, [1, 2, 3], 2) == []
+
+    sesh.execute("""
+        UPDATE covariate.model_new
+        SET upper_value = 1
+        WHERE model_version_id = 2 AND year_id = 2015 AND sex_id = 1
+    """)
+    sesh.execute("""
+        DELETE FROM covariate.model_new
+        WHERE model_version_id = 3 AND year_id = 2017 AND sex_id = 2
+    """)
+    sesh.commit()
+    mismatched = verify_model_versions('covariates', None, [1, 2, 3], 2)
+    assert mismatched == [2, 3]
+
+    # Three rows per batch takes several transactions per version.
+    for mvid in mismatched:
+        reset_model_version(sesh, mvid, 'differs from covariate.model', 3)
+    assert model_new_rows(sesh) == {1: 10}
+    assert [chunk.model_version_ids
+            for chunk in plan(sesh, 10, get_checkpoints(sesh))] == [(2,),
+                                                                    (3,)]
+
+
+def test_cutover_and_rollback(etl_session):
+    """The cutover should only be blocked once it has run, swap the _new
+    tables in without changing the session's lock_wait_timeout, and be
+    undone by the rollback renames."""
+    sesh = etl_session
+    fill_model(sesh)
+    copy_model_chunks(sesh, plan(sesh, 10), copy_lines(), ChunkSizer(10))
+    rollback = rollback_renames(CUTOVER_RENAMES)
+    assert cutover_blockers(sesh, CUTOVER_RENAMES) == []
+    assert cutover_blockers(sesh, rollback) == [
+        'covariate.model_version_new already exists',
+        'covariate.model_version_old does not exist',
+        'covariate.model_new already exists',
+        'covariate.model_old does not exist']
+
+    timeout = sesh.execute('SELECT @@SESSION.lock_wait_timeout').scalar()
+    rename_tables(sesh, CUTOVER_RENAMES)
+    try:
+        assert sesh.execute(
+            'SELECT @@SESSION.lock_wait_timeout').scalar() == timeout
+        sesh.rollback()
+        assert cutover_blockers(sesh, CUTOVER_RENAMES) == [
+            'covariate.model_old already exists',
+            'covariate.model_new does not exist',
+            'covariate.model_version_old already exists',
+            'covariate.model_version_new does not exist']
+        assert cutover_blockers(sesh, rollback) == []
+        count = sesh.execute('SELECT COUNT(*) FROM covariate.model').scalar()
+        sesh.rollback()
+        assert count == 30
+    finally:
+        rename_tables(sesh, rollback)
+    assert cutover_blockers(sesh, CUTOVER_RENAMES) == []
+
+
+def test_sync_keeps_rows_marked_deleted(etl_session):
+    """A row marked DELETE since the copy should be synced as it is, like
+    the full copy copies it, so verification still passes afterwards."""
+    sesh = etl_session
+    fill_model(sesh)
+    copy_model_chunks(sesh, plan(sesh, 10), copy_lines(), ChunkSizer(10))
+    watermark = sesh.execute('SELECT NOW()').scalar()
+    sesh.execute("""
+        UPDATE covariate.model
+        SET last_updated_action = 'DELETE',
+            last_updated = NOW() + INTERVAL 1 SECOND
+        WHERE model_version_id = 2 AND year_id = 2015 AND sex_id = 1
+    """)
+    sesh.execute("""
+        UPDATE covariate.model
+        SET mean_value = 7, last_updated_action = 'UPDATE',
+            last_updated = NOW() + INTERVAL 1 SECOND
+        WHERE model_version_id = 3 AND year_id = 2013
+    """)
+    sesh.commit()
+    assert verify_model_versions('covariates', None, [1, 2, 3], 1) == [2, 3]
+
+    completed, failed = sync_model(sesh, watermark, 10)
+    assert completed == [2, 3] and failed == []
+    assert verify_model_versions('covariates', None, [1, 2, 3], 1) == []
+    assert model_new_rows(sesh) == {1: 10, 2: 10, 3: 10}
+
+
+@pytest.mark.parametrize('keyset', [False, True])
+def test_orphans_are_set_aside(etl_session, keyset):
+    """A row with no parent in a shared table should be set aside in
+    etl_dead_letter, and the rest of its model version still be copied,
+    whether the version is copied by year or by keyset."""
+    sesh = etl_session
+    fill_model(sesh)
+    add_orphan(sesh)
+    chunks = plan_chunks(get_model_version_rows(sesh, [1, 2, 3]), 10,
+                         lambda mvid: get_year_rows(sesh, mvid),
+                         keyset=keyset)
+    completed, failed = copy_model_chunks(sesh, chunks, copy_lines(),
+                                          ChunkSizer(4))
+    assert sorted(completed) == [1, 2, 3]
+    assert failed == []
+    assert get_dead_letters(sesh) == {2: 1}
+    assert model_new_rows(sesh) == {1: 10, 2: 10, 3: 10}
+    error = sesh.execute("""
+        SELECT error
+        FROM covariate.etl_dead_letter
+        WHERE location_id = -1
+    """).scalar()
+    sesh.rollback()
+    assert error == 'no shared.location row for location_id -1'
+
+
+def test_cutover_waits_for_dead_letters(etl_session):
+    """The cutover should refuse to run while rows are set aside."""
+    sesh = etl_session
+    fill_model(sesh)
+    add_orphan(sesh)
+    copy_model_chunks(sesh, plan(sesh, 10), copy_lines(), ChunkSizer(10))
+    etl = ETL(argparse.Namespace(source=None), 'covariates', None)
+    with pytest.raises(StageError, match='etl_dead_letter'):
+        etl.cutover()
+    assert cutover_blockers(sesh, CUTOVER_RENAMES) == []
+
+
+def test_fast_load_orphans_are_moved_aside(etl_session):
+    """A row loaded with foreign key checks off that has no parent should
+    be moved from model_new into etl_dead_letter, leaving the rest of its
+    model version and the other versions to pass verification."""
+    sesh = etl_session
+    fill_model(sesh)
+    add_orphan(sesh)
+    fast = fast_load_session(sesh)
+    try:
+        _, failed = copy_model_chunks(fast, plan(sesh, 10), copy_lines(),
+                                      ChunkSizer(10))
+    finally:
+        close_fast_load_session(fast)
+    assert failed == []
+    assert model_new_rows(sesh) == {1: 10, 2: 11, 3: 10}
+
+    assert set_aside_loaded_orphans(sesh)
+    assert get_dead_letters(sesh) == {2: 1}
+    assert model_new_rows(sesh) == {1: 10, 2: 10, 3: 10}
+    assert verify_model_versions('covariates', None, [1, 3], 1) == []
+    assert not set_aside_loaded_orphans(sesh)
+
+
+def test_calibrate_copy_leaves_nothing_behind(etl_session):
+    """Calibrating should measure a copy rate from a version's rows without
+    writing to model_new or leaving its temporary table behind, so it can
+    run again straight away."""
+    sesh = etl_session
+    fill_model(sesh)
+    assert calibrate_copy(sesh, None, 2, 5) > 0
+    assert calibrate_copy(sesh, None, 2, 5) > 0
+    assert calibrate_copy(sesh, None, 4, 5) is None
+    assert model_new_rows(sesh) == {}
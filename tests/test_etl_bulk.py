@@ -0,0 +1,29 @@
+import datetime
+
+from etl_bulk import _field, bulk_session
+
+
+def test_spool_fields():
+    """Values should be written in LOAD DATA's default format: \\N for NULL,
+    backslash escapes, full precision doubles, and MySQL datetimes."""
+    assert _field(None) == '\\N'
+    assert _field(5) == '5'
+    assert _field(0.1 + 0.2) == '0.30000000000000004'
+    assert _field(datetime.datetime(2019, 1, 2, 3, 4, 5)) == \
+        '2019-01-02 03:04:05'
+    assert _field('a\tb\nc\\d') == 'a\\tb\\nc\\\\d'
+    assert _field('NULL') == 'NULL'
+
+
+def test_bulk_sessions_share_an_engine(etl_session):
+    """Bulk sessions on the same server should draw on one engine rather
+    than each opening a connection pool that is never disposed."""
+    first = bulk_session(etl_session)
+    second = bulk_session(etl_session)
+    try:
+        assert first.get_bind() is second.get_bind()
+        assert first.get_bind() is not etl_session.get_bind()
+        assert second.execute('SELECT 1').scalar() == 1
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,172 @@
+import pytest
+
+from etl_chunks import (INT_MAX, INT_MIN, YEAR_MAX, YEAR_MIN, Chunk,
+                        ChunkSizer, KeysetChunk, Progress, format_duration,
+                        last_chunks, lpt_makespan, lpt_order, plan_chunks,
+                        split_version)
+
+
+# Row counts per year for the one large model version in these tests.
+YEAR_ROWS = {7: [(1990, 40), (1995, 40), (2000, 40), (2005, 40), (2010, 40)]}
+
+
+def year_rows(mvid):
+    return YEAR_ROWS[mvid]
+
+
+def test_chunk_params():
+    """A whole version chunk should cover every possible year; a year range
+    chunk only its own years."""
+    whole = Chunk((1, 2), None, None, 10)
+    assert whole.is_whole
+    assert whole.params == {'model_version_ids': (1, 2),
+                            'year_start': YEAR_MIN, 'year_end': YEAR_MAX}
+
+    years = Chunk((7,), 1990, 1995, 80)
+    assert not years.is_whole
+    assert years.params == {'model_version_ids': (7,),
+                            'year_start': 1990, 'year_end': 1995}
+
+
+def test_chunk_key_range():
+    """A chunk's primary key range should run from before the first key of
+    its first year through the last key of its last year."""
+    whole = Chunk((1, 2), None, None, 10)
+    assert whole.key_range == ((YEAR_MIN, INT_MIN, INT_MIN, INT_MIN),
+                               (YEAR_MAX, INT_MAX, INT_MAX, INT_MAX))
+    years = Chunk((7,), 1990, 1995, 80)
+    assert years.key_range == ((1990, INT_MIN, INT_MIN, INT_MIN),
+                               (1995, INT_MAX, INT_MAX, INT_MAX))
+
+
+def test_small_versions_are_batched():
+    """Small versions should share a chunk until the next would take it past
+    the target, and empty versions still appear in the plan."""
+    chunks = plan_chunks([(1, 10), (2, 10), (3, 0), (4, 10)], 25, year_rows)
+    assert chunks == [Chunk((1, 2, 3), None, None, 20),
+                      Chunk((4,), None, None, 10)]
+
+
+def test_large_version_is_split_by_year():
+    """A version over the target should be split into contiguous years,
+    between the batches either side of it."""
+    chunks = plan_chunks([(1, 10), (7, 200), (2, 10)], 100, year_rows)
+    assert chunks == [Chunk((1,), None, None, 10),
+                      Chunk((7,), 1990, 1995, 80),
+                      Chunk((7,), 2000, 2005, 80),
+                      Chunk((7,), 2010, 2010, 40),
+                      Chunk((2,), None, None, 10)]
+
+
+def test_oversized_year_gets_its_own_chunk():
+    """Years are never split, so a year over the target is a chunk alone."""
+    chunks = split_version(7, [(1990, 10), (1995, 500), (2000, 10)], 100)
+    assert chunks == [Chunk((7,), 1990, 1990, 10),
+                      Chunk((7,), 1995, 1995, 500),
+                      Chunk((7,), 2000, 2000, 10)]
+
+
+def test_resume_skips_done_versions_and_years():
+    """When resuming, whole versions already copied should be left out, and
+    a version copied in part should only plan the years between its done
+    ranges, without any chunk spanning a done year."""
+    done = {1: [(YEAR_MIN, YEAR_MAX)], 7: [(1995, 2000)]}
+    chunks = plan_chunks([(1, 10), (7, 200)], 1000, year_rows, done)
+    assert chunks == [Chunk((7,), 1990, 1990, 40),
+                      Chunk((7,), 2005, 2010, 80)]
+
+
+def test_keyset_planning():
+    """With keyset, versions over the target become a KeysetChunk, as does
+    any version with a saved keyset position."""
+    chunks = plan_chunks([(1, 10), (7, 200)], 100, year_rows, keyset=True)
+    assert chunks == [Chunk((1,), None, None, 10),
+                      KeysetChunk((7,), None, None, 200)]
+    assert isinstance(chunks[1], KeysetChunk)
+
+    chunks = plan_chunks([(1, 10)], 100, year_rows,
+                         keyset_positions={1: (1990, 1, 1, 1)})
+    assert isinstance(chunks[0], KeysetChunk)
+
+
+def test_keyset_resume_of_version_copied_by_year():
+    """A version partly copied by year ranges should be finished by year
+    ranges even with keyset set, rather than copied again from its first
+    row."""
+    done = {7: [(1990, 1995)]}
+    chunks = plan_chunks([(7, 200)], 100, year_rows, done, keyset=True)
+    assert not any(isinstance(chunk, KeysetChunk) for chunk in chunks)
+    assert chunks == [Chunk((7,), 2000, 2005, 80),
+                      Chunk((7,), 2010, 2010, 40)]
+
+
+def test_last_chunks():
+    chunks = [Chunk((1, 2), None, None, 20), Chunk((7,), 1990, 1995, 80),
+              Chunk((7,), 2000, 2010, 120)]
+    assert last_chunks(chunks) == {1: 0, 2: 0, 7: 2}
+
+
+def test_lpt_order_and_makespan():
+    """Chunks should be ordered largest first, and the makespan should be
+    the busiest worker's load under that order."""
+    chunks = [Chunk((1,), None, None, 10), Chunk((2,), None, None, 30),
+              Chunk((3,), None, None, 20)]
+    assert [chunk.rows for chunk in lpt_order(chunks)] == [30, 20, 10]
+    assert lpt_makespan([30, 20, 10], 2) == 30
+    assert lpt_makespan([30, 20, 10], 1) == 60
+    assert lpt_makespan([], 0) == 0
+
+
+def test_chunk_sizer_follows_rate():
+    """The size should aim for target_seconds at the rate measured, growing
+    at most twofold per slice and halving on a sharp slowdown."""
+    sizer = ChunkSizer(1000, target_seconds=10, min_rows=100)
+    # 1000 rows/s would fill 10s with 10000 rows, but growth is capped.
+    sizer.observe(1000, 1)
+    assert sizer.rows == 2000
+    sizer.observe(2000, 2)
+    assert sizer.rows == 4000
+    # 400 rows/s is under half the average, so the size is halved.
+    sizer.observe(4000, 10)
+    assert sizer.rows == 2000
+
+
+def test_chunk_sizer_back_off():
+    """back_off() should halve the size down to min_rows and then refuse."""
+    sizer = ChunkSizer(400, min_rows=100)
+    assert sizer.back_off() and sizer.rows == 200
+    assert sizer.back_off() and sizer.rows == 100
+    assert not sizer.back_off()
+    assert sizer.rows == 100
+
+
+def test_chunk_sizer_without_target():
+    """Without target_seconds only the rate is tracked."""
+    sizer = ChunkSizer(1000)
+    sizer.observe(1000, 1)
+    assert sizer.rows == 1000
+    assert sizer.rate == pytest.approx(1000)
+
+
+def test_progress_counts_only_copied_rows():
+    """Skipped and failed chunks should leave the remaining work without
+    counting toward the copy rate."""
+    now = [0.0]
+    chunks = [Chunk((1,), None, None, 100), Chunk((2,), None, None, 100),
+              Chunk((3,), None, None, 200)]
+    progress = Progress(chunks, 1, clock=lambda: now[0])
+    assert progress.remaining_seconds() is None
+
+    now[0] = 10.0
+    progress.chunk_done(0)
+    progress.chunk_done(1, copied=False)
+    assert progress.rows_done == 100
+    assert progress.rows_per_second() == pytest.approx(10)
+    assert progress.remaining_seconds() == pytest.approx(20)
+    assert str(progress) == '100/400 rows copied, 20s remaining'
+
+
+def test_format_duration():
+    assert format_duration(9) == '9s'
+    assert format_duration(125) == '2m 05s'
+    assert format_duration(7509) == '2h 05m 09s'
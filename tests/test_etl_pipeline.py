@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from etl_pipeline import Stage, StageError, downstream, run_stages
+
+
+def etl_stages(ran, fail=(), barrier=None):
+    """A small version of the ETL's stage graph. Each stage appends its name
+    to ran, and the stages named in fail raise StageError."""
+    def stage(name):
+        def run():
+            if barrier is not None and name in ('verify', 'analyze'):
+                barrier.wait(timeout=5)
+            ran.append(name)
+            if name in fail:
+                raise StageError('{} broke'.format(name))
+        return run
+
+    graph = [('create', []), ('copy_mv', ['create']),
+             ('copy_model', ['copy_mv']), ('verify', ['copy_model', 'sync']),
+             ('analyze', ['copy_model', 'sync']),
+             ('cutover', ['verify', 'analyze'])]
+    return [Stage(name, requires, stage(name)) for name, requires in graph]
+
+
+def test_stages_run_in_dependency_order():
+    """Every stage should run after what it requires; requirements on a
+    stage left out of the run, like sync here, are ignored."""
+    ran = []
+    records = []
+    stages = etl_stages(ran)
+    succeeded, failed, blocked = run_stages(
+        stages, [], lambda *record: records.append(record))
+
+    assert succeeded == [stage.name for stage in stages]
+    assert failed == [] and blocked == []
+    for stage in stages:
+        for required in stage.requires:
+            if required in ran:
+                assert ran.index(required) < ran.index(stage.name)
+    assert ('create', 'running', None) in records
+    assert ('cutover', 'complete', None) in records
+
+
+def test_independent_stages_run_concurrently():
+    """verify and analyze only need copy_model, so they should run at the
+    same time; each waits on a barrier the other has to reach."""
+    ran = []
+    barrier = threading.Barrier(2)
+    succeeded, failed, _ = run_stages(etl_stages(ran, barrier=barrier), [],
+                                      lambda *record: None)
+    assert failed == []
+    assert 'cutover' in succeeded
+
+
+def test_failed_stage_blocks_the_stages_after_it():
+    """A failed stage should be recorded with its error, and the stages that
+    need it should never run, while unrelated stages still do."""
+    ran = []
+    records = []
+    succeeded, failed, blocked = run_stages(
+        etl_stages(ran, fail=['verify']), [],
+        lambda *record: records.append(record))
+
+    assert failed == ['verify']
+    assert blocked == ['cutover']
+    assert 'analyze' in succeeded
+    assert 'cutover' not in ran
+    _, status, error = [record for record in records
+                        if record[0] == 'verify'][-1]
+    assert status == 'failed'
+    assert isinstance(error, StageError)
+
+
+def test_done_stages_are_skipped():
+    """A rerun should start from the first stage not already complete."""
+    ran = []
+    succeeded, _, _ = run_stages(etl_stages(ran),
+                                 ['create', 'copy_mv', 'copy_model'],
+                                 lambda *record: None)
+    assert sorted(ran) == ['analyze', 'cutover', 'verify']
+    assert succeeded[:3] == ['create', 'copy_mv', 'copy_model']
+
+
+def test_unexpected_errors_fail_the_stage():
+    """Any exception, not just StageError, should fail its stage."""
+    def broken():
+        raise ValueError('boom')
+
+    records = []
+    _, failed, _ = run_stages([Stage('create', [], broken)], [],
+                              lambda *record: records.append(record))
+    assert failed == ['create']
+    with pytest.raises(ValueError):
+        raise records[-1][2]
+
+
+def test_downstream():
+    """downstream() should find every stage that needs the given ones,
+    directly or not."""
+    stages = etl_stages([])
+    assert downstream(stages, ['copy_model']) == [
+        'copy_model', 'verify', 'analyze', 'cutover']
+    assert downstream(stages, ['analyze']) == ['analyze', 'cutover']
+    assert downstream(stages, []) == []
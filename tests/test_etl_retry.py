@@ -0,0 +1,43 @@
+from etl_retry import (backoff_delays, is_data_error, is_transient,
+                       server_error_code)
+
+
+class DriverError(Exception):
+    """Stands in for a MySQL driver exception: the error number first."""
+
+
+class WrappedError(Exception):
+    """Stands in for a SQLAlchemy exception wrapping a driver one."""
+
+    def __init__(self, orig):
+        super(WrappedError, self).__init__(str(orig))
+        self.orig = orig
+
+
+def test_server_error_code():
+    """The error number should be found on the driver exception, whether
+    wrapped or not."""
+    assert server_error_code(DriverError(1213, 'Deadlock found')) == 1213
+    assert server_error_code(WrappedError(DriverError(1205, 'timeout'))) == \
+        1205
+    assert server_error_code(ValueError('no code')) is None
+    assert server_error_code(Exception()) is None
+
+
+def test_error_classes():
+    """Deadlocks and lost connections are worth retrying; bad rows are not,
+    and a duplicate key is neither, since it means a planning bug."""
+    assert is_transient(WrappedError(DriverError(1213, '')))
+    assert is_transient(WrappedError(DriverError(2013, '')))
+    assert not is_transient(WrappedError(DriverError(1452, '')))
+    assert is_data_error(WrappedError(DriverError(1452, '')))
+    assert not is_data_error(WrappedError(DriverError(1062, '')))
+    assert not is_transient(WrappedError(DriverError(1062, '')))
+
+
+def test_backoff_delays():
+    """Delays should double from base up to cap, scaled by rand()."""
+    assert list(backoff_delays(5, base=1, cap=5, rand=lambda: 1.0)) == [
+        1, 2, 4, 5, 5]
+    assert list(backoff_delays(3, rand=lambda: 0.5)) == [0.5, 1.0, 2.0]
+    assert list(backoff_delays(0)) == []
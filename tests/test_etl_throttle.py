@@ -0,0 +1,84 @@
+import pytest
+
+from etl_pipeline import StageError
+from etl_throttle import Throttle
+
+
+class BusyServer(Throttle):
+    """A Throttle whose server is over its limits for the first few checks,
+    and which records its sleeps instead of sleeping."""
+
+    def __init__(self, busy_checks, **kwargs):
+        self.slept = []
+        super(BusyServer, self).__init__(sleep=self.slept.append, **kwargs)
+        self.busy_checks = busy_checks
+
+    def check(self, sesh, source=None):
+        if self.busy_checks:
+            self.busy_checks -= 1
+            return ['too busy']
+        return []
+
+
+class SampledServers(Throttle):
+    """A Throttle that records which servers it samples, each of which is
+    over its limits for the given number of samples."""
+
+    def __init__(self, busy_samples, **kwargs):
+        self.slept = []
+        self.sampled = []
+        super(SampledServers, self).__init__(sleep=self.slept.append,
+                                             **kwargs)
+        self.busy_samples = dict(busy_samples)
+
+    def load(self, sesh):
+        self.sampled.append(sesh)
+        if self.busy_samples.get(sesh):
+            self.busy_samples[sesh] -= 1
+            return ['too busy']
+        return []
+
+
+def test_wait_returns_immediately_when_idle():
+    throttle = BusyServer(0, pause=10)
+    assert throttle.wait(None) == 0
+    assert throttle.slept == []
+
+
+def test_wait_backs_off_exponentially():
+    """Pauses should double up to max_pause while the server stays busy."""
+    throttle = BusyServer(4, pause=10, max_pause=30)
+    assert throttle.wait(None) == 90
+    assert throttle.slept == [10, 20, 30, 30]
+
+
+def test_wait_gives_up_after_max_wait():
+    """A server that stays over its limits should fail the stage once the
+    pauses add up to max_wait, rather than hold the ETL up forever."""
+    throttle = BusyServer(100, pause=10, max_pause=40, max_wait=100)
+    with pytest.raises(StageError):
+        throttle.wait(None)
+    assert throttle.slept == [10, 20, 40, 30]
+
+
+def test_throttle_pickles_without_sessions():
+    """Copy workers get the throttle pickled, without any open sessions."""
+    throttle = Throttle(max_replica_lag=30, replicas=['replica'])
+    throttle._replica_sessions = [object()]
+    assert throttle.__getstate__()['_replica_sessions'] is None
+
+
+def test_wait_samples_the_source_server():
+    """Copying from another server, a busy source should hold the copy
+    back just as a busy target does."""
+    throttle = SampledServers({'source': 1}, pause=10)
+    assert throttle.check('target', 'source') == ['source server: too busy']
+
+    throttle = SampledServers({'source': 1}, pause=10)
+    assert throttle.wait('target', 'source') == 10
+    assert throttle.sampled == ['target', 'source', 'target', 'source']
+    assert throttle.slept == [10]
+
+    throttle = SampledServers({}, pause=10)
+    assert throttle.wait('target') == 0
+    assert throttle.sampled == ['target']
@@ -0,0 +1,178 @@
+import pytest
+
+from db_covariate.make_schema import SQLScriptError, _use_schema
+
+
+def show_create_table(covariate_db, table):
+    """Return the SHOW CREATE TABLE statement for a covariate table."""
+    connection = covariate_db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SHOW CREATE TABLE {schema}.{table}'.format(
+            schema=covariate_db.schema, table=table))
+        ddl = cursor.fetchone()[1]
+        cursor.close()
+    finally:
+        connection.close()
+    return ddl
+
+
+def test_restore_matches_build(covariate_db):
+    """Restoring from a snapshot should recreate the exact DDL of a full build,
+    including foreign keys, indexes, and the AUTO_INCREMENT start."""
+    covariate_db.build_db()
+    built = [show_create_table(covariate_db, table)
+             for table in covariate_db.table_names]
+
+    covariate_db.snapshot()
+    covariate_db.restore()
+    restored = [show_create_table(covariate_db, table)
+                for table in covariate_db.table_names]
+
+    assert built == restored
+    assert 'AUTO_INCREMENT=24338' in restored[0]
+
+
+def test_reset_empties_tables(covariate_db):
+    """Resetting should remove every row and restart model_version_id at the
+    AUTO_INCREMENT value declared in model_version.sql."""
+    connection = covariate_db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('USE {}'.format(covariate_db.schema))
+        cursor.execute("""
+            INSERT INTO model_version (covariate_id, description,
+                code_version, status, is_best, gbd_round_id)
+            VALUES ('1', 'reset me', 'version 1', '1', '0', '5');
+        """)
+        cursor.execute("""
+            INSERT INTO model (model_version_id, year_id,
+                location_id, sex_id, age_group_id, mean_value)
+            VALUES (LAST_INSERT_ID(), '2017', '1', '2', '22', '10.4');
+        """)
+        connection.commit()
+
+        covariate_db.reset()
+
+        for table in covariate_db.table_names:
+            cursor.execute('SELECT COUNT(*) FROM {}'.format(table))
+            assert cursor.fetchone()[0] == 0
+
+        cursor.execute("""
+            INSERT INTO model_version (covariate_id, description,
+                code_version, status, is_best, gbd_round_id)
+            VALUES ('1', 'after reset', 'version 1', '1', '0', '5');
+        """)
+        cursor.execute('SELECT LAST_INSERT_ID()')
+        assert cursor.fetchone()[0] == 24338
+        connection.rollback()
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def test_failed_reset_restores_foreign_key_checks(covariate_db,
+                                                  monkeypatch):
+    """A reset that fails partway should not hand its connection back to the
+    pool with foreign key checks still off."""
+    # Start from an empty pool, so the reset's connection is the only one.
+    covariate_db.engine.dispose()
+    monkeypatch.setattr(covariate_db, 'build_levels',
+                        lambda: [['model_version', 'no_such_table']])
+    with pytest.raises(SQLScriptError):
+        covariate_db.reset()
+
+    connection = covariate_db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT @@SESSION.foreign_key_checks')
+        assert cursor.fetchone()[0] == 1
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def test_schema_name_rewrite():
+    """Only statements naming the covariate schema itself should be pointed
+    at a different schema; references to shared.covariate are left alone."""
+    assert _use_schema('USE covariate', 'covariate_gw1') == 'USE covariate_gw1'
+    assert (_use_schema('DROP SCHEMA IF EXISTS covariate', 'covariate_gw1') ==
+            'DROP SCHEMA IF EXISTS covariate_gw1')
+    assert (_use_schema('CREATE SCHEMA covariate', 'covariate_gw1') ==
+            'CREATE SCHEMA covariate_gw1')
+    fk = ('ALTER TABLE model_version ADD CONSTRAINT fk FOREIGN KEY '
+          '(covariate_id) REFERENCES shared.covariate (covariate_id)')
+    assert _use_schema(fk, 'covariate_gw1') == fk
+
+
+def test_build_levels(covariate_db):
+    """model has a foreign key into model_version, so model_version must be
+    built in an earlier level."""
+    assert covariate_db.table_dependencies() == {'model_version': set(),
+                                                 'model': {'model_version'}}
+    assert covariate_db.build_levels() == [['model_version'], ['model']]
+
+
+def test_deferred_constraints(covariate_db):
+    """Building with defer_constraints should leave only the primary keys in
+    place until finalize() adds the foreign keys and indexes back."""
+    handle = covariate_db.build_db(defer_constraints=True)
+    try:
+        ddl = show_create_table(covariate_db, 'model')
+        assert 'PRIMARY KEY' in ddl
+        assert 'FOREIGN KEY' not in ddl
+        assert 'fk_model_location_id' not in ddl
+
+        handle.finalize()
+        ddl = show_create_table(covariate_db, 'model')
+        assert 'FOREIGN KEY' in ddl
+        assert 'fk_model_location_id' in ddl
+    finally:
+        covariate_db.build_db()
+
+
+def test_partitioned_model(layout_db):
+    """The partitioned layout should build without foreign keys on model, and
+    orphaned_keys() should catch the rows those foreign keys would have
+    rejected."""
+    partitioned = layout_db('partitioned')
+
+    ddl = show_create_table(partitioned, 'model')
+    assert 'PARTITION BY RANGE' in ddl
+    assert 'FOREIGN KEY' not in ddl
+    names = [name for name, _, _ in partitioned.model_partitions()]
+    assert names[-1] == 'pmax'
+    # New model versions get a block of their own, not the catch-all.
+    assert 'p25000' in names and 'p40000' in names
+
+    connection = partitioned.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            INSERT INTO {schema}.model (model_version_id,
+                year_id, location_id, sex_id, age_group_id, mean_value)
+            VALUES ('5', '2017', '-1', '2', '22', '10.4');
+        """.format(schema=partitioned.schema))
+        connection.commit()
+        cursor.close()
+    finally:
+        connection.close()
+
+    orphans = partitioned.orphaned_keys()
+    assert orphans['fk_model_model_version_id'] == 1
+    assert orphans['fk_model_location_id'] == 1
+    assert orphans['fk_model_sex_id'] == 0
+
+    partitioned.truncate_model_partition('p1000')
+    assert partitioned.orphaned_keys()['fk_model_location_id'] == 0
+
+
+def test_compact_model(layout_db):
+    """The compact layout should narrow the key columns, keep the foreign key
+    to model_version, and drop the per-row audit strings."""
+    compact = layout_db('compact')
+
+    ddl = show_create_table(compact, 'model')
+    assert '`year_id` smallint(6)' in ddl
+    assert 'REFERENCES `model_version`' in ddl
+    assert 'inserted_by' not in ddl
@@ -1,18 +1,15 @@
 import pytest
 from sqlalchemy.exc import IntegrityError
 
-from db_tools.ezfuncs import get_session
 from db_tools.query_tools import exec_query, query_2_df
 
 
-def initialize_and_fill_covariate_db(covariate_db, cov_conn_def):
-    """Builds the covariate db and fills the covariate.model_version table with
-    a few rows needed for testing the covariate.model table."""
-    covariate_db.add_conn_def(cov_conn_def)
-    sesh = get_session(cov_conn_def)
+def initialize_and_fill_covariate_db(sesh):
+    """Fills the covariate.model_version table with a few rows needed for
+    testing the covariate.model table."""
 
     insert_q = """
-        INSERT INTO covariate.model_version (model_version_id, covariate_id, 
+        INSERT INTO model_version (model_version_id, covariate_id, 
             gbd_round_id, description, code_version, status, is_best)
         VALUES ('1', '100', '5', 'pigs per capita', 'version 1', '1', '1'),
                ('2', '728', '4', 'gun violence', 'version 2', '1', '0'),
@@ -20,17 +17,15 @@ def initialize_and_fill_covariate_db(covariate_db, cov_conn_def):
     """
     exec_query(insert_q, session=sesh)
     sesh.commit()
-    # We must close the current session or the next one will hang
-    sesh.close()
 
 
-def test_insert_new_row(covariate_db, cov_conn_def):
+def test_insert_new_row(covariate_session):
     """Tests the addition of a single row to the covariate.model table."""
-    initialize_and_fill_covariate_db(covariate_db, cov_conn_def)
-    sesh = get_session(cov_conn_def)
+    sesh = covariate_session
+    initialize_and_fill_covariate_db(sesh)
 
     insert_q = """
-        INSERT INTO covariate.model (model_version_id, year_id, location_id, 
+        INSERT INTO model (model_version_id, year_id, location_id, 
             sex_id, age_group_id, mean_value, upper_value, lower_value)
         VALUES ('1', '2017', '1', '2', '22', '10.4', '11.2', '9.6'),
                ('1', '2016', '1', '2', '22', '10.5', '11.4', '9.4'),
@@ -42,25 +37,23 @@ def test_insert_new_row(covariate_db, cov_conn_def):
     sesh.commit()
 
     select_q = """
-        SELECT * FROM covariate.model WHERE model_version_id = 1;
+        SELECT * FROM model WHERE model_version_id = 1;
     """
     res = query_2_df(select_q, session=sesh)
 
     assert not res.empty
     # We added five entries associated with model_version_id 1
     assert len(res) == 5
-    # We have to close the session or the next test will hang
-    sesh.close()
 
 
-def test_pk_integrity_error(covariate_db, cov_conn_def):
+def test_pk_integrity_error(covariate_session):
     """Test the IntegrityError of our PK by trying to add two rows with the
     same model_version_id, location_id, year_id, sex_id, and age_group_id."""
-    initialize_and_fill_covariate_db(covariate_db, cov_conn_def)
-    sesh = get_session(cov_conn_def)
+    sesh = covariate_session
+    initialize_and_fill_covariate_db(sesh)
 
     insert_q = """
-        INSERT INTO covariate.model (model_version_id, year_id, location_id, 
+        INSERT INTO model (model_version_id, year_id, location_id, 
             sex_id, age_group_id, mean_value, upper_value, lower_value)
         VALUES ('2', '2016', '1', '2', '22', '324', '515', '214');
     """
@@ -69,105 +62,93 @@ def test_pk_integrity_error(covariate_db, cov_conn_def):
 
     with pytest.raises(IntegrityError):
         exec_query(insert_q, session=sesh)
-    # We have to close the session or the next test will hang
-    sesh.close()
 
 
-def test_fk_location_id_error(covariate_db, cov_conn_def):
+def test_fk_location_id_error(covariate_session):
     """Test the foreign key constraint to shared.location by providing an
     invalid location_id to an insert statement."""
-    initialize_and_fill_covariate_db(covariate_db, cov_conn_def)
-    sesh = get_session(cov_conn_def)
+    sesh = covariate_session
+    initialize_and_fill_covariate_db(sesh)
 
     invalid_location_id = -1
 
     insert_q = """
-        INSERT INTO covariate.model (model_version_id, year_id, location_id, 
+        INSERT INTO model (model_version_id, year_id, location_id, 
             sex_id, age_group_id, mean_value, upper_value, lower_value)
         VALUES ('2', '2016', '{loc_id}', '2', '22', '324', '515', '214');
     """.format(loc_id=invalid_location_id)
 
     with pytest.raises(IntegrityError):
         exec_query(insert_q, session=sesh)
-    # We have to close the session or the next test will hang
-    sesh.close()
 
 
-def test_fk_year_id_error(covariate_db, cov_conn_def):
+def test_fk_year_id_error(covariate_session):
     """Test the foreign key constraint to shared.year by providing an invalid
     year_id to an insert statement."""
-    initialize_and_fill_covariate_db(covariate_db, cov_conn_def)
-    sesh = get_session(cov_conn_def)
+    sesh = covariate_session
+    initialize_and_fill_covariate_db(sesh)
 
     invalid_year_id = -1988
 
     insert_q = """
-        INSERT INTO covariate.model (model_version_id, year_id, location_id, 
+        INSERT INTO model (model_version_id, year_id, location_id, 
             sex_id, age_group_id, mean_value, upper_value, lower_value)
         VALUES ('2', '{year_id}', '1', '2', '22', '324', '515', '214');
     """.format(year_id=invalid_year_id)
 
     with pytest.raises(IntegrityError):
         exec_query(insert_q, session=sesh)
-    # We have to close the session or the next test will hang
-    sesh.close()
 
 
-def test_fk_age_group_id_error(covariate_db, cov_conn_def):
+def test_fk_age_group_id_error(covariate_session):
     """Test the foreign key constraint to shared.age_group by providing an
     invalid age_group_id to an insert statement."""
-    initialize_and_fill_covariate_db(covariate_db, cov_conn_def)
-    sesh = get_session(cov_conn_def)
+    sesh = covariate_session
+    initialize_and_fill_covariate_db(sesh)
 
     invalid_age_group_id = -5
 
     insert_q = """
-        INSERT INTO covariate.model (model_version_id, year_id, location_id, 
+        INSERT INTO model (model_version_id, year_id, location_id, 
             sex_id, age_group_id, mean_value, upper_value, lower_value)
         VALUES ('2', '2016', '1', '2', '{age_group_id}', '324', '515', '214');
     """.format(age_group_id=invalid_age_group_id)
 
     with pytest.raises(IntegrityError):
         exec_query(insert_q, session=sesh)
-    # We have to close the session or the next test will hang
-    sesh.close()
 
 
-def test_fk_sex_id_error(covariate_db, cov_conn_def):
+def test_fk_sex_id_error(covariate_session):
     """Test the foreign key constraint to shared.sex by providing an invalid
     sex_id to an insert statement."""
-    initialize_and_fill_covariate_db(covariate_db, cov_conn_def)
-    sesh = get_session(cov_conn_def)
+    sesh = covariate_session
+    initialize_and_fill_covariate_db(sesh)
 
     invalid_sex_id = -8
 
     insert_q = """
-        INSERT INTO covariate.model (model_version_id, year_id, location_id, 
+        INSERT INTO model (model_version_id, year_id, location_id, 
             sex_id, age_group_id, mean_value, upper_value, lower_value)
         VALUES ('2', '2016', '1', '{sex_id}', '22', '324', '515', '214');
     """.format(sex_id=invalid_sex_id)
 
     with pytest.raises(IntegrityError):
         exec_query(insert_q, session=sesh)
-    # We have to close the session or the next test will hang
-    sesh.close()
 
 
-def test_fk_model_version_error(covariate_db, cov_conn_def):
+def test_fk_model_version_error(covariate_session):
     """Test the foreign key constraint to covariate.model_version by providing
     an invalid model_version_id to an insert statement."""
-    initialize_and_fill_covariate_db(covariate_db, cov_conn_def)
-    sesh = get_session(cov_conn_def)
+    sesh = covariate_session
+    initialize_and_fill_covariate_db(sesh)
 
     invalid_model_version_id = 5
 
     insert_q = """
-        INSERT INTO covariate.model (model_version_id, year_id, location_id, 
+        INSERT INTO model (model_version_id, year_id, location_id, 
             sex_id, age_group_id, mean_value, upper_value, lower_value)
         VALUES ('{mvid}', '2016', '1', '2', '22', '324', '515', '214');
     """.format(mvid=invalid_model_version_id)
 
     with pytest.raises(IntegrityError):
         exec_query(insert_q, session=sesh)
-    # We have to close the session or the next test will hang
-    sesh.close()
@@ -0,0 +1,70 @@
+import io
+
+from db_covariate.sql_parser import iter_statements, parse_sql_script
+
+
+def statements(sql):
+    return list(iter_statements(io.StringIO(sql)))
+
+
+def test_comments_are_stripped():
+    """'-- ', '#', and block comments should be dropped, including the '--'
+    markers our ETL scripts put after each semicolon."""
+    sql = """
+        -- a header comment
+        DROP TABLE IF EXISTS model_new;--
+        CREATE TABLE t (a int) /* inline
+        block */ ENGINE=InnoDB; # trailing
+    """
+    assert statements(sql) == ['DROP TABLE IF EXISTS model_new',
+                               'CREATE TABLE t (a int)  ENGINE=InnoDB']
+
+
+def test_block_comment_separates_tokens():
+    """A block comment with no whitespace around it should still leave the
+    tokens on either side apart."""
+    assert statements('SELECT 1/*c*/FROM t;') == ['SELECT 1 FROM t']
+    assert statements('SELECT a, /* c */ b FROM t;') == [
+        'SELECT a,  b FROM t']
+
+
+def test_delimiters_and_comments_inside_strings():
+    """Semicolons and comment markers inside quoted strings or identifiers
+    must not split a statement."""
+    sql = ("INSERT INTO t VALUES ('a;b', \"c -- d\", 'it''s', 'x\\';y');\n"
+           "SELECT `odd;name` FROM t;")
+    assert statements(sql) == [
+        "INSERT INTO t VALUES ('a;b', \"c -- d\", 'it''s', 'x\\';y')",
+        "SELECT `odd;name` FROM t"]
+
+
+def test_delimiter_blocks():
+    """DELIMITER lines should let trigger bodies contain semicolons."""
+    sql = """DELIMITER $$
+CREATE TRIGGER tr BEFORE INSERT ON model FOR EACH ROW BEGIN
+  SET NEW.last_updated_action = 'INSERT';
+END$$
+DELIMITER ;
+SELECT 1;
+"""
+    assert statements(sql) == [
+        "CREATE TRIGGER tr BEFORE INSERT ON model FOR EACH ROW BEGIN\n"
+        "  SET NEW.last_updated_action = 'INSERT';\nEND",
+        'SELECT 1']
+
+
+def test_parse_sql_script_cache(tmpdir):
+    """Parsed scripts should be written to and read back from the on-disk
+    cache, keyed on the script's contents."""
+    script = tmpdir.join('script.sql')
+    script.write('SELECT 1;\nSELECT 2;\n')
+    cache_dir = tmpdir.join('cache')
+
+    assert parse_sql_script(str(script), cache_dir=str(cache_dir)) == [
+        'SELECT 1', 'SELECT 2']
+    assert len(cache_dir.listdir()) == 1
+
+    script.write('SELECT 3;\n')
+    assert parse_sql_script(str(script), cache_dir=str(cache_dir)) == [
+        'SELECT 3']
+    assert len(cache_dir.listdir()) == 2